@@ -1,38 +1,45 @@
 # app/__main__.py
+import asyncio
+import json
 import logging
 import os
 import sys
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 import click
-import httpx
 import uvicorn
 from a2a.server.apps import A2AStarletteApplication
-from a2a.server.request_handlers import DefaultRequestHandler
-from a2a.server.tasks import (
-    BasePushNotificationSender,
-    InMemoryPushNotificationConfigStore,
-    InMemoryTaskStore,
-)
+from a2a.server.tasks import InMemoryPushNotificationConfigStore, InMemoryTaskStore
 from a2a.types import AgentCapabilities, AgentCard, AgentSkill
+from starlette.responses import JSONResponse
+from starlette.routing import Route
 
 from app.agent_executor import MathAgentExecutor
+from app.http_pool import HTTPClientPool
+from app.metrics import metrics_route
+from app.push import PushDeliveryQueue, SQLitePushConfigStore
+from app.request_handler import MathRequestHandler
+from app.task_store import SQLiteTaskLeases, SQLiteTaskStore
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@click.command()
-@click.option('--host', default='0.0.0.0')
-@click.option('--port', default=10000)
-def main(host, port):
-    # Проверка API-ключа (опционально)
-    if not os.getenv("OPENAI_API_KEY"):
-        logger.error("OPENAI_API_KEY is required")
-        sys.exit(1)
+
+def create_app():
+    """Builds the A2A Starlette app; called once per worker process.
+
+    Settings come from the environment so that every uvicorn worker
+    builds an identical app.
+    """
+    host = os.getenv("AGENT_HOST", "0.0.0.0")
+    port = int(os.getenv("AGENT_PORT", "10000"))
 
     # Описание агента
-    capabilities = AgentCapabilities(streaming=True, push_notifications=False)
+    # Push-уведомления: клиент может отправить задачу и не держать соединение открытым
+    push_notifications = os.getenv("PUSH_NOTIFICATIONS", "true").lower() in ("1", "true", "yes")
+    capabilities = AgentCapabilities(streaming=True, push_notifications=push_notifications)
     skill = AgentSkill(
         id="math_search_agent",
         name="Math & Search Agent",
@@ -55,18 +62,137 @@ def main(host, port):
     )
 
     # Инициализация A2A-сервера
-    httpx_client = httpx.AsyncClient()
-    push_config_store = InMemoryPushNotificationConfigStore()
-    push_sender = BasePushNotificationSender(httpx_client=httpx_client, config_store=push_config_store)
-    request_handler = DefaultRequestHandler(
-        agent_executor=MathAgentExecutor(),
-        task_store=InMemoryTaskStore(),
-        push_config_store=push_config_store,
-        push_sender=push_sender,
+    # Один пул соединений на процесс: LLM и push-уведомления
+    http_pool = HTTPClientPool()
+    # При нескольких воркерах задачи хранятся в общем SQLite-файле
+    task_store_path = os.getenv("TASK_STORE_PATH")
+    task_store = SQLiteTaskStore(task_store_path) if task_store_path else InMemoryTaskStore()
+    # Выполняемые задачи всех воркеров: лимит на context_id и отмена из любого процесса
+    leases = (
+        SQLiteTaskLeases(task_store_path, ttl=float(os.getenv("TASK_LEASE_TTL", "10")))
+        if task_store_path
+        else None
+    )
+    # Настройки push-уведомлений переживают перезапуск и видны всем воркерам
+    push_config_path = os.getenv("PUSH_CONFIG_PATH")
+    push_config_store = (
+        SQLitePushConfigStore(push_config_path) if push_config_path else InMemoryPushNotificationConfigStore()
+    )
+    push_sender = PushDeliveryQueue(
+        httpx_client=http_pool.async_client,
+        config_store=push_config_store,
+        max_queue=int(os.getenv("PUSH_QUEUE_SIZE", "10000")),
+        batch_delay=float(os.getenv("PUSH_BATCH_MS", "200")) / 1000,
+        batch_json=os.getenv("PUSH_BATCH_JSON", "false").lower() in ("1", "true", "yes"),
+        max_attempts=int(os.getenv("PUSH_RETRY_ATTEMPTS", "5")),
+        backoff=float(os.getenv("PUSH_RETRY_BACKOFF", "0.5")),
+        max_backoff=float(os.getenv("PUSH_RETRY_MAX_BACKOFF", "30")),
+    )
+    agent_executor = MathAgentExecutor(http_pool=http_pool, leases=leases)
+    request_handler = MathRequestHandler(
+        agent_executor=agent_executor,
+        task_store=task_store,
+        push_config_store=push_config_store if push_notifications else None,
+        push_sender=push_sender if push_notifications else None,
     )
     server = A2AStarletteApplication(agent_card=agent_card, http_handler=request_handler)
 
-    uvicorn.run(server.build(), host=host, port=port)
+    @asynccontextmanager
+    async def lifespan(app):
+        # Агент собирается и прогревается в фоне: порт открыт сразу,
+        # /health/ready отвечает 200 только после прогрева
+        startup = asyncio.create_task(agent_executor.start())
+        yield
+        startup.cancel()
+        await agent_executor.aclose()
+        # Уведомления из очереди отправляются до закрытия пула соединений
+        await push_sender.aclose()
+        await http_pool.aclose()
+
+    async def live(request):
+        return JSONResponse({"status": "ok"})
+
+    async def ready(request):
+        body = {"ready": agent_executor.ready, **agent_executor.startup_seconds}
+        return JSONResponse(body, status_code=200 if agent_executor.ready else 503)
+
+    # Метрики Prometheus рядом с A2A-маршрутами: гистограммы и счётчики stats()
+    routes = [
+        Route("/metrics", metrics_route(lambda: {**agent_executor.stats(), "push": push_sender.stats()})),
+        Route("/health/live", live),
+        Route("/health/ready", ready),
+    ]
+    return server.build(routes=routes, lifespan=lifespan)
+
+
+def _require_api_key():
+    # Проверка API-ключа (опционально)
+    if not os.getenv("OPENAI_API_KEY"):
+        logger.error("OPENAI_API_KEY is required")
+        sys.exit(1)
+
+
+@click.group(invoke_without_command=True)
+@click.option('--host', default='0.0.0.0')
+@click.option('--port', default=10000)
+@click.option('--workers', default=1, help='Number of worker processes.')
+@click.option('--data-dir', default='data', help='Directory for shared SQLite state when --workers > 1.')
+@click.pass_context
+def main(ctx, host, port, workers, data_dir):
+    # Подкоманда (batch) — сервер не запускаем
+    if ctx.invoked_subcommand is not None:
+        return
+    _require_api_key()
+
+    os.environ["AGENT_HOST"] = host
+    os.environ["AGENT_PORT"] = str(port)
+
+    if workers <= 1:
+        uvicorn.run(create_app(), host=host, port=port)
+        return
+
+    # Воркеры — отдельные процессы: задачи, диалоги и кэш поиска
+    # должны жить в общих файлах, иначе запрос на другом воркере теряет состояние
+    os.makedirs(data_dir, exist_ok=True)
+    shared = {
+        "TASK_STORE_PATH": "tasks.sqlite",
+        "CHECKPOINT_PATH": "checkpoints.sqlite",
+        "SEARCH_CACHE_PATH": "search_cache.sqlite",
+        "FACTS_PATH": "facts.sqlite",
+        "LLM_CACHE_PATH": "llm_cache.sqlite",
+        "PUSH_CONFIG_PATH": "push_configs.sqlite",
+    }
+    for name, filename in shared.items():
+        if os.getenv(name) in (None, "", ":memory:"):
+            os.environ[name] = os.path.join(data_dir, filename)
+        logger.info(f"{name}={os.environ[name]}")
+
+    uvicorn.run("app.__main__:create_app", factory=True, host=host, port=port, workers=workers)
+
+
+@main.command()
+@click.argument('input_path', type=click.Path(exists=True, dir_okay=False))
+@click.argument('output_path', type=click.Path(dir_okay=False))
+@click.option('--parallelism', default=None, type=int, help='Questions answered at once (default: BATCH_PARALLELISM or 16).')
+@click.option('--no-resume', is_flag=True, help='Overwrite the output instead of skipping ids already in it.')
+@click.option('--answer-cache', default=None, help='SQLite file for answers, shared between runs.')
+def batch(input_path, output_path, parallelism, no_resume, answer_cache):
+    """Answers every question of INPUT_PATH (JSONL) into OUTPUT_PATH (JSONL)."""
+    from app.batch import BatchRunner
+
+    _require_api_key()
+
+    runner = BatchRunner(parallelism=parallelism, answer_cache_path=answer_cache)
+
+    async def run():
+        try:
+            return await runner.run(input_path, output_path, resume=not no_resume)
+        finally:
+            await runner.agent.aclose()
+
+    stats = asyncio.run(run())
+    click.echo(json.dumps(stats))
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
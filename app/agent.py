@@ -1,46 +1,34 @@
 # app/agent.py
 import os
-import re
 import asyncio
-from collections.abc import AsyncIterable
+import logging
+import time
+from collections.abc import AsyncIterable, Callable
 from typing import Any, Literal
 
-from langchain_core.messages import AIMessage, ToolMessage, HumanMessage, SystemMessage
-from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
-from langchain_community.tools import DuckDuckGoSearchResults
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.graph import StateGraph, MessagesState, START
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.constants import TAG_NOSTREAM
+from langgraph.graph import StateGraph, START
 from langgraph.prebuilt import ToolNode, tools_condition
 from pydantic import BaseModel
 
-memory = MemorySaver()
+from app.calculator import calculator
+from app.cascade import FAST, STRONG, ModelCascade, parse_price
+from app.checkpoint import create_checkpointer
+from app.concurrency import ToolCallLimiter
+from app.context import AgentState, ContextManager, count_tokens
+from app.fast_path import try_answer
+from app.http_pool import HTTPClientPool
+from app.llm_cache import llm_cache as shared_llm_cache
+from app.metrics import NODE_DURATION, instrument_tool_calls
+from app.facts import fact_store
+from app.search import FACT_INDEX, evidence, search_cache, search_router, search_web, warmup_search
 
-# === Инструменты ===
-@tool
-def calculator(expression: str) -> str:
-    """Evaluates a mathematical expression and returns the result as a string.
-
-    Args:
-        expression: A string containing a valid arithmetic expression
-                    (e.g., "155 / 29", "(10 + 5) * 2").
-                    Supported operators: +, -, *, /, //, %, **, and parentheses.
-    """
-    expr = expression.strip()
-    if not re.fullmatch(r'[\d+\-*/().\s%]+', expr):
-        return "Error: Invalid characters in expression."
-    try:
-        result = eval(expr, {"__builtins__": {}}, {})
-        return str(result)
-    except Exception as e:
-        return f"Error: {e}"
-
-search_web = DuckDuckGoSearchResults(
-    name="search_web",
-    #description="Search the web for real-world facts (e.g., speeds, distances, dimensions)."
-    num_results = 10
-)
+logger = logging.getLogger(__name__)
 
+# === Инструменты ===
 tools = [calculator, search_web]
 
 # === Системное сообщение ===
@@ -55,34 +43,126 @@ SYSTEM_INSTRUCTION = (
     "Do NOT include apologies, extra commentary, or unrelated text. "
     "All calculations must use meters and seconds; convert units if necessary."
 )
+PARALLEL_INSTRUCTION = (
+    " When several independent facts are needed, request all the searches at once "
+    "in a single step instead of one after another."
+)
 
 class MathAgent:
     """Math & Search Agent compatible with A2A protocol."""
 
-    def __init__(self):
+    def __init__(
+        self,
+        stream_tokens: bool | None = None,
+        max_concurrency: int | None = None,
+        checkpointer: BaseCheckpointSaver | None = None,
+        fast_path: bool | None = None,
+        parallel_tool_calls: bool | None = None,
+        http_pool: HTTPClientPool | None = None,
+        model: str | None = None,
+        fast_model: str | None = None,
+        llm_cache: bool | None = None,
+    ):
+        # Провайдер LLM импортируется при создании агента: openai SDK — самый тяжёлый импорт
+        from langchain_openai import ChatOpenAI
+
         PROXY_URLS = os.getenv("PROXY_URLS")
+        # Общий пул соединений, если передан; иначе ChatOpenAI создаёт свой клиент
+        self.http_pool = http_pool
+        http_clients = (
+            {"http_client": http_pool.sync_client, "http_async_client": http_pool.async_client}
+            if http_pool is not None
+            else {}
+        )
+        if http_pool is not None:
+            # Поиск по HTTP-эндпоинтам — через тот же пул соединений
+            search_router.use_http_client(http_pool.async_client)
         self.model = ChatOpenAI(
-            model="gpt-4o",
+            model=model or os.getenv("STRONG_MODEL", "gpt-4o"),
             openai_api_base=PROXY_URLS,
             temperature=0,
+            **http_clients,
+        )
+        # Быстрая модель для промежуточных шагов с выбором инструментов (пусто — только сильная)
+        fast_model = fast_model if fast_model is not None else os.getenv("FAST_MODEL", "")
+        self.fast_model = (
+            ChatOpenAI(model=fast_model, openai_api_base=PROXY_URLS, temperature=0, **http_clients)
+            if fast_model
+            else None
         )
         self.tools = tools
-        self.llm_with_tools = self.model.bind_tools(self.tools, parallel_tool_calls=False)
+        # Пересылать ли клиенту токены финального ответа по мере генерации
+        if stream_tokens is None:
+            stream_tokens = os.getenv("STREAM_TOKENS", "false").lower() in ("1", "true", "yes")
+        self.stream_tokens = stream_tokens
+        # Чистую арифметику и перевод единиц считаем локально, без LLM
+        if fast_path is None:
+            fast_path = os.getenv("FAST_PATH", "true").lower() in ("1", "true", "yes")
+        self.fast_path = fast_path
+        # Сколько графов могут выполняться одновременно (0 — без ограничения)
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("MAX_CONCURRENT_TASKS", "256"))
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        # Независимые вызовы инструментов одного шага выполняются параллельно
+        if parallel_tool_calls is None:
+            parallel_tool_calls = os.getenv("PARALLEL_TOOL_CALLS", "true").lower() in ("1", "true", "yes")
+        self.parallel_tool_calls = parallel_tool_calls
+        self.system_instruction = SYSTEM_INSTRUCTION + (PARALLEL_INSTRUCTION if parallel_tool_calls else "")
+        # Одинаковые запросы к модели (тот же промпт, инструменты и параметры) отвечаются из кэша
+        if llm_cache is None:
+            llm_cache = os.getenv("LLM_CACHE", "true").lower() in ("1", "true", "yes")
+        self.llm_cache = shared_llm_cache if llm_cache else None
+        self.cascade = ModelCascade(
+            self.model,
+            self.tools,
+            fast=self.fast_model,
+            parallel_tool_calls=parallel_tool_calls,
+            max_fast_steps=int(os.getenv("CASCADE_MAX_FAST_STEPS", "3")),
+            prices={
+                STRONG: parse_price(os.getenv("STRONG_MODEL_PRICE", "2.5,10")),
+                FAST: parse_price(os.getenv("FAST_MODEL_PRICE", "0.15,0.6")),
+            },
+            cache=self.llm_cache,
+        )
+
+        # Бюджет токенов на промпт: старые ходы сжимаются и сворачиваются в сводку.
+        # Сводка не должна попадать в поток токенов ответа — отсюда тег nostream
+        self.context = ContextManager(summarizer=self.model.with_config(tags=[TAG_NOSTREAM]))
 
-        def assistant(state: MessagesState):
-            return {"messages": [self.llm_with_tools.invoke([SystemMessage(content=SYSTEM_INSTRUCTION)] + state["messages"])]}
+        async def assistant(state: AgentState, config: RunnableConfig):
+            prompt, update = await self.context.prepare(self.system_instruction, state)
+            use_cache = config["configurable"].get("llm_cache", True)
+            response = await self.cascade.ainvoke(prompt, state["messages"], use_cache)
+            return {"messages": [response], **update}
 
-        builder = StateGraph(MessagesState)
+        builder = StateGraph(AgentState)
         builder.add_node("assistant", assistant)
-        builder.add_node("tools", ToolNode(self.tools))
+        builder.add_node("tools", ToolNode(self.tools, awrap_tool_call=instrument_tool_calls(ToolCallLimiter())))
         builder.add_edge(START, "assistant")
         builder.add_conditional_edges("assistant", tools_condition)
         builder.add_edge("tools", "assistant")
-        self.graph = builder.compile(checkpointer=memory)
+        # Хранилище диалогов: ограниченное по размеру, при CHECKPOINT_PATH — на диске
+        self.checkpointer = checkpointer if checkpointer is not None else create_checkpointer()
+        self.graph = builder.compile(checkpointer=self.checkpointer)
 
-    async def stream(self, query: str, context_id: str) -> AsyncIterable[dict[str, Any]]:
+    async def stream(self, query: str, context_id: str, use_cache: bool = True) -> AsyncIterable[dict[str, Any]]:
         inputs = {"messages": [HumanMessage(content=query)]}
-        config = {"configurable": {"thread_id": context_id}}
+        # use_cache=False — ответы модели для этого запроса не берутся из кэша
+        config = {"configurable": {"thread_id": context_id, "llm_cache": use_cache}}
+
+        if self.fast_path and (answer := try_answer(query)) is not None:
+            # Сохраняем обмен в истории, чтобы последующие вопросы видели контекст
+            await self.graph.aupdate_state(
+                config,
+                {"messages": [HumanMessage(content=query), AIMessage(content=answer)]},
+                as_node="assistant",
+            )
+            yield {
+                "is_task_complete": True,
+                "require_user_input": False,
+                "content": answer,
+            }
+            return
 
         # 🔥 ВСЕГДА отправляем первое событие для streaming
         yield {
@@ -91,30 +171,62 @@ class MathAgent:
             "content": "Processing your request...",
         }
 
-        # Запускаем синхронный граф в отдельном потоке
-        def _run_graph():
-            return list(self.graph.stream(inputs, config, stream_mode="values"))
-
-        loop = asyncio.get_event_loop()
-        steps = await loop.run_in_executor(None, _run_graph)
-
-        for step in steps:
-            message = step["messages"][-1]
-            if isinstance(message, AIMessage) and hasattr(message, "tool_calls") and message.tool_calls:
-                yield {
-                    "is_task_complete": False,
-                    "require_user_input": False,
-                    "content": "Gathering information...",
-                }
-            elif isinstance(message, ToolMessage):
-                yield {
-                    "is_task_complete": False,
-                    "require_user_input": False,
-                    "content": "Performing calculation...",
-                }
+        # "updates" — переходы между узлами, "messages" — токены LLM
+        stream_mode = ["updates", "messages"] if self.stream_tokens else ["updates"]
+        usage = {"prompt_tokens": 0, "completion_tokens": 0}
+        # Узлы графа выполняются последовательно, поэтому время узла —
+        # интервал между соседними обновлениями (без обёрток вокруг узлов).
+        # Отсчёт первого узла — после получения слота семафора, без ожидания в очереди
+        node_started = 0.0
+
+        def graph_started() -> None:
+            nonlocal node_started
+            node_started = time.perf_counter()
+
+        async for mode, chunk in self._astream(inputs, config, stream_mode, graph_started):
+            if mode == "updates":
+                now = time.perf_counter()
+                for node in chunk:
+                    NODE_DURATION.observe(now - node_started, node)
+                node_started = now
+                for node, update in chunk.items():
+                    if not update or not update.get("messages"):
+                        continue
+                    message = update["messages"][-1]
+                    if isinstance(message, AIMessage) and message.usage_metadata:
+                        usage["prompt_tokens"] += message.usage_metadata.get("input_tokens", 0)
+                        usage["completion_tokens"] += message.usage_metadata.get("output_tokens", 0)
+                    if node == "assistant" and isinstance(message, AIMessage) and message.tool_calls:
+                        yield {
+                            "is_task_complete": False,
+                            "require_user_input": False,
+                            "content": "Gathering information...",
+                        }
+                    elif node == "tools" and isinstance(message, ToolMessage):
+                        yield {
+                            "is_task_complete": False,
+                            "require_user_input": False,
+                            "content": "Performing calculation...",
+                        }
+            else:
+                message_chunk, metadata = chunk
+                # Токены вызова инструментов не показываем — только текст ответа
+                if (
+                    metadata.get("langgraph_node") == "assistant"
+                    and isinstance(message_chunk, AIMessageChunk)
+                    and isinstance(message_chunk.content, str)
+                    and message_chunk.content
+                    and not message_chunk.tool_call_chunks
+                ):
+                    yield {
+                        "is_task_complete": False,
+                        "require_user_input": False,
+                        "is_partial": True,
+                        "content": message_chunk.content,
+                    }
 
         # Финальный ответ
-        final_state = self.graph.get_state(config)
+        final_state = await self.graph.aget_state(config)
         final_message = final_state.values["messages"][-1]
         content = (
             final_message.content.strip()
@@ -122,10 +234,84 @@ class MathAgent:
             else "No answer generated."
         )
 
+        # Факты из ответа ("leopard speed: 29 m/s") сохраняем для следующих поисков
+        if FACT_INDEX and isinstance(final_message, AIMessage) and final_message.content:
+            turn = final_state.values["messages"]
+            start = max((i for i, m in enumerate(turn) if isinstance(m, HumanMessage)), default=0)
+            await fact_store.add_from_answer(
+                content,
+                [m.content for m in turn[start:] if isinstance(m, ToolMessage) and m.name == "search_web"],
+            )
+
+        logger.info("Context %s usage: %s", context_id, usage)
         yield {
             "is_task_complete": True,
             "require_user_input": False,
             "content": content,
+            "usage": usage,
+        }
+
+    async def warmup(self) -> None:
+        """Opens LLM and search connections and loads the tokenizer before the first request."""
+        started = time.perf_counter()
+
+        async def llm() -> None:
+            # Любой ответ (даже 404 от прокси) оставляет в пуле готовое TCP/TLS-соединение
+            await self.model.root_async_client.models.list()
+
+        results = await asyncio.gather(
+            llm(),
+            warmup_search(),
+            asyncio.to_thread(count_tokens, []),
+            return_exceptions=True,
+        )
+        for name, result in zip(("llm", "search", "tokenizer"), results):
+            if isinstance(result, Exception):
+                logger.warning(f"Warmup of {name} failed: {result!r}")
+        logger.info(f"Warmup finished in {time.perf_counter() - started:.2f}s")
+
+    async def aclose(self) -> None:
+        """Closes connections opened by the agent itself (the shared pool is closed by its owner)."""
+        await search_router.aclose()
+
+    async def _astream(
+        self,
+        inputs: dict,
+        config: dict,
+        stream_mode: list[str],
+        on_start: Callable[[], None] | None = None,
+    ):
+        """Runs the graph natively on the event loop, bounded by the concurrency cap.
+
+        `on_start` is called once a concurrency slot is held, right before the graph starts.
+        """
+        if self._semaphore is None:
+            if on_start is not None:
+                on_start()
+            async for item in self.graph.astream(inputs, config, stream_mode=stream_mode):
+                yield item
+            return
+        async with self._semaphore:
+            if on_start is not None:
+                on_start()
+            async for item in self.graph.astream(inputs, config, stream_mode=stream_mode):
+                yield item
+
+    def stats(self) -> dict[str, Any]:
+        """Returns cache and fact index counters for monitoring."""
+        stats: dict[str, Any] = {
+            "search_cache": search_cache.stats(),
+            "search_backends": search_router.stats(),
+            "models": self.cascade.stats(),
+            "search_evidence": evidence.stats(),
+            "facts": fact_store.stats(),
         }
+        if hasattr(self.checkpointer, "stats"):
+            stats["checkpointer"] = self.checkpointer.stats()
+        if self.llm_cache is not None:
+            stats["llm_cache"] = self.llm_cache.stats()
+        if self.http_pool is not None:
+            stats["http_pool"] = self.http_pool.stats()
+        return stats
 
     SUPPORTED_CONTENT_TYPES = ["text", "text/plain"]
\ No newline at end of file
@@ -1,6 +1,9 @@
 # app/agent_executor.py
 import asyncio
 import logging
+import os
+import time
+from typing import TYPE_CHECKING
 from a2a.server.agent_execution import AgentExecutor, RequestContext
 from a2a.server.events import EventQueue
 from a2a.server.tasks import TaskUpdater
@@ -8,54 +11,265 @@ from a2a.types import (
     InternalError,
     InvalidParamsError,
     Part,
+    Task,
     TaskState,
     TextPart,
 )
 from a2a.utils import new_agent_text_message, new_task
 from a2a.utils.errors import ServerError
-from app.agent import MathAgent
+from app.concurrency import AdmissionController, AdmissionRejected
+from app.http_pool import HTTPClientPool
+from app.metrics import QUEUE_WAIT, TASK_DURATION, span
+
+if TYPE_CHECKING:
+    from app.agent import MathAgent
+    from app.task_store import SQLiteTaskLeases
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class MathAgentExecutor(AgentExecutor):
-    def __init__(self):
-        self.agent = MathAgent()
+    def __init__(
+        self,
+        http_pool: HTTPClientPool | None = None,
+        warmup: bool | None = None,
+        leases: "SQLiteTaskLeases | None" = None,
+    ):
+        # Агент (тяжёлые импорты LangChain/OpenAI и компиляция графа) создаётся
+        # в start(), чтобы сервер начинал слушать порт сразу
+        self.http_pool = http_pool
+        self.agent: MathAgent | None = None
+        if warmup is None:
+            warmup = os.getenv("STARTUP_WARMUP", "true").lower() in ("1", "true", "yes")
+        self.warmup = warmup
+        self._startup: asyncio.Task | None = None
+        self.ready = False
+        self.startup_seconds: dict[str, float] = {}
+        # Ограничение числа одновременных задач и очередь ожидания;
+        # leases — общий для воркеров реестр выполняемых задач
+        self.admission = AdmissionController(leases=leases)
+        # task_id -> asyncio-задача, выполняющая execute (для отмены)
+        self._running: dict[str, asyncio.Task] = {}
+        self.canceled_running = 0
+        self.canceled_queued = 0
+        self.canceled_seconds_saved = 0.0
+        # Окно склейки подряд идущих статусов "working"
+        self.status_coalesce_seconds = float(os.getenv("STATUS_COALESCE_MS", "50")) / 1000
+        self.status_updates_sent = 0
+        self.status_updates_coalesced = 0
+
+    async def start(self) -> None:
+        """Builds the agent once and warms up its connections; safe to call concurrently."""
+        if self._startup is None:
+            self._startup = asyncio.create_task(self._start())
+        await asyncio.shield(self._startup)
+
+    async def _start(self) -> None:
+        started = time.perf_counter()
+
+        def build() -> "MathAgent":
+            from app.agent import MathAgent
+
+            self.startup_seconds["import"] = time.perf_counter() - started
+            return MathAgent(http_pool=self.http_pool)
+
+        # Импорт и компиляция графа — в потоке, event loop тем временем обслуживает запросы
+        self.agent = await asyncio.to_thread(build)
+        self.startup_seconds["build"] = time.perf_counter() - started
+        if self.warmup:
+            await self.agent.warmup()
+            self.startup_seconds["warmup"] = time.perf_counter() - started
+        self.ready = True
+        logger.info(f"Agent ready: {', '.join(f'{k} {v:.2f}s' for k, v in self.startup_seconds.items())}")
+
+    async def aclose(self) -> None:
+        """Stops the startup if it is still running and closes the agent's own connections."""
+        if self._startup is not None and not self._startup.done():
+            self._startup.cancel()
+        if self.agent is not None:
+            await self.agent.aclose()
 
     async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
         query = context.get_user_input()
+        # metadata {"llm_cache": false} в сообщении — ответы модели не берутся из кэша
+        metadata = (context.message.metadata if context.message else None) or {}
+        use_cache = metadata.get("llm_cache") is not False
         task = context.current_task
         if not task:
             task = new_task(context.message)
             await event_queue.enqueue_event(task)
 
         updater = TaskUpdater(event_queue, task.id, task.context_id)
+        # Один artifact_id для частичных токенов и итогового ответа:
+        # финальный artifact (append=False) заменяет накопленные фрагменты
+        artifact_id = f"{task.id}-result"
+        self._running[task.id] = asyncio.current_task()
+        received = time.perf_counter()
+        started = None
+        outcome = "failed"
+        try:
+            with span("task", task_id=task.id, context_id=task.context_id):
+                async with self.admission.admit(task.context_id, task.id) as waited:
+                    QUEUE_WAIT.observe(waited)
+                    if waited >= 1.0:
+                        logger.info(f"Task {task.id} waited {waited:.2f}s for admission")
+                    started = time.perf_counter()
+                    await self._run(query, task, updater, artifact_id, use_cache)
+                    outcome = "completed"
+        except asyncio.CancelledError:
+            outcome = "canceled"
+            # Отмена (tasks/cancel или разрыв stream-соединения) прерывает граф
+            # на текущем await, вместе с незавершёнными HTTP-запросами к LLM
+            if started is None:
+                self.canceled_queued += 1
+            else:
+                self.canceled_running += 1
+                self.canceled_seconds_saved += time.perf_counter() - started
+            logger.info(f"Task {task.id} canceled")
+            try:
+                await updater.cancel()
+            except RuntimeError:
+                pass  # задача уже в финальном состоянии
+            raise
+        except AdmissionRejected as e:
+            outcome = "rejected"
+            # Быстрый отказ вместо бесконечного ожидания в перегруженной очереди
+            logger.warning(f"Task {task.id} rejected: {e}")
+            await updater.reject(
+                new_agent_text_message(
+                    f"Server is busy ({e}), please retry later.",
+                    task.context_id,
+                    task.id,
+                )
+            )
+        except Exception as e:
+            logger.error(f"Error in MathAgentExecutor: {e}")
+            raise ServerError(error=InternalError()) from e
+        finally:
+            self._running.pop(task.id, None)
+            TASK_DURATION.observe(time.perf_counter() - received, outcome)
+
+    async def _run(
+        self,
+        query: str,
+        task: Task,
+        updater: TaskUpdater,
+        artifact_id: str,
+        use_cache: bool = True,
+    ) -> None:
+        partial_sent = False
+        # Последний ещё не отправленный статус: подряд идущие статусы
+        # склеиваются, в очередь уходит только самый свежий
+        pending_status: str | None = None
+        last_status: str | None = None
+
+        async def flush_status() -> None:
+            nonlocal pending_status, last_status
+            if pending_status is not None and pending_status != last_status:
+                await updater.update_status(
+                    TaskState.working,
+                    new_agent_text_message(pending_status, task.context_id, task.id),
+                )
+                self.status_updates_sent += 1
+                last_status = pending_status
+            pending_status = None
+
+        if self.agent is None:
+            await self.start()
+        stream = aiter(self.agent.stream(query, task.context_id, use_cache=use_cache))
+        next_item = asyncio.ensure_future(anext(stream))
         try:
-            async for item in self.agent.stream(query, task.context_id):
+            while True:
+                if pending_status is not None and not next_item.done():
+                    # Статус уходит, если за окно склейки не пришло следующее событие
+                    await asyncio.wait({next_item}, timeout=self.status_coalesce_seconds)
+                    if not next_item.done():
+                        await flush_status()
+                try:
+                    item = await next_item
+                except StopAsyncIteration:
+                    break
+                next_item = asyncio.ensure_future(anext(stream))
+
+                if item["is_task_complete"] or item.get("is_partial"):
+                    # Промежуточный статус теряет смысл, когда пошёл ответ
+                    if pending_status is not None:
+                        self.status_updates_coalesced += 1
+                        pending_status = None
                 if item["is_task_complete"]:
                     await updater.add_artifact(
                         [Part(root=TextPart(text=item["content"]))],
+                        artifact_id=artifact_id,
                         name="calculation_result",
+                        metadata={"usage": item["usage"]} if item.get("usage") else None,
+                        append=False,
+                        last_chunk=True,
                     )
                     await updater.complete()
                     break
-                else:
-                    # Отправляем промежуточный статус
-                    message = new_agent_text_message(
-                        item["content"],
-                        task.context_id,
-                        task.id,
+                elif item.get("is_partial"):
+                    # Фрагмент финального ответа — дописываем в artifact
+                    await updater.add_artifact(
+                        [Part(root=TextPart(text=item["content"]))],
+                        artifact_id=artifact_id,
+                        name="calculation_result",
+                        append=partial_sent,
+                        last_chunk=False,
                     )
-                    await updater.update_status(TaskState.working, message)
-                    
-                    # 🔥 Даём клиенту время подключиться к streaming
-                    await asyncio.sleep(0.1)
-        except Exception as e:
-            logger.error(f"Error in MathAgentExecutor: {e}")
-            raise ServerError(error=InternalError()) from e
+                    partial_sent = True
+                else:
+                    # Промежуточный статус. Ждать подключения клиента не нужно:
+                    # EventQueue создаётся до запуска execute и буферизует события
+                    if pending_status is not None:
+                        self.status_updates_coalesced += 1
+                    pending_status = item["content"]
+            await flush_status()
+        finally:
+            # Генератор выполняется в отдельной задаче — останавливаем её до aclose
+            if not next_item.done():
+                next_item.cancel()
+                await asyncio.wait({next_item})
+            elif not next_item.cancelled():
+                next_item.exception()  # помечаем результат как полученный
+            await stream.aclose()
+
+    def is_running(self, task_id: str) -> bool:
+        """True if the task is executing (or waiting for admission) in this process."""
+        running = self._running.get(task_id)
+        return running is not None and not running.done()
+
+    def abort(self, task_id: str) -> bool:
+        """Cancels the running execution of a task; returns False if it is not running here."""
+        if not self.is_running(task_id):
+            return False
+        self._running[task_id].cancel()
+        return True
+
+    def stats(self) -> dict:
+        """Returns admission queue, cancellation, status update, startup and agent counters for monitoring."""
+        return {
+            "admission": self.admission.stats(),
+            "cancellation": {
+                "running": len(self._running),
+                "canceled_running": self.canceled_running,
+                "canceled_queued": self.canceled_queued,
+                "canceled_seconds_saved": self.canceled_seconds_saved,
+            },
+            "status_updates": {
+                "sent": self.status_updates_sent,
+                "coalesced": self.status_updates_coalesced,
+            },
+            "startup": {"ready": self.ready, **{f"{k}_seconds": v for k, v in self.startup_seconds.items()}},
+            **(self.agent.stats() if self.agent is not None else {}),
+        }
 
     def _validate_request(self, context: RequestContext) -> bool:
         return False
 
     async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
-        pass
\ No newline at end of file
+        task = context.current_task
+        if self.abort(context.task_id):
+            logger.info(f"Cancellation requested for task {context.task_id}")
+        # Ответ на tasks/cancel: финальный статус в очередь запроса отмены
+        updater = TaskUpdater(event_queue, context.task_id, task.context_id if task else context.context_id)
+        await updater.cancel()
\ No newline at end of file
@@ -0,0 +1,172 @@
+# app/batch.py
+import asyncio
+import json
+import logging
+import os
+import time
+from collections.abc import Iterator
+from typing import Any
+from uuid import uuid4
+
+from app.agent import MathAgent
+from app.cache import TTLCache
+from app.search import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Поля входной записи, в которых может лежать вопрос
+QUERY_FIELDS = ("query", "text", "question", "body", "title")
+ID_FIELDS = ("id", "request_id")
+
+
+def iter_queries(path: str) -> Iterator[tuple[str, str]]:
+    """Yields (id, query) pairs from a JSONL file (or plain text, one query per line), lazily."""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = line
+            if not isinstance(record, dict):
+                yield str(number), str(record)
+                continue
+            query = next((record[k] for k in QUERY_FIELDS if record.get(k)), None)
+            if query is None:
+                logger.warning(f"Line {number}: no query field, skipped")
+                continue
+            item_id = next((record[k] for k in ID_FIELDS if record.get(k) is not None), number)
+            yield str(item_id), str(query)
+
+
+def _completed_ids(path: str) -> set[str]:
+    """Reads ids already written to the output (for resume); a torn last line is ignored."""
+    done: set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "answer" in record:
+                done.add(str(record["id"]))
+    return done
+
+
+class BatchRunner:
+    """Answers a stream of questions with one `MathAgent` and bounded parallelism.
+
+    Identical questions (after normalization) are answered once: concurrent
+    duplicates wait for the same computation and later ones hit the answer
+    cache. The agent's search and calculator caches are shared by all items.
+    Results are appended to the output as they complete, so memory does not
+    grow with the input and an interrupted run resumes where it stopped.
+    """
+
+    def __init__(
+        self,
+        agent: MathAgent | None = None,
+        parallelism: int | None = None,
+        answer_cache_path: str | None = None,
+    ):
+        self.agent = agent if agent is not None else MathAgent()
+        self.parallelism = parallelism if parallelism is not None else int(os.getenv("BATCH_PARALLELISM", "16"))
+        # Ответы на уже встречавшиеся вопросы; с answer_cache_path — общие между запусками
+        self.answers = TTLCache(maxsize=10000, ttl=86400, path=answer_cache_path)
+        self.processed = 0
+        self.deduplicated = 0
+        self.failed = 0
+        self.skipped = 0
+
+    async def answer(self, query: str) -> dict[str, Any]:
+        """Answers one question in a throwaway conversation; raises if the agent gives no answer."""
+        context_id = f"batch-{uuid4().hex}"
+        result: dict[str, Any] = {}
+        try:
+            async for item in self.agent.stream(query, context_id):
+                if item["is_task_complete"]:
+                    result = {"answer": item["content"], "usage": item.get("usage")}
+        finally:
+            # История пакетных вопросов не нужна — не занимаем хранилище диалогов
+            await self.agent.checkpointer.adelete_thread(context_id)
+        if not result:
+            # Пустой результат не кэшируется и не считается ответом: вопрос повторится при resume
+            raise RuntimeError("agent finished without an answer")
+        return result
+
+    async def run(self, input_path: str, output_path: str, resume: bool = True) -> dict[str, int]:
+        """Processes `input_path` into `output_path` (JSONL); returns counters."""
+        done = _completed_ids(output_path) if resume else set()
+        mode = "a" if resume else "w"
+        if resume and os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            # После падения последняя строка может быть оборвана
+            with open(output_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        else:
+            torn = False
+
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.parallelism)
+        pending: set[asyncio.Task] = set()
+        with open(output_path, mode, encoding="utf-8") as out:
+            if torn:
+                out.write("\n")
+
+            async def process(item_id: str, query: str) -> None:
+                try:
+                    record = await self._process(item_id, query)
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                finally:
+                    semaphore.release()
+
+            for item_id, query in iter_queries(input_path):
+                if item_id in done:
+                    self.skipped += 1
+                    continue
+                # Читаем вход только по мере освобождения слотов
+                await semaphore.acquire()
+                task = asyncio.create_task(process(item_id, query))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+
+        stats = {
+            "processed": self.processed,
+            "deduplicated": self.deduplicated,
+            "failed": self.failed,
+            "skipped": self.skipped,
+        }
+        logger.info(f"Batch finished in {time.perf_counter() - started:.1f}s: {stats}")
+        return stats
+
+    async def _process(self, item_id: str, query: str) -> dict[str, Any]:
+        started = time.perf_counter()
+        computed = False
+
+        async def compute() -> dict[str, Any]:
+            nonlocal computed
+            computed = True
+            return await self.answer(query)
+
+        record: dict[str, Any] = {"id": item_id, "query": query}
+        try:
+            result = await self.answers.get_or_compute(normalize_query(query), compute)
+            record.update(result)
+            record["deduplicated"] = not computed
+            self.deduplicated += not computed
+        except Exception as e:
+            logger.error(f"Batch item {item_id} failed: {e}")
+            record["error"] = str(e) or type(e).__name__
+            self.failed += 1
+        record["seconds"] = round(time.perf_counter() - started, 3)
+        self.processed += 1
+        if self.processed % 100 == 0:
+            logger.info(f"Batch progress: {self.processed} processed, {self.deduplicated} deduplicated")
+        return record
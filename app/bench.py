@@ -0,0 +1,359 @@
+# app/bench.py
+"""Load test for the A2A server: latency percentiles, time to first event, throughput.
+
+Without --url the harness starts `app.bench_stubs` (LLM and search stand-ins)
+and an agent server pointed at them, so it runs offline:
+
+    python -m app.bench --requests 200 --concurrency 20 --mode both
+    python -m app.bench --url http://localhost:10000 --workload queries.jsonl --rate 5
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from uuid import uuid4
+
+import click
+import httpx
+
+# Шаблоны сгенерированной нагрузки: вопросы с поиском и чистая арифметика (fast path)
+_SEARCH_QUESTIONS = [
+    "How many seconds would it take for a {animal} at full speed to run through {bridge}?",
+    "Сколько понадобится времени {animal_ru}, чтобы пересечь {bridge_ru}?",
+]
+_ANIMALS = [("cheetah", "гепарду"), ("leopard", "леопарду"), ("horse", "лошади"), ("ostrich", "страусу")]
+_BRIDGES = [
+    ("Pont des Arts", "мост Искусств"),
+    ("Bolshoy Kamenny Bridge", "Большой Каменный мост"),
+    ("Tower Bridge", "Тауэрский мост"),
+    ("Charles Bridge", "Карлов мост"),
+]
+_ARITHMETIC = ["What is {a} * {b}?", "Сколько будет {a} + {b}?", "{a} km to m", "sqrt({a}) * pi"]
+
+
+def generate_workload(count: int, fast_ratio: float = 0.2, seed: int = 0) -> list[dict]:
+    """Generates a reproducible mix of search questions and local arithmetic."""
+    rng = random.Random(seed)
+    workload = []
+    for _ in range(count):
+        if rng.random() < fast_ratio:
+            text = rng.choice(_ARITHMETIC).format(a=rng.randint(2, 999), b=rng.randint(2, 999))
+        else:
+            animal, animal_ru = rng.choice(_ANIMALS)
+            bridge, bridge_ru = rng.choice(_BRIDGES)
+            text = rng.choice(_SEARCH_QUESTIONS).format(
+                animal=animal, animal_ru=animal_ru, bridge=bridge, bridge_ru=bridge_ru
+            )
+        workload.append({"text": text})
+    return workload
+
+
+def load_workload(path: str) -> list[dict]:
+    """Reads queries from a JSONL file (`query`/`text`/`question`/`title` field,
+    optional `context_id`) or from a plain text file, one query per line."""
+    workload = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = line
+            if isinstance(record, str):
+                workload.append({"text": record})
+                continue
+            text = next((record[k] for k in ("query", "text", "question", "title") if record.get(k)), None)
+            if text:
+                workload.append({"text": str(text), "context_id": record.get("context_id")})
+    return workload
+
+
+def _payload(method: str, item: dict) -> dict:
+    message = {
+        "role": "user",
+        "parts": [{"kind": "text", "text": item["text"]}],
+        "messageId": uuid4().hex,
+    }
+    if item.get("context_id"):
+        message["contextId"] = item["context_id"]
+    return {"jsonrpc": "2.0", "id": uuid4().hex, "method": method, "params": {"message": message}}
+
+
+def _state(result: dict) -> str | None:
+    return (result.get("status") or {}).get("state")
+
+
+async def send_one(client: httpx.AsyncClient, url: str, mode: str, item: dict) -> dict:
+    """Runs one request; returns latency, time to first event and outcome."""
+    started = time.perf_counter()
+    first_event = None
+    state = None
+    error = None
+    try:
+        if mode == "stream":
+            async with client.stream("POST", url, json=_payload("message/stream", item)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    if first_event is None:
+                        first_event = time.perf_counter() - started
+                    data = json.loads(line[5:])
+                    if "error" in data:
+                        error = data["error"].get("message", "error")
+                        break
+                    state = _state(data["result"]) or state
+        else:
+            response = await client.post(url, json=_payload("message/send", item))
+            response.raise_for_status()
+            data = response.json()
+            if "error" in data:
+                error = data["error"].get("message", "error")
+            else:
+                state = _state(data["result"])
+    except (httpx.HTTPError, json.JSONDecodeError) as e:
+        error = type(e).__name__
+    latency = time.perf_counter() - started
+    if error is None and state != "completed":
+        error = f"state={state}"
+    return {
+        "latency": latency,
+        # Для message/send первое событие — сам ответ
+        "first_event": first_event if first_event is not None else latency,
+        "error": error,
+    }
+
+
+async def run_load(
+    url: str,
+    workload: list[dict],
+    mode: str,
+    concurrency: int,
+    rate: float = 0.0,
+    total: int | None = None,
+    timeout: float = 120.0,
+) -> dict:
+    """Replays the workload and returns the summary.
+
+    With `rate` > 0 requests arrive as a Poisson process (open loop, at most
+    `concurrency` in flight); otherwise `concurrency` clients send back to back.
+    """
+    total = total or len(workload)
+    items = [workload[i % len(workload)] for i in range(total)]
+    results: list[dict] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(item: dict) -> None:
+            async with semaphore:
+                results.append(await send_one(client, url, mode, item))
+
+        started = time.perf_counter()
+        if rate > 0:
+            tasks = []
+            for item in items:
+                tasks.append(asyncio.create_task(one(item)))
+                await asyncio.sleep(random.expovariate(rate))
+            await asyncio.gather(*tasks)
+        else:
+            await asyncio.gather(*(one(item) for item in items))
+        wall = time.perf_counter() - started
+    return summarize(results, wall)
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q / 100 * len(ordered)), len(ordered) - 1)]
+
+
+def summarize(results: list[dict], wall: float) -> dict:
+    """Aggregates per-request results: percentiles, throughput and error rate."""
+    ok = [r for r in results if r["error"] is None]
+    errors: dict[str, int] = {}
+    for r in results:
+        if r["error"] is not None:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    latencies = [r["latency"] for r in ok]
+    first_events = [r["first_event"] for r in ok]
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+        "errors": errors,
+        "wall_seconds": wall,
+        "throughput_rps": len(ok) / wall if wall > 0 else 0.0,
+        "latency": {f"p{q}": _percentile(latencies, q) for q in (50, 95, 99)} | {"max": max(latencies, default=0.0)},
+        "first_event": {f"p{q}": _percentile(first_events, q) for q in (50, 95, 99)},
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise click.ClickException(f"{' '.join(process.args)} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise click.ClickException(f"{url} is not ready after {timeout:.0f}s")
+
+
+@contextmanager
+def local_server(stub_args: list[str], env: dict[str, str], workers: int = 1, caches: bool = False):
+    """Starts the stubs and an agent server wired to them; yields the agent URL.
+
+    Response caches and the fact index are off unless `caches` is set: otherwise
+    warmup and the first mode fill them and later requests measure cache hits.
+    """
+    stub_port, agent_port = _free_port(), _free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    agent_env = {
+        **os.environ,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY") or "bench",
+        "PROXY_URLS": f"{stub_url}/v1",
+        "SEARCH_URL": f"{stub_url}/search",
+        **({} if caches else {"LLM_CACHE": "false", "SEARCH_CACHE": "false", "FACT_INDEX": "false"}),
+        # {stub} в значениях — адрес заглушек, например SEARCH_BACKENDS={stub}/search,local:index.jsonl
+        **{name: value.replace("{stub}", stub_url) for name, value in env.items()},
+    }
+    processes = []
+    data_dir = tempfile.TemporaryDirectory(prefix="bench-")
+    try:
+        stubs = subprocess.Popen(
+            [sys.executable, "-m", "app.bench_stubs", "--port", str(stub_port), *stub_args]
+        )
+        processes.append(stubs)
+        _wait_ready(f"{stub_url}/stats", stubs)
+        agent = subprocess.Popen(
+            [
+                sys.executable, "-m", "app",
+                "--host", "127.0.0.1", "--port", str(agent_port), "--workers", str(workers), "--data-dir", data_dir.name,
+            ],
+            env=agent_env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        processes.append(agent)
+        agent_url = f"http://127.0.0.1:{agent_port}/"
+        # Замеры начинаются после сборки агента и прогрева соединений
+        _wait_ready(f"{agent_url}health/ready", agent)
+        yield agent_url
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        data_dir.cleanup()
+
+
+def _print_summary(mode: str, summary: dict) -> None:
+    latency, first = summary["latency"], summary["first_event"]
+    click.echo(
+        f"[{mode}] {summary['ok']}/{summary['requests']} ok, "
+        f"error rate {summary['error_rate']:.1%}, {summary['throughput_rps']:.2f} req/s "
+        f"({summary['wall_seconds']:.1f}s)"
+    )
+    click.echo(
+        f"  latency      p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  "
+        f"p99 {latency['p99']:.3f}s  max {latency['max']:.3f}s"
+    )
+    click.echo(f"  first event  p50 {first['p50']:.3f}s  p95 {first['p95']:.3f}s  p99 {first['p99']:.3f}s")
+    for error, count in summary["errors"].items():
+        click.echo(f"  error {error}: {count}")
+
+
+@click.command()
+@click.option('--url', default=None, help='A2A server to test; by default a local server with stubs is started.')
+@click.option('--workload', 'workload_path', default=None, help='JSONL or text file with queries to replay.')
+@click.option('--requests', 'total', default=100, help='Number of requests per mode.')
+@click.option('--concurrency', default=10, help='Maximum requests in flight.')
+@click.option('--rate', default=0.0, help='Arrival rate, requests/s (Poisson); 0 sends back to back.')
+@click.option('--mode', type=click.Choice(['stream', 'send', 'both']), default='both')
+@click.option('--warmup', default=5, help='Requests sent before measuring.')
+@click.option('--fast-ratio', default=0.2, help='Share of arithmetic queries in the generated workload.')
+@click.option('--seed', default=0)
+@click.option('--llm-latency', default='lognormal:0.8,0.4', help='Stub LLM time to first token distribution.')
+@click.option('--search-latency', default='lognormal:0.5,0.5', help='Stub search latency distribution.')
+@click.option('--token-interval', default=0.0, help='Stub delay between answer tokens, seconds.')
+@click.option('--llm-error-rate', default=0.0, help='Share of stub LLM calls that fail with HTTP 503.')
+@click.option('--search-error-rate', default=0.0, help='Share of stub searches that fail with HTTP 503.')
+@click.option('--model-latency', multiple=True, help='MODEL=SPEC: stub latency of one model (repeatable).')
+@click.option('--workers', default=1, help='Worker processes of the local agent server.')
+@click.option('--env', 'env_pairs', multiple=True, help='NAME=VALUE for the local agent server (repeatable).')
+@click.option('--caches', is_flag=True, help='Keep LLM/search caches and the fact index on in the local server.')
+@click.option('--output', default=None, help='Write the summary as JSON to this file.')
+@click.option('--max-p95', default=None, type=float, help='Fail if p95 latency exceeds this many seconds.')
+@click.option('--max-error-rate', default=None, type=float, help='Fail if the error rate exceeds this share.')
+def main(url, workload_path, total, concurrency, rate, mode, warmup, fast_ratio, seed, llm_latency,
+         search_latency, token_interval, llm_error_rate, search_error_rate, model_latency, workers, env_pairs,
+         caches, output, max_p95, max_error_rate):
+    random.seed(seed)
+    workload = load_workload(workload_path) if workload_path else generate_workload(total, fast_ratio, seed)
+    if not workload:
+        raise click.ClickException("workload is empty")
+    modes = ["stream", "send"] if mode == "both" else [mode]
+
+    async def run(target: str) -> dict:
+        if warmup:
+            await run_load(target, workload, "send", min(concurrency, warmup), total=warmup)
+        return {m: await run_load(target, workload, m, concurrency, rate, total) for m in modes}
+
+    if url:
+        summaries = asyncio.run(run(url))
+    else:
+        stub_args = [
+            "--llm-latency", llm_latency,
+            "--search-latency", search_latency,
+            "--token-interval", str(token_interval),
+            "--error-rate", str(llm_error_rate),
+            "--search-error-rate", str(search_error_rate),
+            *(arg for pair in model_latency for arg in ("--model-latency", pair)),
+        ]
+        env = dict(pair.split("=", 1) for pair in env_pairs)
+        with local_server(stub_args, env, workers, caches) as target:
+            summaries = asyncio.run(run(target))
+
+    for m, summary in summaries.items():
+        _print_summary(m, summary)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, indent=2)
+
+    # Пороги для проверки регрессий в CI
+    failed = [
+        f"{m}: {name} {value:.3f} > {limit}"
+        for m, summary in summaries.items()
+        for name, value, limit in (
+            ("p95", summary["latency"]["p95"], max_p95),
+            ("error rate", summary["error_rate"], max_error_rate),
+        )
+        if limit is not None and value > limit
+    ]
+    if failed:
+        raise click.ClickException("thresholds exceeded: " + "; ".join(failed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+# app/bench_stubs.py
+"""Local stand-ins for the OpenAI-compatible LLM endpoint and web search, plus a push notification receiver.
+
+Used by `app.bench` to load-test the agent without network access:
+
+    python -m app.bench_stubs --port 10100 --llm-latency lognormal:0.8,0.4
+
+The agent is pointed at them with `PROXY_URLS=http://127.0.0.1:10100/v1`
+and `SEARCH_URL=http://127.0.0.1:10100/search`.
+"""
+import asyncio
+import json
+import math
+import random
+import time
+from collections.abc import Callable
+from uuid import uuid4
+
+import click
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+# Сценарий заглушки: поиск фактов -> калькулятор -> ответ
+FACTS = [
+    ("speed", "The cheetah can reach a top speed of 25.8 m/s (93 km/h)."),
+    ("length", "The Bolshoy Kamenny Bridge is 487 m long and 40 m wide."),
+]
+EXPRESSION = "487 / 25.8"
+ANSWER = (
+    "18.88 seconds (cheetah speed: 25.8 m/s, Bolshoy Kamenny Bridge length: 487 m, "
+    "calculation: 487 / 25.8 = 18.88)"
+)
+SUMMARY = "The user asked how long a cheetah needs to cross the Bolshoy Kamenny Bridge; the answer was 18.88 s."
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Builds a latency sampler (seconds) from a spec.
+
+    Formats: "0.5" or "fixed:0.5", "uniform:LOW,HIGH", "normal:MEAN,STDDEV",
+    "lognormal:MEDIAN,SIGMA", "exp:MEAN".
+    """
+    kind, _, args = spec.rpartition(":")
+    kind = kind or "fixed"
+    try:
+        values = [float(v) for v in args.split(",")]
+    except ValueError:
+        raise click.BadParameter(f"invalid latency spec {spec!r}") from None
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda: random.uniform(*values)
+    if kind == "normal" and len(values) == 2:
+        return lambda: max(random.gauss(*values), 0.0)
+    if kind == "lognormal" and len(values) == 2 and values[0] > 0:
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exp" and len(values) == 1 and values[0] > 0:
+        return lambda: random.expovariate(1 / values[0])
+    raise click.BadParameter(f"invalid latency spec {spec!r}")
+
+
+def _count_tokens(messages: list[dict]) -> int:
+    return sum(4 + len(str(m.get("content") or "")) // 4 + len(str(m.get("tool_calls") or "")) // 4 for m in messages)
+
+
+def _next_step(body: dict, searches: int) -> tuple[str | None, list[dict]]:
+    """Returns (content, tool_calls) for the next assistant message of the scenario."""
+    messages = body.get("messages", [])
+    if not body.get("tools"):
+        # Вызов без инструментов — суммаризация истории
+        return SUMMARY, []
+    # Ход начинается с последнего сообщения пользователя
+    last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+    called = [
+        call["function"]["name"]
+        for m in messages[last_user + 1:]
+        if m.get("role") == "assistant"
+        for call in m.get("tool_calls") or []
+    ]
+    if "search_web" not in called:
+        question = str(messages[last_user].get("content", "")) if last_user >= 0 else ""
+        count = searches if body.get("parallel_tool_calls", True) else 1
+        return None, [
+            _tool_call("search_web", {"query": f"{FACTS[i % len(FACTS)][0]} {question}"[:200]})
+            for i in range(count)
+        ]
+    if "calculator" not in called:
+        return None, [_tool_call("calculator", {"expression": EXPRESSION})]
+    return ANSWER, []
+
+
+def _tool_call(name: str, arguments: dict) -> dict:
+    return {
+        "id": f"call_{uuid4().hex[:24]}",
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments)},
+    }
+
+
+def create_app(
+    llm_latency: str = "0",
+    search_latency: str = "0",
+    token_interval: float = 0.0,
+    searches: int = 2,
+    error_rate: float = 0.0,
+    search_error_rate: float = 0.0,
+    model_latency: dict[str, str] | None = None,
+    push_error_rate: float = 0.0,
+) -> Starlette:
+    """Builds the stub app: `/v1/chat/completions`, `/search` and `/push`."""
+    llm_delay = parse_latency(llm_latency)
+    # Свои задержки для отдельных моделей (например, быстрой модели каскада)
+    model_delays = {name: parse_latency(spec) for name, spec in (model_latency or {}).items()}
+    search_delay = parse_latency(search_latency)
+    stats = {"chat_completions": 0, "searches": 0, "errors": 0, "search_errors": 0, "push_notifications": 0}
+    # Последнее состояние каждой задачи по push-уведомлениям
+    push_states: dict[str, str] = {}
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["chat_completions"] += 1
+        # Задержка до первого токена
+        await asyncio.sleep(model_delays.get(body.get("model"), llm_delay)())
+        if error_rate and random.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "stub overloaded", "type": "server_error"}}, status_code=503)
+
+        content, tool_calls = _next_step(body, searches)
+        prompt_tokens = _count_tokens(body.get("messages", []))
+        completion_tokens = len((content or "").split()) + 10 * len(tool_calls)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        finish_reason = "tool_calls" if tool_calls else "stop"
+        base = {"id": f"chatcmpl-{uuid4().hex}", "created": int(time.time()), "model": body.get("model", "stub")}
+
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            return JSONResponse({
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+
+        def chunk(delta: dict, finish: str | None = None) -> str:
+            payload = {
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            for i, call in enumerate(tool_calls):
+                yield chunk({"tool_calls": [{"index": i, **call}]})
+            words = (content or "").split(" ")
+            for i, word in enumerate(words if content else []):
+                if token_interval:
+                    await asyncio.sleep(token_interval)
+                yield chunk({"content": word if i == 0 else " " + word})
+            yield chunk({}, finish_reason)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def search(request: Request):
+        stats["searches"] += 1
+        await asyncio.sleep(search_delay())
+        if search_error_rate and random.random() < search_error_rate:
+            stats["search_errors"] += 1
+            return PlainTextResponse("stub search overloaded", status_code=503)
+        query = request.query_params.get("q", "")
+        topic = next((text for key, text in FACTS if query.startswith(key)), FACTS[0][1])
+        return PlainTextResponse(
+            f"snippet: {topic}, title: {query[:60]}, link: https://example.org/{uuid4().hex[:8]}"
+        )
+
+    async def push(request: Request):
+        # Приёмник push-уведомлений A2A: задача (или массив задач при PUSH_BATCH_JSON)
+        if push_error_rate and random.random() < push_error_rate:
+            stats["push_errors"] = stats.get("push_errors", 0) + 1
+            return PlainTextResponse("stub push receiver overloaded", status_code=503)
+        body = await request.json()
+        for task in body if isinstance(body, list) else [body]:
+            stats["push_notifications"] += 1
+            push_states[task["id"]] = task["status"]["state"]
+        return JSONResponse({"ok": True})
+
+    async def get_stats(request: Request):
+        return JSONResponse({**stats, "push_states": push_states})
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/chat/completions", chat_completions, methods=["POST"]),
+        Route("/search", search),
+        Route("/push", push, methods=["POST"]),
+        Route("/stats", get_stats),
+    ])
+
+
+@click.command()
+@click.option('--host', default='127.0.0.1')
+@click.option('--port', default=10100)
+@click.option('--llm-latency', default='lognormal:0.8,0.4', help='Time to first token, e.g. "fixed:0.5", "uniform:0.2,1".')
+@click.option('--search-latency', default='lognormal:0.5,0.5', help='Search response time distribution.')
+@click.option('--token-interval', default=0.0, help='Delay between streamed answer tokens, seconds.')
+@click.option('--searches', default=2, help='Parallel search_web calls in the first step.')
+@click.option('--error-rate', default=0.0, help='Share of LLM calls answered with HTTP 503.')
+@click.option('--search-error-rate', default=0.0, help='Share of searches answered with HTTP 503.')
+@click.option('--model-latency', multiple=True, help='MODEL=SPEC: latency of one model, e.g. "gpt-4o-mini=fixed:0.2".')
+@click.option('--push-error-rate', default=0.0, help='Share of push notifications answered with HTTP 503.')
+def main(host, port, llm_latency, search_latency, token_interval, searches, error_rate, search_error_rate,
+         model_latency, push_error_rate):
+    models = dict(pair.split("=", 1) for pair in model_latency)
+    app = create_app(
+        llm_latency, search_latency, token_interval, searches, error_rate, search_error_rate, models, push_error_rate
+    )
+    uvicorn.run(app, host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
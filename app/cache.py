@@ -0,0 +1,204 @@
+# app/cache.py
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """In-memory LRU cache with TTL, optional SQLite backing and single-flight.
+
+    Values must be JSON-serializable when `path` is set: the SQLite file keeps
+    entries across restarts and is consulted on an in-memory miss. On an event
+    loop the file is read in a thread (`aget`, `get_or_compute`) and written
+    behind in the default executor, so waiting for another worker's lock does
+    not stall the loop; the file is trimmed to `maxsize` every tenth of
+    `maxsize` writes.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0, path: str | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: dict[tuple[int, str], asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        # Записи с последней чистки файла
+        self._unpruned = 0
+        self._prune_every = max(maxsize // 10, 1)
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Blocking lookup (reads the file in the calling thread); prefer `aget` on an event loop."""
+        value = self._get_memory(key)
+        if value is _MISSING and self._db is not None:
+            value = self._admit(key, self._read(key))
+        self._count(value)
+        return default if value is _MISSING else value
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        value = self._get_memory(key)
+        if value is _MISSING and self._db is not None:
+            value = self._admit(key, await asyncio.to_thread(self._read, key))
+        self._count(value)
+        return default if value is _MISSING else value
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._put(key, expires_at, value)
+        if self._db is None:
+            return
+        row = (key, json.dumps(value), expires_at, now)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(row)
+            return
+        # Запись в фоне: run_in_executor ставит её в пул сразу, asyncio.run дождётся её при выходе
+        loop.run_in_executor(None, self._write, row).add_done_callback(_log_error)
+
+    async def get_or_compute(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Returns the cached value or computes it once for all concurrent callers."""
+        value = self.peek(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        loop = asyncio.get_running_loop()
+        # Задачи привязаны к своему event loop'у, поэтому ключ включает loop
+        flight_key = (id(loop), key)
+        task = self._inflight.get(flight_key)
+        if task is None:
+            # Чтение файла — тоже внутри общей задачи: пока оно идёт, повторные
+            # запросы ждут её, а не начинают своё вычисление
+            task = loop.create_task(self._compute(key, factory))
+            self._inflight[flight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(flight_key, None))
+        else:
+            self.coalesced += 1
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    def peek(self, key: str, default: Any = None) -> Any:
+        """Returns the value from memory only (no file access); a miss is not counted."""
+        value = self._get_memory(key)
+        if value is _MISSING:
+            return default
+        self.hits += 1
+        return value
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+            "size": len(self._data),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM cache")
+
+    async def _compute(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        value = await self.aget(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = await factory()
+        self.set(key, value)
+        return value
+
+    def _get_memory(self, key: str) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at >= time.time():
+                self._data.move_to_end(key)
+                return value
+            del self._data[key]
+            return _MISSING
+
+    def _admit(self, key: str, entry: tuple[float, Any] | None) -> Any:
+        # Запись, прочитанная из файла, становится самой свежей в памяти
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        with self._lock:
+            self._put(key, expires_at, value)
+        return value
+
+    def _put(self, key: str, expires_at: float, value: Any) -> None:
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def _count(self, value: Any) -> None:
+        if value is _MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+    # === Файл: вызывается в потоке, когда работает event loop ===
+    def _read(self, key: str) -> tuple[float, Any] | None:
+        now = time.time()
+        with self._db_lock:
+            row = self._db.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                return None
+            self._db.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[1], json.loads(row[0])
+
+    def _write(self, row: tuple[str, str, float, float]) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)", row
+            )
+            self._unpruned += 1
+            if self._unpruned >= self._prune_every:
+                self._prune_disk()
+                self._unpruned = 0
+
+    def _prune_disk(self) -> None:
+        # Файл ограничен тем же размером, вытесняем давно не читавшиеся записи
+        self._db.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+        self._db.execute(
+            "DELETE FROM cache WHERE key IN ("
+            " SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+
+
+def _log_error(future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(f"Cache write failed: {future.exception()!r}")
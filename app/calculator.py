@@ -0,0 +1,152 @@
+# app/calculator.py
+import ast
+import math
+import operator
+import os
+import time
+from functools import lru_cache
+
+from langchain_core.tools import tool
+
+# Лимиты, чтобы одно выражение (например, 9**9**9**9) не заняло CPU надолго
+MAX_LENGTH = int(os.getenv("CALCULATOR_MAX_LENGTH", "500"))
+MAX_NODES = int(os.getenv("CALCULATOR_MAX_NODES", "200"))
+MAX_EXPONENT = float(os.getenv("CALCULATOR_MAX_EXPONENT", "1000"))
+MAX_MAGNITUDE = float(os.getenv("CALCULATOR_MAX_MAGNITUDE", "1e300"))
+MAX_SECONDS = float(os.getenv("CALCULATOR_MAX_SECONDS", "0.05"))
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+CONSTANTS = {
+    "pi": math.pi,
+    "e": math.e,
+    "tau": math.tau,
+}
+FUNCTIONS = {
+    "sqrt": math.sqrt,
+    "abs": abs,
+    "round": round,
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "trunc": math.trunc,
+    "min": min,
+    "max": max,
+    "exp": math.exp,
+    "log": math.log,
+    "log10": math.log10,
+    "log2": math.log2,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "asin": math.asin,
+    "acos": math.acos,
+    "atan": math.atan,
+    "atan2": math.atan2,
+    "hypot": math.hypot,
+    "radians": math.radians,
+    "degrees": math.degrees,
+}
+
+
+class CalculatorError(ValueError):
+    """Raised when an expression is invalid or exceeds the calculator limits."""
+
+
+@lru_cache(maxsize=int(os.getenv("CALCULATOR_CACHE_SIZE", "1024")))
+def _parse(expression: str) -> ast.Expression:
+    """Parses and validates an expression once; the tree is reused for repeats."""
+    if len(expression) > MAX_LENGTH:
+        raise CalculatorError(f"expression is longer than {MAX_LENGTH} characters")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        raise CalculatorError("invalid syntax") from None
+    nodes = 0
+    for node in ast.walk(tree):
+        nodes += 1
+        if nodes > MAX_NODES:
+            raise CalculatorError(f"expression has more than {MAX_NODES} elements")
+        if isinstance(node, ast.Name) and node.id not in CONSTANTS and node.id not in FUNCTIONS:
+            raise CalculatorError(f"unknown name '{node.id}'")
+    return tree
+
+
+def _check(value: int | float) -> int | float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise CalculatorError("unsupported value")
+    if abs(value) > MAX_MAGNITUDE:
+        raise CalculatorError(f"result magnitude exceeds {MAX_MAGNITUDE:g}")
+    return value
+
+
+def _power(base: int | float, exponent: int | float) -> int | float:
+    if abs(exponent) > MAX_EXPONENT:
+        raise CalculatorError(f"exponent exceeds {MAX_EXPONENT:g}")
+    # Оцениваем порядок результата до вычисления, чтобы не строить огромные int
+    if abs(base) > 1 and exponent > 0 and exponent * math.log10(abs(base)) > math.log10(MAX_MAGNITUDE):
+        raise CalculatorError(f"result magnitude exceeds {MAX_MAGNITUDE:g}")
+    return base ** exponent
+
+
+def _eval(node: ast.AST, deadline: float) -> int | float:
+    if time.perf_counter() > deadline:
+        raise CalculatorError("evaluation took too long")
+    if isinstance(node, ast.Expression):
+        return _eval(node.body, deadline)
+    if isinstance(node, ast.Constant):
+        return _check(node.value)
+    if isinstance(node, ast.Name) and node.id in CONSTANTS:
+        return CONSTANTS[node.id]
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        return _UNARY_OPERATORS[type(node.op)](_eval(node.operand, deadline))
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        left = _eval(node.left, deadline)
+        right = _eval(node.right, deadline)
+        if isinstance(node.op, ast.Pow):
+            return _check(_power(left, right))
+        return _check(_BINARY_OPERATORS[type(node.op)](left, right))
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in FUNCTIONS
+        and not node.keywords
+    ):
+        args = [_eval(arg, deadline) for arg in node.args]
+        return _check(FUNCTIONS[node.func.id](*args))
+    raise CalculatorError(f"unsupported element '{type(node).__name__}'")
+
+
+def evaluate(expression: str) -> str:
+    """Evaluates an arithmetic expression; returns the result or an "Error: ..." string."""
+    expr = expression.strip().replace("^", "**")
+    try:
+        result = _eval(_parse(expr), time.perf_counter() + MAX_SECONDS)
+        return str(result)
+    except (ArithmeticError, ValueError, TypeError) as e:
+        return f"Error: {e}"
+
+
+@tool
+async def calculator(expression: str) -> str:
+    """Evaluates a mathematical expression and returns the result as a string.
+
+    Args:
+        expression: A string containing a valid arithmetic expression
+                    (e.g., "155 / 29", "(10 + 5) * 2", "sqrt(2) * pi").
+                    Supported operators: +, -, *, /, //, %, ** (or ^), and parentheses.
+                    Supported functions: sqrt, abs, round, floor, ceil, trunc, min, max,
+                    exp, log, log10, log2, sin, cos, tan, asin, acos, atan, atan2,
+                    hypot, radians, degrees (angles in radians); constants: pi, e, tau.
+    """
+    return evaluate(expression)
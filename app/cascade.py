@@ -0,0 +1,198 @@
+# app/cascade.py
+import json
+import logging
+import time
+from collections import Counter
+from collections.abc import Sequence
+from typing import Any
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langgraph.constants import TAG_NOSTREAM
+from pydantic import BaseModel, ValidationError
+
+from app.calculator import evaluate
+from app.llm_cache import LLMResponseCache
+from app.metrics import observe_llm_call, span
+
+logger = logging.getLogger(__name__)
+
+FAST = "fast"
+STRONG = "strong"
+
+
+def parse_price(spec: str) -> tuple[float, float]:
+    """Parses "INPUT,OUTPUT" — USD per million prompt and completion tokens."""
+    prompt, _, completion = spec.partition(",")
+    return float(prompt or 0), float(completion or 0)
+
+
+def _current_turn(messages: Sequence[BaseMessage]) -> Sequence[BaseMessage]:
+    # Ход — сообщения после последнего вопроса пользователя
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i + 1:]
+    return messages
+
+
+class ModelCascade:
+    """Chooses the model for each assistant step: a fast one for tool routing, the strong one otherwise.
+
+    Intermediate steps (which searches to run, what to calculate) go to the
+    fast model. Its reply is kept only if it is a well-formed tool call: a
+    known tool, arguments matching the tool schema, a calculator expression
+    that evaluates, and not a repeat of a call made earlier in the turn.
+    Otherwise the step is rerun on the strong model. The final answer always
+    comes from the strong model: after a calculation, after `max_fast_steps`
+    fast steps in a turn, or when the fast model tries to answer. Without a
+    fast model every step goes to the strong one.
+
+    With `cache`, responses of both tiers are reused for identical requests.
+    """
+
+    def __init__(
+        self,
+        strong: BaseChatModel,
+        tools: Sequence[BaseTool],
+        fast: BaseChatModel | None = None,
+        parallel_tool_calls: bool = True,
+        max_fast_steps: int = 3,
+        prices: dict[str, tuple[float, float]] | None = None,
+        cache: LLMResponseCache | None = None,
+    ):
+        self.tools = {t.name: t for t in tools}
+        self.cache = cache
+        # Всё, кроме сообщений, что влияет на ответ модели, — часть ключа кэша
+        schemas = [convert_to_openai_tool(t) for t in tools]
+        self._signatures = {
+            tier: json.dumps(
+                {
+                    "model": getattr(model, "model_name", type(model).__name__),
+                    "temperature": getattr(model, "temperature", None),
+                    "parallel_tool_calls": parallel_tool_calls,
+                    "tools": schemas,
+                },
+                sort_keys=True,
+            )
+            for tier, model in ((STRONG, strong), (FAST, fast))
+            if model is not None
+        }
+        self.strong = strong.bind_tools(tools, parallel_tool_calls=parallel_tool_calls)
+        # Ответ быстрой модели может быть отброшен, поэтому её токены клиенту не стримятся
+        self.fast = (
+            fast.bind_tools(tools, parallel_tool_calls=parallel_tool_calls).with_config(tags=[TAG_NOSTREAM])
+            if fast is not None
+            else None
+        )
+        self.max_fast_steps = max_fast_steps
+        self.prices = prices or {}
+        self._tiers = {
+            tier: {
+                "calls": 0, "cache_hits": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+            }
+            for tier in (FAST, STRONG)
+        }
+        self.escalations: Counter[str] = Counter()
+
+    def tier_for(self, messages: Sequence[BaseMessage]) -> str:
+        """Picks the tier for the next assistant step from the messages of the current turn."""
+        if self.fast is None:
+            return STRONG
+        turn = _current_turn(messages)
+        results = []
+        for message in reversed(turn):
+            if not isinstance(message, ToolMessage):
+                break
+            results.append(message)
+        # После вычисления обычно остаётся сформулировать ответ — это работа сильной модели
+        if any(m.name == "calculator" and not str(m.content).startswith("Error") for m in results):
+            return STRONG
+        fast_steps = sum(
+            1 for m in turn if isinstance(m, AIMessage) and m.response_metadata.get("model_tier") == FAST
+        )
+        return FAST if fast_steps < self.max_fast_steps else STRONG
+
+    def check(self, response: AIMessage, messages: Sequence[BaseMessage]) -> str | None:
+        """Returns why a fast-model reply has to be escalated, or None if it can be used."""
+        if response.invalid_tool_calls:
+            return "malformed"
+        if not response.tool_calls:
+            return "final_answer"
+        earlier = {
+            (call["name"], json.dumps(call["args"], sort_keys=True))
+            for m in _current_turn(messages)
+            if isinstance(m, AIMessage)
+            for call in m.tool_calls
+        }
+        for call in response.tool_calls:
+            tool = self.tools.get(call["name"])
+            if tool is None:
+                return "unknown_tool"
+            schema = tool.args_schema
+            if isinstance(schema, type) and issubclass(schema, BaseModel):
+                try:
+                    schema.model_validate(call["args"])
+                except ValidationError:
+                    return "malformed"
+            # Повтор уже сделанного вызова — модель ходит по кругу
+            if (call["name"], json.dumps(call["args"], sort_keys=True)) in earlier:
+                return "repeated"
+            if call["name"] == "calculator" and evaluate(str(call["args"].get("expression", ""))).startswith("Error"):
+                return "bad_expression"
+        return None
+
+    async def ainvoke(
+        self,
+        prompt: Sequence[BaseMessage],
+        messages: Sequence[BaseMessage],
+        use_cache: bool = True,
+    ) -> AIMessage:
+        """Runs one assistant step; `messages` is the full history used for routing."""
+        if self.tier_for(messages) == FAST:
+            response = await self._call(FAST, prompt, use_cache)
+            reason = self.check(response, messages)
+            if reason is None:
+                return response
+            self.escalations[reason] += 1
+            logger.debug(f"Escalating assistant step to the strong model: {reason}")
+        return await self._call(STRONG, prompt, use_cache)
+
+    async def _call(self, tier: str, prompt: Sequence[BaseMessage], use_cache: bool = True) -> AIMessage:
+        model = self.fast if tier == FAST else self.strong
+        stats = self._tiers[tier]
+        started = time.perf_counter()
+        with span("llm assistant", tier=tier):
+            if self.cache is not None and use_cache:
+                key = self.cache.key(prompt, self._signatures[tier])
+                response, cached = await self.cache.get_or_call(key, lambda: model.ainvoke(prompt))
+            else:
+                response, cached = await model.ainvoke(prompt), False
+        response.response_metadata["model_tier"] = tier
+        if cached:
+            stats["cache_hits"] += 1
+            return response
+        seconds = time.perf_counter() - started
+        observe_llm_call("assistant", seconds, response)
+
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        usage = response.usage_metadata or {}
+        prompt_tokens, completion_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        prompt_price, completion_price = self.prices.get(tier, (0.0, 0.0))
+        stats["cost_usd"] += (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+        return response
+
+    def stats(self) -> dict[str, Any]:
+        tiers = {}
+        for tier, stats in self._tiers.items():
+            tiers[tier] = {
+                **stats,
+                "seconds": round(stats["seconds"], 3),
+                "cost_usd": round(stats["cost_usd"], 6),
+                "avg_seconds": round(stats["seconds"] / stats["calls"], 3) if stats["calls"] else 0.0,
+            }
+        return {"tiers": tiers, "escalations": dict(self.escalations)}
@@ -0,0 +1,159 @@
+# app/concurrency.py
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
+
+# Только для аннотаций: импорт LangChain/LangGraph откладывается до создания агента
+if TYPE_CHECKING:
+    from langchain_core.messages import ToolMessage
+    from langgraph.prebuilt.tool_node import ToolCallRequest
+    from langgraph.types import Command
+
+    from app.task_store import SQLiteTaskLeases
+
+
+class ToolCallLimiter:
+    """`ToolNode` wrapper bounding concurrent tool calls per task and per process.
+
+    Parallel tool calls of one assistant step run concurrently (ToolNode gathers
+    them and keeps the order of the model's tool_calls); this limiter caps how
+    many of them run at once for one conversation and across all conversations.
+    """
+
+    def __init__(self, per_task: int | None = None, total: int | None = None):
+        if per_task is None:
+            per_task = int(os.getenv("TOOL_CONCURRENCY_PER_TASK", "4"))
+        if total is None:
+            total = int(os.getenv("TOOL_CONCURRENCY_TOTAL", "64"))
+        self.per_task = per_task
+        self._total = asyncio.Semaphore(total)
+        # thread_id -> [семафор, число активных вызовов]
+        self._tasks: dict[str, list] = {}
+
+    async def __call__(
+        self,
+        request: ToolCallRequest,
+        execute: Callable[[ToolCallRequest], Awaitable[ToolMessage | Command]],
+    ) -> ToolMessage | Command:
+        config = request.runtime.config if request.runtime else {}
+        key = config.get("configurable", {}).get("thread_id", "")
+        entry = self._tasks.setdefault(key, [asyncio.Semaphore(self.per_task), 0])
+        entry[1] += 1
+        try:
+            async with entry[0], self._total:
+                return await execute(request)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._tasks.pop(key, None)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a task cannot be admitted (queue full or waited too long)."""
+
+
+class AdmissionController:
+    """Bounds how many tasks run at once, globally and per context_id.
+
+    Tasks beyond the limits wait in a bounded queue for at most `max_wait`
+    seconds; when the queue is full or the wait expires they are rejected
+    right away instead of piling up behind everyone else.
+
+    The limits are per process. With `leases` (several workers) the
+    per-context limit also counts tasks running in the other workers, and
+    a running task can be canceled from any of them.
+    """
+
+    def __init__(
+        self,
+        max_active: int | None = None,
+        max_per_context: int | None = None,
+        max_queue: int | None = None,
+        max_wait: float | None = None,
+        leases: SQLiteTaskLeases | None = None,
+    ):
+        self.max_active = max_active if max_active is not None else int(os.getenv("ADMISSION_MAX_ACTIVE", "64"))
+        self.max_per_context = (
+            max_per_context if max_per_context is not None else int(os.getenv("ADMISSION_MAX_PER_CONTEXT", "1"))
+        )
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("ADMISSION_MAX_QUEUE", "128"))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv("ADMISSION_MAX_WAIT", "30"))
+        self.leases = leases
+        self._active = asyncio.Semaphore(self.max_active)
+        # context_id -> [семафор, число задач контекста]
+        self._contexts: dict[str, list] = {}
+        self.running = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @asynccontextmanager
+    async def admit(self, context_id: str, task_id: str | None = None):
+        """Waits for a slot; yields the time spent in the queue, in seconds."""
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected("queue is full")
+
+        entry = self._contexts.setdefault(context_id, [asyncio.Semaphore(self.max_per_context), 0])
+        entry[1] += 1
+        started = time.perf_counter()
+        acquired_context = acquired_active = leased = False
+        leases = self.leases if task_id is not None else None
+        self.queued += 1
+        try:
+            try:
+                async with asyncio.timeout(self.max_wait):
+                    await entry[0].acquire()
+                    acquired_context = True
+                    # Слот контекста во всех воркерах — до общего слота, чтобы не занимать его ожиданием
+                    if leases is not None:
+                        await leases.acquire(task_id, context_id, self.max_per_context)
+                        leased = True
+                    await self._active.acquire()
+                    acquired_active = True
+            except TimeoutError:
+                self.rejected += 1
+                raise AdmissionRejected(f"no free slot within {self.max_wait:g} s") from None
+            finally:
+                self.queued -= 1
+
+            waited = time.perf_counter() - started
+            self.admitted += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            self.running += 1
+            watch = leases.watch(task_id) if leases is not None else None
+            try:
+                yield waited
+            finally:
+                self.running -= 1
+                if watch is not None:
+                    watch.cancel()
+        finally:
+            if leased:
+                # Отмена задачи не должна оставить чужим воркерам занятый слот до истечения аренды
+                await asyncio.shield(leases.release(task_id))
+            if acquired_active:
+                self._active.release()
+            if acquired_context:
+                entry[0].release()
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._contexts.pop(context_id, None)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_seconds_avg": self.wait_seconds_total / self.admitted if self.admitted else 0.0,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
@@ -0,0 +1,147 @@
+# app/context.py
+import logging
+import os
+import time
+from collections.abc import Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.graph import MessagesState
+
+from app.metrics import observe_llm_call, span
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTION = (
+    "Summarize the conversation below for your own future reference. "
+    "Keep every number, unit, entity name and final answer; drop search snippets "
+    "that were not used. Reply with the summary only."
+)
+
+_encoding = None
+
+
+class AgentState(MessagesState):
+    """Graph state: messages plus a rolling summary of the oldest turns."""
+
+    # Сводка первых `summary_upto` сообщений истории
+    summary: str
+    summary_upto: int
+
+
+def count_tokens(messages: Sequence[BaseMessage]) -> int:
+    """Approximate prompt size in tokens (tiktoken when available, ~4 chars/token otherwise)."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            logger.warning("tiktoken encoding unavailable, using length-based token estimate")
+            _encoding = False
+    total = 0
+    for message in messages:
+        text = message.content if isinstance(message.content, str) else str(message.content)
+        if getattr(message, "tool_calls", None):
+            text += str(message.tool_calls)
+        # ~4 служебных токена на сообщение в формате chat completions
+        total += 4 + (len(_encoding.encode(text)) if _encoding else len(text) // 4)
+    return total
+
+
+class ContextManager:
+    """Builds a token-budgeted prompt from the conversation history.
+
+    The system prompt and the last `keep_turns` turns are sent verbatim, tool
+    outputs of older turns are truncated, and when the prompt still exceeds
+    `token_budget` the older turns are folded into a rolling summary, which is
+    cached in the graph state and only extended when history grows further.
+    """
+
+    def __init__(
+        self,
+        summarizer: BaseChatModel | None = None,
+        token_budget: int | None = None,
+        keep_turns: int | None = None,
+        tool_max_chars: int | None = None,
+    ):
+        self.summarizer = summarizer
+        self.token_budget = token_budget if token_budget is not None else int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+        self.keep_turns = keep_turns if keep_turns is not None else int(os.getenv("CONTEXT_KEEP_TURNS", "2"))
+        # Текущий ход (вопрос и вызовы инструментов) сворачивать нельзя — модель потеряет вопрос
+        if self.keep_turns < 1:
+            raise ValueError(f"keep_turns must be at least 1 (the current turn), got {self.keep_turns}")
+        self.tool_max_chars = tool_max_chars if tool_max_chars is not None else int(os.getenv("CONTEXT_TOOL_MAX_CHARS", "1000"))
+
+    async def prepare(self, system_prompt: str, state: AgentState) -> tuple[list[BaseMessage], dict]:
+        """Returns the prompt to send and a state update (new summary), if any."""
+        messages = state["messages"]
+        system = [SystemMessage(content=system_prompt)]
+        if self.token_budget <= 0:
+            return system + messages, {}
+
+        summary = state.get("summary", "")
+        summary_upto = state.get("summary_upto", 0)
+
+        # Последние `keep_turns` ходов (начиная с HumanMessage) идут без изменений
+        turn_starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+        recent_start = turn_starts[-self.keep_turns] if len(turn_starts) >= self.keep_turns else 0
+        recent_start = max(recent_start, summary_upto)
+        old = [self._compress(m) for m in messages[summary_upto:recent_start]]
+        recent = messages[recent_start:]
+
+        prompt = system + self._summary_messages(summary) + old + recent
+        prompt_tokens = count_tokens(prompt)
+        if prompt_tokens <= self.token_budget or not old or self.summarizer is None:
+            self._log(system + messages, prompt_tokens)
+            return prompt, {}
+
+        # Бюджет превышен — сворачиваем старые ходы в сводку
+        summary = await self._summarize(summary, old)
+        prompt = system + self._summary_messages(summary) + recent
+        self._log(system + messages, count_tokens(prompt))
+        return prompt, {"summary": summary, "summary_upto": recent_start}
+
+    def _compress(self, message: BaseMessage) -> BaseMessage:
+        if (
+            isinstance(message, ToolMessage)
+            and isinstance(message.content, str)
+            and len(message.content) > self.tool_max_chars
+        ):
+            return message.model_copy(update={"content": message.content[: self.tool_max_chars] + " …[truncated]"})
+        return message
+
+    @staticmethod
+    def _summary_messages(summary: str) -> list[BaseMessage]:
+        if not summary:
+            return []
+        return [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")]
+
+    async def _summarize(self, summary: str, messages: list[BaseMessage]) -> str:
+        transcript = "\n".join(
+            f"{m.type}: {m.content if m.content else m.tool_calls if getattr(m, 'tool_calls', None) else ''}"
+            for m in messages
+        )
+        if summary:
+            transcript = f"Previous summary:\n{summary}\n\n{transcript}"
+        started = time.perf_counter()
+        with span("llm summarizer"):
+            response = await self.summarizer.ainvoke(
+                [SystemMessage(content=SUMMARY_INSTRUCTION), HumanMessage(content=transcript)]
+            )
+        observe_llm_call("summarizer", time.perf_counter() - started, response)
+        return response.content.strip() if isinstance(response.content, str) else str(response.content)
+
+    @staticmethod
+    def _log(full_prompt: Sequence[BaseMessage], prompt_tokens: int) -> None:
+        # Подсчёт всей истории — лишний проход токенизатора на каждом шаге; только для отладки
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        full_tokens = count_tokens(full_prompt)
+        logger.debug(
+            "Prompt tokens: %d (untrimmed history: %d, saved: %d)",
+            prompt_tokens,
+            full_tokens,
+            full_tokens - prompt_tokens,
+        )
@@ -0,0 +1,133 @@
+# app/evidence.py
+import math
+import os
+import re
+from collections import Counter
+
+from app.fast_path import UNITS
+
+# "snippet: ..., title: ..., link: ..." — формат DuckDuckGoSearchResults
+_RESULT = re.compile(
+    r"snippet:\s*(?P<snippet>.*?),\s*title:\s*(?P<title>.*?),\s*link:\s*(?P<link>\S+?)(?:,\s*(?=snippet:)|\s*$)",
+    re.S,
+)
+_SENTENCE = re.compile(r"(?<=[.!?…])\s+(?=[^\W\d_]|\d)|\s+·\s+|\s*\.\.\.\s*")
+_WORD = re.compile(r"[^\W_]+")
+_QUANTITY = re.compile(r"\d(?:[\d,.\s]*\d)?\s*(?P<unit>[^\W\d_][\w/]*|%|°)")
+# Единицы помимо длины/времени/скорости из fast path
+_EXTRA_UNITS = {
+    "kg", "g", "t", "tonnes", "tons", "lb", "lbs", "pounds", "кг", "г", "т", "%", "°", "km²", "m²",
+    "km2", "m2", "mph", "people", "человек", "years", "лет", "year", "год", "года",
+}
+_K1 = 1.5
+_B = 0.75
+
+
+def parse_results(text: str) -> list[dict[str, str]]:
+    """Splits the search tool output into snippets with their title and link."""
+    results = [m.groupdict() for m in _RESULT.finditer(text)]
+    return results or [{"snippet": text, "title": "", "link": ""}]
+
+
+def _words(text: str) -> list[str]:
+    return [w[:6] for w in _WORD.findall(text.lower())]
+
+
+def has_quantity(sentence: str) -> bool:
+    """True if the sentence has a number followed by a unit ("58 km/h", "155 m")."""
+    return any(
+        m["unit"].lower() in UNITS or m["unit"].lower() in _EXTRA_UNITS for m in _QUANTITY.finditer(sentence)
+    )
+
+
+def _bm25(query: list[str], documents: list[list[str]]) -> list[float]:
+    if not documents:
+        return []
+    avg_length = sum(len(d) for d in documents) / len(documents) or 1.0
+    frequencies = Counter(w for d in documents for w in set(d))
+    scores = []
+    for document in documents:
+        counts = Counter(document)
+        score = 0.0
+        for word in set(query):
+            tf = counts.get(word)
+            if not tf:
+                continue
+            idf = math.log(1 + (len(documents) - frequencies[word] + 0.5) / (frequencies[word] + 0.5))
+            score += idf * tf * (_K1 + 1) / (tf + _K1 * (1 - _B + _B * len(document) / avg_length))
+        scores.append(score)
+    return scores
+
+
+class EvidenceCompressor:
+    """Reduces raw search results to the few sentences the model needs.
+
+    Snippets are split into sentences, ranked locally against the query with
+    BM25 (sentences with a number and a unit rank first), near-duplicates are
+    dropped and the best ones are kept within `max_chars`. The output keeps
+    the "snippet: ..., link: ..." shape, so the source of each fact is known.
+    """
+
+    def __init__(self, max_chars: int | None = None, top_k: int | None = None):
+        self.max_chars = max_chars if max_chars is not None else int(os.getenv("SEARCH_EVIDENCE_CHARS", "1000"))
+        self.top_k = top_k if top_k is not None else int(os.getenv("SEARCH_EVIDENCE_TOP_K", "6"))
+        self.searches = 0
+        self.raw_chars = 0
+        self.compressed_chars = 0
+
+    def compress(self, query: str, text: str) -> str:
+        sentences: list[tuple[str, str]] = []
+        documents: list[list[str]] = []
+        for result in parse_results(text):
+            for sentence in _SENTENCE.split(result["snippet"]):
+                sentence = sentence.strip(" ,;")
+                if len(sentence) >= 12:
+                    sentences.append((sentence, result["link"]))
+                    # Заголовок даёт контекст предложениям вида "It is 155 m long"
+                    documents.append(_words(f"{sentence} {result['title']}"))
+        if not sentences:
+            return text
+
+        scores = _bm25(_words(query), documents)
+        # Релевантные предложения с величиной и единицей — главное, что нужно для расчёта
+        ranked = sorted(
+            range(len(sentences)),
+            key=lambda i: (scores[i] > 0 and has_quantity(sentences[i][0]), scores[i]),
+            reverse=True,
+        )
+        # Предложения без единого слова запроса — шум, если есть что-то релевантное
+        ranked = [i for i in ranked if scores[i] > 0] or ranked
+
+        selected: list[tuple[str, str]] = []
+        seen: list[set[str]] = []
+        used = 0
+        for i in ranked:
+            sentence, link = sentences[i]
+            words = set(_words(sentence))
+            # Почти одинаковые предложения из разных источников оставляем один раз
+            if not words or any(len(words & other) >= 0.8 * min(len(words), len(other)) for other in seen):
+                continue
+            line = f"snippet: {sentence}, link: {link}" if link else f"snippet: {sentence}"
+            if used + len(line) > self.max_chars:
+                if selected:
+                    continue
+                # Даже одно предложение не влезает — обрезаем
+                sentence = sentence[: max(self.max_chars - len(line) + len(sentence), 40)]
+            selected.append((sentence, link))
+            seen.append(words)
+            used += len(line) + 1
+            if len(selected) >= self.top_k:
+                break
+
+        compressed = "\n".join(f"snippet: {s}, link: {link}" if link else f"snippet: {s}" for s, link in selected)
+        self.searches += 1
+        self.raw_chars += len(text)
+        self.compressed_chars += len(compressed)
+        return compressed
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "searches": self.searches,
+            "raw_chars": self.raw_chars,
+            "compressed_chars": self.compressed_chars,
+        }
@@ -0,0 +1,312 @@
+# app/facts.py
+import asyncio
+import difflib
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from typing import Any
+
+from app.fast_path import UNITS
+
+logger = logging.getLogger(__name__)
+
+SI_UNITS = {"length": "m", "time": "s", "speed": "m/s"}
+
+# "leopard speed: 58 km/h" внутри итогового ответа
+_FACT = re.compile(
+    r"(?P<name>[^\W\d_][^:,;()\n]{1,80}?)\s*:\s*(?P<value>-?\d+(?:\.\d+)?)\s*(?P<unit>[^\W\d_][\w/]*)",
+)
+# Вычисленные величины ("Final answer: 5.34 seconds", "Total time: ...") — не факты
+_SKIP_NAMES = re.compile(
+    r"\b(?:calculation|calculated|computed|formula|answer|result|total|final|estimated"
+    r"|расч[её]т\w*|вычислен\w*|ответ\w*|итог\w*|результат\w*)\b",
+    re.IGNORECASE,
+)
+# Ссылка в выдаче поиска или источник сохранённого факта
+_LINK = re.compile(r"(?:link|source):\s*(https?://[^\s,\];)]+)")
+_QUANTITY = re.compile(r"(?<![\w.])(?P<value>\d[\d,]*(?:\.\d+)?)\s*(?P<unit>[^\W\d_][\w/]*)")
+_TOKEN = re.compile(r"[^\W_]+(?:/[^\W_]+)?")
+# Служебные слова и уточнения, не влияющие на сущность
+_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "at", "for", "to", "and", "or", "is", "are", "what", "how",
+    "much", "many", "its", "it", "top", "full", "max", "maximum", "average", "approximately", "about",
+    "и", "в", "во", "на", "с", "со", "по", "у", "из", "для", "какая", "какой", "каково", "какова",
+    "сколько", "чему", "равна", "равно", "максимальная", "средняя", "примерно",
+}
+
+
+def _stem(token: str) -> str:
+    # Грубая основа слова: окончания (leopards, гепарда, скорости) не мешают сопоставлению
+    return token[:6]
+
+
+def tokens(text: str) -> set[str]:
+    """Content tokens of an entity name or query: no stopwords, numbers or unit names."""
+    result = set()
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS or token in UNITS or token.isdigit():
+            continue
+        result.add(_stem(token))
+    return result
+
+
+def _match(token: str, candidates: Iterable[str]) -> bool:
+    return any(
+        token == other or difflib.SequenceMatcher(None, token, other).ratio() >= 0.85 for other in candidates
+    )
+
+
+def _source(value: float, unit: str, snippets: Iterable[str]) -> str | None:
+    """Link of the search snippet that states the value, "search" if it has none, or None."""
+    known = UNITS.get(unit.lower())
+    for snippet in snippets:
+        for match in _QUANTITY.finditer(snippet):
+            number = float(match["value"].replace(",", ""))
+            other = UNITS.get(match["unit"].lower())
+            # То же число или та же величина в других единицах (58 km/h в выдаче, 16.1 m/s в ответе)
+            if math.isclose(number, value, rel_tol=1e-3) or (
+                known is not None
+                and other is not None
+                and other[0] == known[0]
+                and math.isclose(number * other[1], value * known[1], rel_tol=0.01)
+            ):
+                link = _LINK.search(snippet)
+                return link[1] if link else "search"
+    return None
+
+
+class FactStore:
+    """Quantities extracted from final answers, normalized to SI and matched fuzzily.
+
+    A fact is a named value ("leopard speed: 16.1 m/s") with its source link
+    and the time it was stored. `lookup` answers a search query from stored
+    facts when they cover the entities in it, which saves a web search round
+    trip for repeat entities. Facts are kept in memory (LRU, TTL) and, with
+    `path`, in SQLite so that they survive restarts; on a miss, facts that
+    other processes have added to the file since are loaded and matched too.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        maxsize: int = 10000,
+        ttl: float = 30 * 86400,
+        min_score: float = 0.8,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Доля совпавших слов названия факта и запроса для попадания
+        self.min_score = min_score
+        # ключ (токены названия) -> факт
+        self._facts: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        # основа слова -> ключи фактов
+        self._index: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        # Записи с последней чистки файла; чистим раз в десятую часть maxsize
+        self._unpruned = 0
+        self._prune_every = max(maxsize // 10, 1)
+        # rowid последней прочитанной из файла строки: новые строки добавлены другими процессами
+        self._synced_rowid = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS facts ("
+                " key TEXT PRIMARY KEY, name TEXT NOT NULL, value REAL NOT NULL, unit TEXT NOT NULL,"
+                " raw TEXT NOT NULL, source TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM facts WHERE stored_at < ?", (time.time() - ttl,))
+            rows = self._db.execute(
+                "SELECT key, name, value, unit, raw, source, stored_at FROM facts ORDER BY stored_at DESC LIMIT ?",
+                (maxsize,),
+            ).fetchall()
+            for key, name, value, unit, raw, source, stored_at in reversed(rows):
+                self._put(key, {
+                    "name": name, "value": value, "unit": unit, "raw": raw, "source": source, "stored_at": stored_at,
+                })
+            self._synced_rowid = self._db.execute("SELECT COALESCE(MAX(rowid), 0) FROM facts").fetchone()[0]
+
+    async def add(self, name: str, value: float, unit: str, source: str = "conversation") -> dict[str, Any] | None:
+        """Stores one fact; the value is converted to SI for known length/time/speed units."""
+        stored = self._remember(name, value, unit, source)
+        if stored is None:
+            return None
+        key, fact, changed = stored
+        if changed and self._db is not None:
+            await asyncio.to_thread(self._save, [(key, fact)])
+        return fact
+
+    async def add_from_answer(self, answer: str, tool_outputs: Iterable[str] = ()) -> list[dict[str, Any]]:
+        """Extracts "name: value unit" facts from a final answer.
+
+        Only values stated by the search results are kept (as written or in
+        other units of the same kind); the source is the link of that result.
+        Computed values ("Final answer: ...", "Total time: ...") are skipped.
+        """
+        snippets = [s for text in tool_outputs for s in text.split("snippet:") if s.strip()]
+        added = []
+        changed = []
+        for match in _FACT.finditer(answer):
+            name = match["name"].strip()
+            if _SKIP_NAMES.search(name):
+                continue
+            source = _source(float(match["value"]), match["unit"], snippets)
+            if source is None:
+                continue
+            stored = self._remember(name, float(match["value"]), match["unit"], source)
+            if stored is None:
+                continue
+            key, fact, is_new = stored
+            added.append(fact)
+            if is_new:
+                changed.append((key, fact))
+        if changed and self._db is not None:
+            await asyncio.to_thread(self._save, changed)
+        if added:
+            logger.debug("Stored facts: %s", [f["name"] for f in added])
+        return added
+
+    async def lookup(self, query: str, min_score: float | None = None) -> str | None:
+        """Returns stored facts that cover the entities of the query, or None."""
+        if min_score is None:
+            min_score = self.min_score
+        wanted = tokens(query)
+        if not wanted:
+            return None
+        with self._lock:
+            matched = self._find(wanted, min_score)
+        # Факты, сохранённые другими воркерами, есть только в общем файле
+        if matched is None and self._db is not None:
+            rows = await asyncio.to_thread(self._load_new)
+            if rows:
+                with self._lock:
+                    for key, fact in rows:
+                        self._put(key, fact)
+                    matched = self._find(wanted, min_score)
+        with self._lock:
+            if matched is None:
+                self.misses += 1
+                return None
+            for key, _ in matched:
+                if key in self._facts:
+                    self._facts.move_to_end(key)
+            self.hits += 1
+        return "Stored facts (from earlier answers):\n" + "\n".join(_format(fact) for _, fact in matched)
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._facts)}
+
+    def _remember(
+        self, name: str, value: float, unit: str, source: str
+    ) -> tuple[str, dict[str, Any], bool] | None:
+        # Только память; (ключ, факт, изменился ли он) — изменённые записываются в файл
+        key = " ".join(sorted(tokens(name)))
+        if not key:
+            return None
+        raw = f"{value:g} {unit}"
+        known = UNITS.get(unit.lower())
+        if known is not None:
+            kind, factor = known
+            value, unit = value * factor, SI_UNITS[kind]
+        fact = {"name": name.strip(), "value": value, "unit": unit, "raw": raw, "source": source, "stored_at": time.time()}
+        with self._lock:
+            existing = self._facts.get(key)
+            if existing is not None and math.isclose(existing["value"], value) and existing["unit"] == unit:
+                # Тот же факт (например, ответ из сохранённых фактов) — источник и время не меняем
+                return key, existing, False
+            self._put(key, fact)
+        return key, fact, True
+
+    def _find(self, wanted: set[str], min_score: float) -> list[tuple[str, dict[str, Any]]] | None:
+        now = time.time()
+        candidates = {key for token in wanted for key in self._index.get(token, ())}
+        matched = []
+        for key in candidates:
+            fact = self._facts[key]
+            if fact["stored_at"] + self.ttl < now:
+                continue
+            fact_tokens = key.split()
+            score = sum(_match(t, wanted) for t in fact_tokens) / len(fact_tokens)
+            if score >= min_score:
+                matched.append((key, fact))
+        # Запрос должен быть покрыт найденными фактами почти целиком,
+        # иначе часть сущностей осталась бы без данных
+        covered = sum(any(_match(t, key.split()) for key, _ in matched) for t in wanted)
+        if not matched or covered / len(wanted) < min_score:
+            return None
+        return matched
+
+    # === Файл (в потоке: ожидание блокировки другого воркера не останавливает event loop) ===
+    def _save(self, facts: list[tuple[str, dict[str, Any]]]) -> None:
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO facts (key, name, value, unit, raw, source, stored_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (key, f["name"], f["value"], f["unit"], f["raw"], f["source"], f["stored_at"])
+                    for key, f in facts
+                ],
+            )
+            self._unpruned += len(facts)
+            # Лишние строки удаляем пачкой, а не сортировкой таблицы на каждую запись
+            if self._unpruned >= self._prune_every:
+                self._db.execute(
+                    "DELETE FROM facts WHERE key IN ("
+                    " SELECT key FROM facts ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                    (self.maxsize,),
+                )
+                self._unpruned = 0
+
+    def _load_new(self) -> list[tuple[str, dict[str, Any]]]:
+        """Reads rows added to the file since the last read (by this or other processes)."""
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT rowid, key, name, value, unit, raw, source, stored_at FROM facts"
+                " WHERE rowid > ? ORDER BY rowid",
+                (self._synced_rowid,),
+            ).fetchall()
+            if rows:
+                self._synced_rowid = rows[-1][0]
+        return [
+            (key, {"name": name, "value": value, "unit": unit, "raw": raw, "source": source, "stored_at": stored_at})
+            for _, key, name, value, unit, raw, source, stored_at in rows
+        ]
+
+    def _put(self, key: str, fact: dict[str, Any]) -> None:
+        self._facts[key] = fact
+        self._facts.move_to_end(key)
+        for token in key.split():
+            self._index.setdefault(token, set()).add(key)
+        while len(self._facts) > self.maxsize:
+            old_key, _ = self._facts.popitem(last=False)
+            for token in old_key.split():
+                keys = self._index.get(token)
+                if keys is not None:
+                    keys.discard(old_key)
+                    if not keys:
+                        del self._index[token]
+
+
+def _format(fact: dict[str, Any]) -> str:
+    stored = time.strftime("%Y-%m-%d", time.gmtime(fact["stored_at"]))
+    return f"{fact['name']}: {fact['value']:.6g} {fact['unit']} ({fact['raw']}; source: {fact['source']}, {stored})"
+
+
+# Общее хранилище фактов процесса; FACTS_PATH — файл, переживающий перезапуск
+fact_store = FactStore(
+    path=os.getenv("FACTS_PATH") or None,
+    maxsize=int(os.getenv("FACTS_MAX_SIZE", "10000")),
+    ttl=float(os.getenv("FACTS_TTL", str(30 * 86400))),
+    min_score=float(os.getenv("FACTS_MIN_SCORE", "0.8")),
+)
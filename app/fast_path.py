@@ -0,0 +1,119 @@
+# app/fast_path.py
+import re
+
+from app.calculator import CONSTANTS, FUNCTIONS, evaluate
+
+# Обёртки вокруг выражения: "What is 100 / 4?", "Сколько будет 2 + 2?"
+_PREFIX = re.compile(
+    r"^(?:what(?:'s| is)|how much is|calculate|compute|evaluate|convert|"
+    r"сколько будет|чему равно|вычисли(?:те)?|посчитай(?:те)?|переведи(?:те)?)\s+",
+    re.IGNORECASE,
+)
+_WORD_OPERATORS = [
+    (re.compile(r"\bplus\b", re.IGNORECASE), "+"),
+    (re.compile(r"\bminus\b", re.IGNORECASE), "-"),
+    (re.compile(r"\b(?:times|multiplied by)\b", re.IGNORECASE), "*"),
+    (re.compile(r"\bdivided by\b", re.IGNORECASE), "/"),
+    (re.compile(r"×"), "*"),
+    (re.compile(r"÷"), "/"),
+]
+_EXPRESSION = re.compile(r"[\w\s.,+\-*/%^()]+")
+_HAS_OPERATOR = re.compile(r"[\w)]\s*(?:[-+*/%^]|//|\*\*)\s*[\w(\-]|\w\(")
+_IDENTIFIER = re.compile(r"[^\W\d]\w*")
+_INTEGER = re.compile(r"-?\d+")
+# Числа через "/" или "-" без пробелов — скорее дата или телефон, чем выражение:
+# 12/25/2023, 2023-12-25, +1-555-123-4567, 555-1234
+_DATE_OR_PHONE = re.compile(r"\+?\d+(?:[-/]\d+){2,}|\d{3,}-\d{3,}")
+
+_NUMBER = r"(?P<value>-?\d+(?:\.\d+)?)"
+_UNIT = r"[a-zа-яё/]+"
+_CONVERSION = re.compile(
+    rf"^{_NUMBER}\s*(?P<src>{_UNIT})\s+(?:to|in|into|в)\s+(?P<dst>{_UNIT})$", re.IGNORECASE
+)
+_HOW_MANY = re.compile(
+    rf"^how many (?P<dst>{_UNIT}) (?:are |is )?(?:in|are in) {_NUMBER}\s*(?P<src>{_UNIT})$", re.IGNORECASE
+)
+
+# Единица -> (величина, множитель к СИ: метры, секунды, м/с)
+UNITS: dict[str, tuple[str, float]] = {}
+for _names, _kind, _factor in [
+    (("m", "meter", "meters", "metre", "metres", "м", "метр", "метра", "метров"), "length", 1.0),
+    (("km", "kilometer", "kilometers", "kilometre", "kilometres", "км"), "length", 1000.0),
+    (("cm", "centimeter", "centimeters", "см"), "length", 0.01),
+    (("mm", "millimeter", "millimeters", "мм"), "length", 0.001),
+    (("mi", "mile", "miles", "миля", "мили", "миль"), "length", 1609.344),
+    (("ft", "foot", "feet", "фут", "фута", "футов"), "length", 0.3048),
+    (("inch", "inches", "дюйм", "дюйма", "дюймов"), "length", 0.0254),
+    (("yd", "yard", "yards", "ярд", "ярда", "ярдов"), "length", 0.9144),
+    (("s", "sec", "second", "seconds", "с", "сек", "секунда", "секунды", "секунд"), "time", 1.0),
+    (("min", "minute", "minutes", "мин", "минута", "минуты", "минут"), "time", 60.0),
+    (("h", "hr", "hour", "hours", "ч", "час", "часа", "часов"), "time", 3600.0),
+    (("m/s", "mps", "м/с"), "speed", 1.0),
+    (("km/h", "kph", "kmh", "км/ч"), "speed", 1000.0 / 3600.0),
+    (("mph",), "speed", 1609.344 / 3600.0),
+    (("kn", "knot", "knots", "узел", "узла", "узлов"), "speed", 1852.0 / 3600.0),
+]:
+    for _name in _names:
+        UNITS[_name] = (_kind, _factor)
+
+
+def _format(value: float) -> str:
+    return f"{value:.10g}"
+
+
+def _normalize(query: str) -> str:
+    text = re.sub(r"\s+", " ", query).strip().rstrip("?!=. ").strip()
+    return _PREFIX.sub("", text)
+
+
+def _arithmetic(text: str) -> str | None:
+    for pattern, operator in _WORD_OPERATORS:
+        text = pattern.sub(operator, text)
+    expr = re.sub(r"\s+", " ", text).strip()
+    if not _EXPRESSION.fullmatch(expr) or not _HAS_OPERATOR.search(expr):
+        return None
+    # Сомнительный случай отдаём LLM: ошибка быстрого пути хуже лишнего вызова модели
+    if _DATE_OR_PHONE.fullmatch(expr):
+        return None
+    # Слова допустимы только как функции и константы калькулятора (sqrt, pi, ...)
+    if any(name not in FUNCTIONS and name not in CONSTANTS for name in _IDENTIFIER.findall(expr)):
+        return None
+    result = evaluate(expr)
+    if result.startswith("Error"):
+        return None
+    # Дробные результаты — как в конвертации единиц: 5 вместо 5.0, 0.3 вместо 0.30000000000000004;
+    # целые выводятся точно
+    if not _INTEGER.fullmatch(result):
+        result = _format(float(result))
+    return f"{result} (calculation: {expr} = {result})"
+
+
+def _conversion(text: str) -> str | None:
+    match = _CONVERSION.match(text) or _HOW_MANY.match(text)
+    if not match:
+        return None
+    src = UNITS.get(match["src"].lower())
+    dst = UNITS.get(match["dst"].lower())
+    if src is None or dst is None or src[0] != dst[0]:
+        return None
+    value = float(match["value"])
+    factor = src[1] / dst[1]
+    result = _format(value * factor)
+    src_name, dst_name = match["src"], match["dst"]
+    return (
+        f"{result} {dst_name} "
+        f"({src_name} to {dst_name}: 1 {src_name} = {_format(factor)} {dst_name}, "
+        f"calculation: {match['value']} * {_format(factor)} = {result})"
+    )
+
+
+def try_answer(query: str) -> str | None:
+    """Answers self-contained arithmetic or unit-conversion queries locally.
+
+    Returns the answer in the agent's answer/facts/calculation format, or None
+    when the query needs the LLM (facts, words, references to earlier turns).
+    """
+    text = _normalize(query)
+    if not text:
+        return None
+    return _arithmetic(text) or _conversion(text)
@@ -0,0 +1,180 @@
+# app/http_pool.py
+import logging
+import os
+import threading
+from typing import Any
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _RequestCounters:
+    """Requests sent through a client, counted by the pool itself (no httpx internals)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.errors = 0
+
+    def started(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+
+    def finished(self, ok: bool) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += not ok
+
+    def stats(self) -> dict[str, int]:
+        # in_flight — запросы, ждущие заголовков ответа (соединения из пула или ответа сервера)
+        return {"requests": self.requests, "in_flight": self.in_flight, "errors": self.errors}
+
+
+class _CountingAsyncTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncHTTPTransport, counters: _RequestCounters):
+        self.transport = transport
+        self.counters = counters
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.counters.started()
+        ok = False
+        try:
+            response = await self.transport.handle_async_request(request)
+            ok = True
+            return response
+        finally:
+            self.counters.finished(ok)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class _CountingTransport(httpx.BaseTransport):
+    def __init__(self, transport: httpx.HTTPTransport, counters: _RequestCounters):
+        self.transport = transport
+        self.counters = counters
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.counters.started()
+        ok = False
+        try:
+            response = self.transport.handle_request(request)
+            ok = True
+            return response
+        finally:
+            self.counters.finished(ok)
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+def _connections(transport: httpx.BaseTransport | httpx.AsyncBaseTransport) -> dict[str, int]:
+    # У httpcore нет публичной статистики пула: читаем её осторожно, а если
+    # внутренние поля в новой версии изменятся — просто не выводим
+    try:
+        connections = list(transport._pool.connections)
+        idle = sum(1 for c in connections if c.is_idle())
+    except Exception:
+        return {}
+    return {"connections": len(connections), "active": len(connections) - idle, "idle": idle}
+
+
+class HTTPClientPool:
+    """Shared, pooled httpx clients for all outbound HTTP.
+
+    One `httpx.AsyncClient` / `httpx.Client` pair keeps TCP+TLS connections
+    alive between requests, so LLM calls, push notifications and UI requests
+    do not pay connection setup every time. Settings come from the arguments
+    or from `HTTP_POOL_*` environment variables.
+    """
+
+    def __init__(
+        self,
+        max_connections: int | None = None,
+        max_keepalive_connections: int | None = None,
+        keepalive_expiry: float | None = None,
+        http2: bool | None = None,
+        timeout: float | None = None,
+        connect_timeout: float | None = None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections
+            if max_connections is not None
+            else int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=max_keepalive_connections
+            if max_keepalive_connections is not None
+            else int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=keepalive_expiry
+            if keepalive_expiry is not None
+            else float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", "60")),
+        )
+        self.timeout = httpx.Timeout(
+            timeout if timeout is not None else float(os.getenv("HTTP_POOL_TIMEOUT", "120")),
+            connect=connect_timeout if connect_timeout is not None else float(os.getenv("HTTP_POOL_CONNECT_TIMEOUT", "5")),
+        )
+        if http2 is None:
+            http2 = os.getenv("HTTP_POOL_HTTP2", "false").lower() in ("1", "true", "yes")
+        if http2 and not _http2_available():
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self._async_client: httpx.AsyncClient | None = None
+        self._sync_client: httpx.Client | None = None
+        self._async_transport: httpx.AsyncHTTPTransport | None = None
+        self._sync_transport: httpx.HTTPTransport | None = None
+        self._async_counters = _RequestCounters()
+        self._sync_counters = _RequestCounters()
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_transport = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+            # limits и http2 клиента применяются к транспортам прокси из окружения
+            self._async_client = httpx.AsyncClient(
+                transport=_CountingAsyncTransport(self._async_transport, self._async_counters),
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+            )
+        return self._async_client
+
+    @property
+    def sync_client(self) -> httpx.Client:
+        if self._sync_client is None or self._sync_client.is_closed:
+            self._sync_transport = httpx.HTTPTransport(limits=self.limits, http2=self.http2)
+            self._sync_client = httpx.Client(
+                transport=_CountingTransport(self._sync_transport, self._sync_counters),
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+            )
+        return self._sync_client
+
+    def stats(self) -> dict[str, Any]:
+        """Returns request counters per client and, when httpcore exposes them, open/idle connections."""
+        stats: dict[str, Any] = {"max_connections": self.limits.max_connections}
+        for name, client, transport, counters in (
+            ("async", self._async_client, self._async_transport, self._async_counters),
+            ("sync", self._sync_client, self._sync_transport, self._sync_counters),
+        ):
+            if client is None or client.is_closed:
+                continue
+            stats[name] = {**counters.stats(), **_connections(transport)}
+        return stats
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+        if self._sync_client is not None:
+            self._sync_client.close()
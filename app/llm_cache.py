@@ -0,0 +1,137 @@
+# app/llm_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import re
+from collections.abc import Awaitable, Callable, Sequence
+from typing import Any
+from uuid import uuid4
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage, message_to_dict, messages_from_dict
+
+from app.cache import TTLCache
+
+
+def _text(content: Any) -> str:
+    text = content if isinstance(content, str) else json.dumps(content, sort_keys=True, ensure_ascii=False)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def normalize_messages(messages: Sequence[BaseMessage]) -> list[dict[str, Any]]:
+    """Reduces messages to what the model sees: role, text, tool calls and results.
+
+    Tool call ids are generated by the provider and differ between otherwise
+    identical conversations, so they are replaced by their order of appearance.
+    """
+    ids: dict[str, str] = {}
+    normalized = []
+    for message in messages:
+        item: dict[str, Any] = {"role": message.type, "content": _text(message.content)}
+        if isinstance(message, AIMessage) and message.tool_calls:
+            item["tool_calls"] = [
+                {"id": ids.setdefault(call["id"] or "", f"call_{len(ids)}"), "name": call["name"], "args": call["args"]}
+                for call in message.tool_calls
+            ]
+        elif isinstance(message, ToolMessage):
+            item["tool_call_id"] = ids.get(message.tool_call_id, message.tool_call_id)
+            item["name"] = message.name
+        normalized.append(item)
+    return normalized
+
+
+def _restore(value: dict[str, Any]) -> AIMessage:
+    message = messages_from_dict([value])[0]
+    # Свежие id вызовов: один и тот же ответ может попасть в несколько диалогов
+    ids = {call["id"]: f"call_{uuid4().hex[:24]}" for call in message.tool_calls}
+    message.tool_calls = [{**call, "id": ids[call["id"]]} for call in message.tool_calls]
+    message.additional_kwargs.pop("tool_calls", None)
+    message.id = None
+    # Ответ из кэша не тратит токены
+    if message.usage_metadata:
+        message.usage_metadata = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    message.response_metadata["cache_hit"] = True
+    return message
+
+
+class LLMResponseCache:
+    """Exact-match cache of chat model responses.
+
+    The key is a hash of the normalized prompt, the tool schemas and the model
+    parameters, so only calls that would send the same request to the model
+    share an entry (sensible at temperature 0). Entries live in a `TTLCache`
+    (LRU, TTL, optional SQLite file). Concurrent identical calls wait for one
+    request; it is cancelled only when every waiter has gone.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 86400.0, path: str | None = None):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl, path=path)
+        self._inflight: dict[tuple[int, str], list] = {}
+        self.coalesced = 0
+
+    @staticmethod
+    def key(messages: Sequence[BaseMessage], signature: str) -> str:
+        """Hashes the prompt together with a model/tools `signature` string."""
+        payload = json.dumps([signature, normalize_messages(messages)], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get_or_call(self, key: str, call: Callable[[], Awaitable[AIMessage]]) -> tuple[AIMessage, bool]:
+        """Returns (response, cached); `call` runs only when no stored or in-flight response exists."""
+        value = self.cache.peek(key)
+        if value is not None:
+            return _restore(value), True
+
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        entry = self._inflight.get(flight_key)
+        owner = entry is None
+        if owner:
+            task = loop.create_task(self._load_or_call(key, call))
+            # [задача, число ожидающих]
+            entry = self._inflight[flight_key] = [task, 0]
+            task.add_done_callback(lambda t: self._finish(flight_key, t))
+        else:
+            self.coalesced += 1
+        entry[1] += 1
+        try:
+            response, stored = await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            # Все ожидающие ушли (отмена задачи) — запрос к модели больше не нужен
+            if entry[1] == 0 and not entry[0].done():
+                entry[0].cancel()
+        if owner and not stored:
+            return response, False
+        return _restore(message_to_dict(response)), True
+
+    async def _load_or_call(self, key: str, call: Callable[[], Awaitable[AIMessage]]) -> tuple[AIMessage, bool]:
+        # Файл кэша читается внутри общей задачи, чтобы повторный запрос не разминулся с ней
+        value = await self.cache.aget(key)
+        if value is not None:
+            return _restore(value), True
+        return await call(), False
+
+    def _finish(self, flight_key: tuple[int, str], task: asyncio.Task) -> None:
+        self._inflight.pop(flight_key, None)
+        if not task.cancelled() and task.exception() is None:
+            response, stored = task.result()
+            if not stored:
+                self.cache.set(flight_key[1], message_to_dict(response))
+
+    def stats(self) -> dict[str, Any]:
+        stats = self.cache.stats()
+        # Присоединившиеся к идущему запросу не доходят до кэша, но ответ модели не ждут
+        lookups = stats["hits"] + stats["misses"] + self.coalesced
+        return {
+            **stats,
+            "coalesced": self.coalesced,
+            "hit_rate": round((stats["hits"] + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Общий кэш ответов процесса; LLM_CACHE_PATH — файл, переживающий перезапуск
+llm_cache = LLMResponseCache(
+    maxsize=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "86400")),
+    path=os.getenv("LLM_CACHE_PATH") or None,
+)
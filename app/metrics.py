@@ -0,0 +1,193 @@
+# app/metrics.py
+from __future__ import annotations
+
+import bisect
+import logging
+import os
+import re
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Any
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+
+# Только для аннотаций: импорт LangChain/LangGraph откладывается до создания агента
+if TYPE_CHECKING:
+    from langchain_core.messages import ToolMessage
+    from langgraph.prebuilt.tool_node import ToolCallRequest
+    from langgraph.types import Command
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин по умолчанию: от 5 мс до 2 минут
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram with labels.
+
+    Observations are recorded on the event loop thread, so no locking is
+    needed; one observation is a bisect and three additions.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # метки -> [счётчики по корзинам (+Inf последней), сумма, количество]
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)]
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = bound if isinstance(bound, str) else f"{bound:g}"
+                bucket_labels = ",".join([*pairs, f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = f"{{{','.join(pairs)}}}" if pairs else ""
+            lines.append(f"{self.name}_sum{suffix} {total:g}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+NODE_DURATION = Histogram("agent_node_duration_seconds", "Graph node execution time.", ("node",))
+TOOL_DURATION = Histogram("agent_tool_duration_seconds", "Tool call execution time.", ("tool", "status"))
+SEARCH_BACKEND_DURATION = Histogram(
+    "agent_search_backend_duration_seconds", "Search backend call time on a cache miss.", ("backend", "status")
+)
+LLM_DURATION = Histogram("agent_llm_duration_seconds", "LLM call latency.", ("call", "model"))
+LLM_PROMPT_TOKENS = Histogram(
+    "agent_llm_prompt_tokens", "Prompt tokens per LLM call.", ("call", "model"), buckets=TOKEN_BUCKETS
+)
+LLM_COMPLETION_TOKENS = Histogram(
+    "agent_llm_completion_tokens", "Completion tokens per LLM call.", ("call", "model"), buckets=TOKEN_BUCKETS
+)
+PUSH_DELIVERY_DURATION = Histogram(
+    "agent_push_delivery_duration_seconds", "Push notification POST time.", ("status",)
+)
+PUSH_LAG = Histogram("agent_push_lag_seconds", "Time from a task update to its delivered push notification.")
+QUEUE_WAIT = Histogram("agent_queue_wait_seconds", "Time a task waited for admission.")
+TASK_DURATION = Histogram("agent_task_duration_seconds", "End-to-end task time.", ("outcome",))
+
+HISTOGRAMS = [
+    NODE_DURATION,
+    TOOL_DURATION,
+    SEARCH_BACKEND_DURATION,
+    LLM_DURATION,
+    LLM_PROMPT_TOKENS,
+    LLM_COMPLETION_TOKENS,
+    PUSH_DELIVERY_DURATION,
+    PUSH_LAG,
+    QUEUE_WAIT,
+    TASK_DURATION,
+]
+
+
+def observe_llm_call(call: str, seconds: float, message: Any) -> None:
+    """Records latency and token usage of one LLM response, per call site and model."""
+    model = (getattr(message, "response_metadata", None) or {}).get("model_name", "")
+    LLM_DURATION.observe(seconds, call, model)
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        LLM_PROMPT_TOKENS.observe(usage.get("input_tokens", 0), call, model)
+        LLM_COMPLETION_TOKENS.observe(usage.get("output_tokens", 0), call, model)
+
+
+def instrument_tool_calls(
+    wrapper: Callable[[ToolCallRequest, Callable], Awaitable[ToolMessage | Command]],
+) -> Callable[[ToolCallRequest, Callable], Awaitable[ToolMessage | Command]]:
+    """Wraps a `ToolNode` awrap_tool_call so that the tool itself is timed (without limiter waits)."""
+
+    async def wrapped(
+        request: ToolCallRequest,
+        execute: Callable[[ToolCallRequest], Awaitable[ToolMessage | Command]],
+    ) -> ToolMessage | Command:
+        name = request.tool_call["name"]
+
+        async def timed(request: ToolCallRequest) -> ToolMessage | Command:
+            started = time.perf_counter()
+            status = "error"
+            with span(f"tool {name}"):
+                try:
+                    result = await execute(request)
+                    status = "error" if getattr(result, "status", None) == "error" else "ok"
+                    return result
+                finally:
+                    TOOL_DURATION.observe(time.perf_counter() - started, name, status)
+
+        return await wrapper(request, timed)
+
+    return wrapped
+
+
+# === Трассировка ===
+# Спаны создаются через OpenTelemetry API, если он установлен и TRACING=true;
+# экспорт настраивается SDK/агентом OpenTelemetry снаружи приложения
+_tracer = None
+if os.getenv("TRACING", "false").lower() in ("1", "true", "yes"):
+    try:
+        from opentelemetry import trace
+
+        _tracer = trace.get_tracer("app")
+    except ImportError:
+        logger.warning("TRACING is enabled but opentelemetry-api is not installed")
+
+
+def span(name: str, **attributes: Any):
+    """Returns a trace span context manager, or a no-op one when tracing is off."""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes or None)
+
+
+# === Экспорт ===
+
+def _flatten(prefix: str, value: Any, out: list[tuple[str, float]]) -> None:
+    if isinstance(value, bool):
+        out.append((prefix, float(value)))
+    elif isinstance(value, (int, float)):
+        out.append((prefix, value))
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', str(key))}", item, out)
+
+
+def render(stats: dict[str, Any] | None = None) -> str:
+    """Renders all histograms, plus numeric `stats()` counters as gauges, in Prometheus text format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    gauges: list[tuple[str, float]] = []
+    _flatten("agent", stats or {}, gauges)
+    for name, value in gauges:
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_route(stats: Callable[[], dict[str, Any]] | None = None):
+    """Builds the `/metrics` endpoint handler."""
+
+    async def metrics(request: Request) -> PlainTextResponse:
+        return PlainTextResponse(render(stats() if stats else None), media_type="text/plain; version=0.0.4")
+
+    return metrics
@@ -0,0 +1,228 @@
+# app/push.py
+import asyncio
+import logging
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+import httpx
+from a2a.server.tasks import PushNotificationConfigStore, PushNotificationSender
+from a2a.types import PushNotificationConfig, Task, TaskState
+
+from app.metrics import PUSH_DELIVERY_DURATION, PUSH_LAG
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATES = {TaskState.completed, TaskState.canceled, TaskState.failed, TaskState.rejected}
+# Ответы, после которых повтор бессмысленен: адрес или токен неверны
+_PERMANENT_STATUSES = {400, 401, 403, 404, 405, 410, 413, 422}
+
+
+class SQLitePushConfigStore(PushNotificationConfigStore):
+    """Push notification configs in a SQLite file shared by all worker processes.
+
+    Configs outlive a restart, so a long task submitted before a deploy
+    still reports its result; rows older than `ttl` are removed on start.
+    Queries run in a worker thread: `get_info` is called for every task
+    event and must not wait for another worker's write on the event loop.
+    """
+
+    def __init__(self, path: str, ttl: float = 7 * 86400):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS push_configs ("
+            " task_id TEXT NOT NULL, config_id TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL,"
+            " PRIMARY KEY (task_id, config_id))"
+        )
+        self._conn.execute("DELETE FROM push_configs WHERE created_at < ?", (time.time() - ttl,))
+
+    def _execute(self, sql: str, params: tuple) -> list[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def set_info(self, task_id: str, notification_config: PushNotificationConfig) -> None:
+        if notification_config.id is None:
+            notification_config.id = task_id
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO push_configs (task_id, config_id, data, created_at) VALUES (?, ?, ?, ?)",
+            (task_id, notification_config.id, notification_config.model_dump_json(exclude_none=True), time.time()),
+        )
+
+    async def get_info(self, task_id: str) -> list[PushNotificationConfig]:
+        rows = await asyncio.to_thread(
+            self._execute, "SELECT data FROM push_configs WHERE task_id = ? ORDER BY created_at", (task_id,)
+        )
+        return [PushNotificationConfig.model_validate_json(row[0]) for row in rows]
+
+    async def delete_info(self, task_id: str, config_id: str | None = None) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "DELETE FROM push_configs WHERE task_id = ? AND config_id = ?",
+            (task_id, config_id if config_id is not None else task_id),
+        )
+
+
+class PushDeliveryQueue(PushNotificationSender):
+    """Delivers push notifications in the background instead of inside the event pipeline.
+
+    `send_notification` only enqueues: the request handler calls it for
+    every task event and would otherwise wait for the webhook each time.
+    Updates are grouped per endpoint (URL and token) and sent after a
+    `batch_delay` window; within the window, and while an endpoint is being
+    retried, a task's newer state replaces the queued one, so receivers get
+    the latest state rather than every intermediate status. Failed
+    deliveries are retried with exponential backoff and jitter. The queue is
+    bounded: when full, new non-final updates are dropped (final states are
+    always kept).
+
+    With `batch_json`, all queued tasks of an endpoint go in one POST as a
+    JSON array; this is not part of the A2A protocol and must be supported
+    by the receiver. By default each task is POSTed on its own, as A2A
+    expects, over the shared keep-alive client.
+    """
+
+    def __init__(
+        self,
+        httpx_client: httpx.AsyncClient,
+        config_store: PushNotificationConfigStore,
+        max_queue: int = 10000,
+        batch_delay: float = 0.2,
+        batch_json: bool = False,
+        max_attempts: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
+        self._client = httpx_client
+        self._config_store = config_store
+        self.max_queue = max_queue
+        self.batch_delay = batch_delay
+        self.batch_json = batch_json
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # (url, token) -> (task_id, config_id) -> [задача, конфиг, попытка, время постановки]
+        self._pending: dict[tuple[str, str | None], OrderedDict[tuple[str, str], list]] = {}
+        self._workers: dict[tuple[str, str | None], asyncio.Task] = {}
+        self._size = 0
+        self.enqueued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def send_notification(self, task: Task) -> None:
+        configs = await self._config_store.get_info(task.id)
+        for config in configs:
+            endpoint = (config.url, config.token)
+            key = (task.id, config.id or task.id)
+            pending = self._pending.setdefault(endpoint, OrderedDict())
+            entry = pending.get(key)
+            if entry is not None:
+                # Свежее состояние задачи заменяет ещё не отправленное
+                entry[0] = task
+                self.coalesced += 1
+            elif self._size >= self.max_queue and task.status.state not in TERMINAL_STATES:
+                self.dropped += 1
+                logger.warning(f"Push queue is full, update of task {task.id} to {config.url} dropped")
+                continue
+            else:
+                pending[key] = [task, config, 0, time.perf_counter()]
+                self._size += 1
+                self.enqueued += 1
+            if endpoint not in self._workers:
+                self._workers[endpoint] = asyncio.create_task(self._drain(endpoint))
+
+    async def _drain(self, endpoint: tuple[str, str | None]) -> None:
+        failures = 0
+        try:
+            while True:
+                # Окно склейки; после ошибок — пауза с экспоненциальным ростом
+                delay = self.batch_delay
+                if failures:
+                    delay = min(self.backoff * 2 ** (failures - 1), self.max_backoff) * random.uniform(0.5, 1.0)
+                await asyncio.sleep(delay)
+                batch = self._pending.pop(endpoint, None)
+                if not batch:
+                    return
+                self._size -= len(batch)
+                retry = await self._deliver(endpoint, list(batch.values()))
+                for entry in retry:
+                    entry[2] += 1
+                    if entry[2] >= self.max_attempts:
+                        self.failed += 1
+                        logger.error(f"Push notification for task {entry[0].id} to {endpoint[0]} failed, giving up")
+                        continue
+                    key = (entry[0].id, entry[1].id or entry[0].id)
+                    pending = self._pending.setdefault(endpoint, OrderedDict())
+                    # За время отправки пришло более новое состояние — повторять старое не нужно
+                    if key not in pending:
+                        pending[key] = entry
+                        self._size += 1
+                        self.retried += 1
+                failures = failures + 1 if retry else 0
+        finally:
+            self._workers.pop(endpoint, None)
+
+    async def _deliver(self, endpoint: tuple[str, str | None], entries: list[list]) -> list[list]:
+        """Sends a batch to one endpoint; returns the entries that should be retried."""
+        url, token = endpoint
+        headers = {"X-A2A-Notification-Token": token} if token else None
+        if self.batch_json:
+            body = [entry[0].model_dump(mode="json", exclude_none=True) for entry in entries]
+            return entries if not await self._post(url, headers, body, entries) else []
+        results = await asyncio.gather(*(
+            self._post(url, headers, entry[0].model_dump(mode="json", exclude_none=True), [entry])
+            for entry in entries
+        ))
+        return [entry for entry, ok in zip(entries, results) if not ok]
+
+    async def _post(self, url: str, headers: dict[str, str] | None, body: Any, entries: list[list]) -> bool:
+        """POSTs one notification body; True when delivered or not worth retrying."""
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await self._client.post(url, json=body, headers=headers)
+            if response.status_code in _PERMANENT_STATUSES:
+                status = "rejected"
+                self.failed += len(entries)
+                logger.error(f"Push endpoint {url} rejected notification: HTTP {response.status_code}")
+                return True
+            response.raise_for_status()
+            status = "ok"
+        except httpx.HTTPError as e:
+            logger.warning(f"Push notification to {url} failed: {e!r}")
+            return False
+        finally:
+            PUSH_DELIVERY_DURATION.observe(time.perf_counter() - started, status)
+        now = time.perf_counter()
+        for entry in entries:
+            PUSH_LAG.observe(now - entry[3])
+        self.sent += len(entries)
+        return True
+
+    async def aclose(self, timeout: float = 5.0) -> None:
+        """Gives queued notifications up to `timeout` seconds to go out on shutdown."""
+        workers = list(self._workers.values())
+        if workers:
+            _, still_running = await asyncio.wait(workers, timeout=timeout)
+            for worker in still_running:
+                worker.cancel()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queued": self._size,
+            "endpoints": len(self._workers),
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
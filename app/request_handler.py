@@ -0,0 +1,107 @@
+# app/request_handler.py
+import asyncio
+import logging
+import os
+from collections.abc import AsyncGenerator
+
+from a2a.server.context import ServerCallContext
+from a2a.server.events import Event
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.server.request_handlers.default_request_handler import TERMINAL_TASK_STATES
+from a2a.types import MessageSendParams, Task, TaskIdParams, TaskNotCancelableError, TaskState
+from a2a.utils.errors import ServerError
+
+logger = logging.getLogger(__name__)
+
+
+class MathRequestHandler(DefaultRequestHandler):
+    """`DefaultRequestHandler` that cancels a task when its stream client disconnects.
+
+    The SDK keeps running a task after the SSE client goes away (so that it
+    can resubscribe); our clients never do, so by default the graph is aborted
+    instead of spending LLM calls on an answer nobody reads. A client that does
+    resubscribe first gets the stored task snapshot, so events sent before it
+    attached are not lost.
+
+    With several workers, `tasks/cancel` for a task running in another
+    process flags it in the shared lease registry and waits for the owner
+    to stop the graph and store the final state.
+    """
+
+    def __init__(
+        self,
+        *args,
+        cancel_on_disconnect: bool | None = None,
+        cancel_wait: float | None = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        if cancel_on_disconnect is None:
+            cancel_on_disconnect = os.getenv("CANCEL_ON_DISCONNECT", "true").lower() in ("1", "true", "yes")
+        self.cancel_on_disconnect = cancel_on_disconnect
+        self.cancel_wait = cancel_wait if cancel_wait is not None else float(os.getenv("CANCEL_WAIT", "5"))
+
+    async def on_cancel_task(
+        self,
+        params: TaskIdParams,
+        context: ServerCallContext | None = None,
+    ) -> Task | None:
+        leases = self.agent_executor.admission.leases
+        task = await self.task_store.get(params.id, context)
+        if (
+            leases is None
+            or task is None
+            or task.status.state in TERMINAL_TASK_STATES
+            or self.agent_executor.is_running(params.id)
+            or not await leases.request_cancel(params.id)
+        ):
+            # Задача здесь или нигде не выполняется; если она ждёт в очереди
+            # другого воркера, флаг отмены не даст ей запуститься
+            return await super().on_cancel_task(params, context)
+
+        # Граф выполняется в другом воркере: он прервёт его по флагу и сам запишет статус
+        deadline = asyncio.get_running_loop().time() + self.cancel_wait
+        while task.status.state not in TERMINAL_TASK_STATES and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.1)
+            task = await self.task_store.get(params.id, context)
+        if task.status.state == TaskState.canceled:
+            return task
+        if task.status.state in TERMINAL_TASK_STATES:
+            message = f"Task cannot be canceled - current state: {task.status.state}"
+        else:
+            message = f"Task is running on another worker; cancellation requested but not confirmed in {self.cancel_wait:g} s"
+        raise ServerError(error=TaskNotCancelableError(message=message))
+
+    async def on_message_send_stream(
+        self,
+        params: MessageSendParams,
+        context: ServerCallContext | None = None,
+    ) -> AsyncGenerator[Event]:
+        stream = super().on_message_send_stream(params, context)
+        # metadata {"cancel_on_disconnect": false} — клиент переподключится через tasks/resubscribe
+        cancel_on_disconnect = (params.message.metadata or {}).get("cancel_on_disconnect", self.cancel_on_disconnect)
+        task_id = None
+        finished = False
+        try:
+            async for event in stream:
+                task_id = event.id if isinstance(event, Task) else getattr(event, "task_id", task_id)
+                yield event
+            finished = True
+        finally:
+            if not finished and task_id and cancel_on_disconnect:
+                if self.agent_executor.abort(task_id):
+                    logger.info(f"Stream client disconnected, task {task_id} canceled")
+            await stream.aclose()
+
+    async def on_resubscribe_to_task(
+        self,
+        params: TaskIdParams,
+        context: ServerCallContext | None = None,
+    ) -> AsyncGenerator[Event]:
+        # SDK отдаёт только события после подключения к очереди; снимок задачи
+        # содержит последний статус и накопленные фрагменты ответа
+        task = await self.task_store.get(params.id, context)
+        if task and task.status.state not in TERMINAL_TASK_STATES:
+            yield task
+        async for event in super().on_resubscribe_to_task(params, context):
+            yield event
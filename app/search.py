@@ -0,0 +1,80 @@
+# app/search.py
+import os
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.tools import tool
+
+from app.cache import TTLCache
+from app.evidence import EvidenceCompressor
+from app.facts import fact_store
+from app.search_backends import SearchRouter, SearchUnavailable, create_backends
+
+logger = logging.getLogger(__name__)
+
+# Клиент DuckDuckGo синхронный: выполняем его в собственном пуле потоков,
+# чтобы ожидание поиска не занимало пул по умолчанию event loop'а
+_search_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SEARCH_MAX_WORKERS", "64")),
+    thread_name_prefix="search_web",
+)
+
+# Бэкенды поиска в порядке приоритета: duckduckgo, URL HTTP-эндпоинта
+# (GET ?q=<запрос>, например заглушка из app.bench_stubs), local:<файл индекса>
+SEARCH_URL = os.getenv("SEARCH_URL")
+search_router = SearchRouter(
+    create_backends(os.getenv("SEARCH_BACKENDS") or SEARCH_URL or "duckduckgo", _search_executor),
+    timeout=float(os.getenv("SEARCH_TIMEOUT", "10")),
+    hedge_delay=float(os.getenv("SEARCH_HEDGE_MS", "1500")) / 1000,
+    breaker_failures=int(os.getenv("SEARCH_BREAKER_FAILURES", "5")),
+    breaker_reset=float(os.getenv("SEARCH_BREAKER_RESET", "30")),
+)
+
+# Отвечать на поиск из сохранённых фактов, если они покрывают запрос
+FACT_INDEX = os.getenv("FACT_INDEX", "true").lower() in ("1", "true", "yes")
+
+# Сжатие результатов: в историю попадают только нужные предложения
+SEARCH_COMPRESS = os.getenv("SEARCH_COMPRESS", "true").lower() in ("1", "true", "yes")
+evidence = EvidenceCompressor()
+
+# Кэш результатов поиска: одинаковые вопросы задают постоянно
+SEARCH_CACHE = os.getenv("SEARCH_CACHE", "true").lower() in ("1", "true", "yes")
+search_cache = TTLCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "86400")),
+    path=os.getenv("SEARCH_CACHE_PATH") or None,
+)
+
+
+def normalize_query(query: str) -> str:
+    """Builds a cache key: lowercase, collapsed whitespace, no trailing punctuation."""
+    return re.sub(r"\s+", " ", query).strip().strip("?!.,;:").strip().lower()
+
+
+@tool
+async def search_web(query: str) -> str:
+    """Searches the web for real-world facts (e.g., speeds, distances, dimensions).
+
+    Args:
+        query: A search query string.
+    """
+    if FACT_INDEX and (facts := await fact_store.lookup(query)) is not None:
+        return facts
+    try:
+        if SEARCH_CACHE:
+            # В кэше — сырые результаты, сжатие дешёвое и зависит от запроса
+            results = await search_cache.get_or_compute(normalize_query(query), lambda: search_router.search(query))
+        else:
+            results = await search_router.search(query)
+    except SearchUnavailable as e:
+        # Ошибка не кэшируется; модель может переформулировать запрос или ответить без поиска.
+        # Подробности — только в лог, модели они не помогут
+        logger.warning(f"search_web failed for {query!r}: {e}")
+        return "Search is temporarily unavailable. Try another query or rely on known facts."
+    return evidence.compress(query, results) if SEARCH_COMPRESS else results
+
+
+async def warmup_search() -> None:
+    """Prepares search clients and indexes ahead of the first query."""
+    await search_router.warmup()
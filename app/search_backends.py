@@ -0,0 +1,416 @@
+# app/search_backends.py
+import asyncio
+import json
+import logging
+import math
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from concurrent.futures import Executor
+from typing import Any
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.metrics import SEARCH_BACKEND_DURATION, span
+
+logger = logging.getLogger(__name__)
+
+
+class SearchUnavailable(RuntimeError):
+    """No search backend returned results within the deadline."""
+
+
+class SearchBackend(ABC):
+    """One search provider: `search` returns results as "snippet: ..., title: ..., link: ..." text."""
+
+    name = "backend"
+
+    @abstractmethod
+    async def search(self, query: str) -> str:
+        """Returns the results for `query`; raises on failure."""
+
+    async def warmup(self) -> None:
+        """Prepares the backend (client, connection, index) ahead of the first query."""
+
+    async def aclose(self) -> None:
+        """Releases connections the backend opened itself."""
+
+
+class DuckDuckGoBackend(SearchBackend):
+    """DuckDuckGo through the synchronous LangChain tool, run in a dedicated thread pool.
+
+    A call abandoned at the deadline keeps its thread until DuckDuckGo
+    answers; the pool size bounds how many such calls can pile up.
+    """
+
+    name = "duckduckgo"
+
+    def __init__(self, executor: Executor, num_results: int = 10):
+        self._executor = executor
+        self.num_results = num_results
+        self._tool = None
+
+    def _get_tool(self):
+        # Клиент DuckDuckGo (и пакет ddgs) загружается при первом поиске, а не при импорте
+        if self._tool is None:
+            from langchain_community.tools import DuckDuckGoSearchResults
+
+            self._tool = DuckDuckGoSearchResults(name="search_web", num_results=self.num_results)
+        return self._tool
+
+    async def search(self, query: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: self._get_tool().invoke(query))
+
+    async def warmup(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._get_tool)
+
+
+class HttpBackend(SearchBackend):
+    """Any HTTP endpoint answering `GET {url}?q=<query>` with result text (e.g. `app.bench_stubs`).
+
+    Requests go through `client` — normally the shared `HTTPClientPool`
+    client, set by `SearchRouter.use_http_client`; without it the backend
+    opens its own client, closed by `aclose`.
+    """
+
+    def __init__(self, url: str, name: str | None = None, client: httpx.AsyncClient | None = None):
+        self.url = url
+        self.name = name or urlsplit(url).netloc or url
+        self.client = client
+        self._own_client: httpx.AsyncClient | None = None
+
+    def _client(self) -> httpx.AsyncClient:
+        if self.client is not None and not self.client.is_closed:
+            return self.client
+        if self._own_client is None or self._own_client.is_closed:
+            self._own_client = httpx.AsyncClient(timeout=30)
+        return self._own_client
+
+    async def search(self, query: str) -> str:
+        response = await self._client().get(self.url, params={"q": query})
+        response.raise_for_status()
+        return response.text
+
+    async def warmup(self) -> None:
+        await self._client().head(self.url)
+
+    async def aclose(self) -> None:
+        if self._own_client is not None:
+            await self._own_client.aclose()
+            self._own_client = None
+
+
+_TERM = re.compile(r"[^\W_]+")
+_K1 = 1.5
+_B = 0.75
+
+
+def _terms(text: str) -> list[str]:
+    # Грубая основа слова, как в app.evidence: окончания не мешают совпадению
+    return [w[:6] for w in _TERM.findall(text.lower())]
+
+
+class LocalIndexBackend(SearchBackend):
+    """Offline BM25 search over a local file of documents.
+
+    The file is JSONL with `title`, `snippet` (or `text`) and `link` fields,
+    or plain text with one passage per line. It is loaded on first use and
+    kept in memory as an inverted index; no network is involved, so the
+    backend works as a last-resort fallback when web search is down.
+    """
+
+    name = "local"
+
+    def __init__(self, path: str, top_k: int = 5):
+        self.path = path
+        self.top_k = top_k
+        self._documents: list[dict[str, str]] | None = None
+        # основа слова -> [(номер документа, частота)]
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+        self._lengths: list[int] = []
+        self._average_length = 1.0
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._documents is not None:
+                return
+            documents = []
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        record = line
+                    if not isinstance(record, dict):
+                        record = {"snippet": str(record)}
+                    snippet = str(record.get("snippet") or record.get("text") or "").strip()
+                    if snippet:
+                        documents.append({
+                            "snippet": snippet,
+                            "title": str(record.get("title") or ""),
+                            "link": str(record.get("link") or record.get("url") or ""),
+                        })
+            for number, document in enumerate(documents):
+                terms = _terms(f"{document['title']} {document['snippet']}")
+                self._lengths.append(len(terms))
+                for term, count in Counter(terms).items():
+                    self._postings.setdefault(term, []).append((number, count))
+            self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 1.0
+            self._documents = documents
+            logger.info(f"Local search index {self.path}: {len(documents)} documents")
+
+    def _search(self, query: str) -> str:
+        self._load()
+        total = len(self._documents)
+        scores: Counter[int] = Counter()
+        for term in set(_terms(query)):
+            postings = self._postings.get(term, ())
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for number, tf in postings:
+                length = self._lengths[number] / self._average_length
+                scores[number] += idf * tf * (_K1 + 1) / (tf + _K1 * (1 - _B + _B * length))
+        return ", ".join(
+            "snippet: {snippet}, title: {title}, link: {link}".format(**self._documents[number])
+            for number, _ in scores.most_common(self.top_k)
+        )
+
+    async def search(self, query: str) -> str:
+        return await asyncio.to_thread(self._search, query)
+
+    async def warmup(self) -> None:
+        await asyncio.to_thread(self._load)
+
+    def stats(self) -> dict[str, int]:
+        return {"documents": len(self._documents or ())}
+
+
+class CircuitBreaker:
+    """Stops calling a backend after consecutive failures.
+
+    After `failures` failures in a row the circuit opens and the backend is
+    skipped; every `reset_timeout` seconds one trial call is let through
+    (half-open). A success closes the circuit, a failure keeps it open.
+    """
+
+    def __init__(self, failures: int = 5, reset_timeout: float = 30.0):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        # Пробный вызов; следующий — не раньше чем через reset_timeout
+        self.opened_at = time.monotonic()
+        return True
+
+    def record(self, ok: bool) -> None:
+        if ok:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            return
+        self.consecutive_failures += 1
+        if self.opened_at is not None or self.consecutive_failures >= self.failures:
+            if self.opened_at is None:
+                self.opened += 1
+                logger.warning(f"Search circuit opened after {self.consecutive_failures} failures")
+            self.opened_at = time.monotonic()
+
+
+def _describe(error: Exception) -> str:
+    # Короткое описание для SearchUnavailable, без текста исключения (он уже в логе)
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"HTTP {error.response.status_code}"
+    if isinstance(error, (httpx.TimeoutException, TimeoutError)):
+        return "timeout"
+    return type(error).__name__
+
+
+class SearchRouter:
+    """Runs a query against prioritized backends with a deadline, hedging and circuit breakers.
+
+    The first backend with a closed circuit is called. If it has not
+    answered after `hedge_delay` seconds, the next one is started as well and
+    the first non-empty result wins; a failed or empty answer moves on to the
+    next backend at once. The whole call is bounded by `timeout`: backends
+    still running at the deadline are cancelled and counted as failures.
+    """
+
+    def __init__(
+        self,
+        backends: list[SearchBackend],
+        timeout: float = 10.0,
+        hedge_delay: float = 1.5,
+        breaker_failures: int = 5,
+        breaker_reset: float = 30.0,
+    ):
+        if not backends:
+            raise ValueError("at least one search backend is required")
+        self.backends = backends
+        self.timeout = timeout
+        # 0 — без хеджирования, только переход к следующему при ошибке
+        self.hedge_delay = hedge_delay
+        self.breakers = {b.name: CircuitBreaker(breaker_failures, breaker_reset) for b in backends}
+        self.calls: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self.wins: Counter[str] = Counter()
+        self.hedges = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    async def search(self, query: str) -> str:
+        backends = iter(self.backends)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        pending: dict[asyncio.Task, SearchBackend] = {}
+        errors: list[str] = []
+
+        def start_next() -> bool:
+            # allow() спрашиваем только у бэкенда, который действительно вызываем:
+            # пробный вызов полуоткрытого breaker'а не должен тратиться впустую
+            for backend in backends:
+                if self.breakers[backend.name].allow():
+                    pending[loop.create_task(self._call(backend, query))] = backend
+                    return True
+            return False
+
+        if not start_next():
+            self.rejected += 1
+            raise SearchUnavailable("all search backends are failing (circuit open)")
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                hedge = self.hedge_delay > 0 and len(pending) == 1
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=min(remaining, self.hedge_delay) if hedge else remaining,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    # Медленный ответ — параллельно спрашиваем следующий бэкенд
+                    if hedge and loop.time() < deadline and start_next():
+                        self.hedges += 1
+                    continue
+                for task in done:
+                    backend = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        errors.append(f"{backend.name}: {_describe(e)}")
+                        continue
+                    if result.strip():
+                        self.wins[backend.name] += 1
+                        return result
+                    errors.append(f"{backend.name}: no results")
+                if not pending:
+                    start_next()
+        finally:
+            for task, backend in pending.items():
+                if not task.done():
+                    # Дедлайн (или отмена вызова) — проигравший хедж не считается ошибкой
+                    if loop.time() >= deadline:
+                        self.timeouts += 1
+                        self.errors[backend.name] += 1
+                        self.breakers[backend.name].record(False)
+                    task.cancel()
+
+        if loop.time() >= deadline:
+            errors.append(f"deadline of {self.timeout:g}s exceeded")
+        raise SearchUnavailable("; ".join(errors) or "no search results")
+
+    async def _call(self, backend: SearchBackend, query: str) -> str:
+        self.calls[backend.name] += 1
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with span("search backend", backend=backend.name, query=query):
+                result = await backend.search(query)
+            status = "ok"
+            self.breakers[backend.name].record(True)
+            return result
+        except asyncio.CancelledError:
+            status = "canceled"
+            raise
+        except Exception as e:
+            logger.warning(f"Search backend {backend.name} failed: {e!r}")
+            self.errors[backend.name] += 1
+            self.breakers[backend.name].record(False)
+            raise
+        finally:
+            SEARCH_BACKEND_DURATION.observe(time.perf_counter() - started, backend.name, status)
+
+    async def warmup(self) -> None:
+        results = await asyncio.gather(*(b.warmup() for b in self.backends), return_exceptions=True)
+        for backend, result in zip(self.backends, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Warmup of search backend {backend.name} failed: {result!r}")
+
+    def use_http_client(self, client: httpx.AsyncClient) -> None:
+        """Routes HTTP backends through a shared pooled client (e.g. `HTTPClientPool.async_client`)."""
+        for backend in self.backends:
+            if isinstance(backend, HttpBackend):
+                backend.client = client
+
+    async def aclose(self) -> None:
+        await asyncio.gather(*(b.aclose() for b in self.backends))
+
+    def stats(self) -> dict[str, Any]:
+        backends: dict[str, Any] = {}
+        for backend in self.backends:
+            breaker = self.breakers[backend.name]
+            backends[backend.name] = {
+                "calls": self.calls[backend.name],
+                "errors": self.errors[backend.name],
+                "wins": self.wins[backend.name],
+                "circuit_open": breaker.state == "open",
+                "circuit_opened": breaker.opened,
+            }
+            if hasattr(backend, "stats"):
+                backends[backend.name].update(backend.stats())
+        return {"hedges": self.hedges, "timeouts": self.timeouts, "rejected": self.rejected, "backends": backends}
+
+
+def create_backends(spec: str, executor: Executor) -> list[SearchBackend]:
+    """Builds backends from a comma-separated spec, in priority order.
+
+    Entries: `duckduckgo`, an `http(s)://` URL of a search endpoint, or
+    `local:PATH` for an offline index file.
+    """
+    backends: list[SearchBackend] = []
+    for entry in (e.strip() for e in spec.split(",")):
+        if not entry:
+            continue
+        if entry in ("duckduckgo", "ddg"):
+            backend: SearchBackend = DuckDuckGoBackend(executor)
+        elif entry.startswith(("http://", "https://")):
+            backend = HttpBackend(entry)
+        elif entry.startswith("local:"):
+            backend = LocalIndexBackend(entry.removeprefix("local:"))
+        else:
+            raise ValueError(f"unknown search backend {entry!r}")
+        if any(b.name == backend.name for b in backends):
+            backend.name = f"{backend.name}-{len(backends)}"
+        backends.append(backend)
+    return backends
@@ -0,0 +1,167 @@
+# app/task_store.py
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from uuid import uuid4
+
+from a2a.server.context import ServerCallContext
+from a2a.server.tasks import TaskStore
+from a2a.types import Task
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteTaskStore(TaskStore):
+    """A2A task store in a SQLite file shared by all server worker processes.
+
+    `tasks/get` and follow-up messages may land on any worker, so tasks are
+    kept in a file instead of process memory. WAL mode lets readers proceed
+    while another worker writes; queries run in a worker thread, so waiting
+    for another worker's write lock does not stall the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " id TEXT PRIMARY KEY, context_id TEXT NOT NULL,"
+            " data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _execute(self, sql: str, params: tuple) -> tuple | None:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    async def save(self, task: Task, context: ServerCallContext | None = None) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO tasks (id, context_id, data, updated_at) VALUES (?, ?, ?, ?)",
+            (task.id, task.context_id, task.model_dump_json(exclude_none=True), time.time()),
+        )
+
+    async def get(self, task_id: str, context: ServerCallContext | None = None) -> Task | None:
+        row = await asyncio.to_thread(self._execute, "SELECT data FROM tasks WHERE id = ?", (task_id,))
+        return Task.model_validate_json(row[0]) if row else None
+
+    async def delete(self, task_id: str, context: ServerCallContext | None = None) -> None:
+        await asyncio.to_thread(self._execute, "DELETE FROM tasks WHERE id = ?", (task_id,))
+
+
+class SQLiteTaskLeases:
+    """Registry of running tasks in the task store file, shared by all worker processes.
+
+    Admission limits and the map of running tasks live in each process, so
+    with several workers two messages of one context could run at once and
+    `tasks/cancel` could not reach a task running elsewhere. A task holds a
+    lease row while it runs: the per-context limit counts live leases of all
+    workers, and a cancel flag set by any worker is picked up by the owner's
+    heartbeat. Leases of a crashed worker expire after `ttl` seconds.
+    """
+
+    def __init__(self, path: str, ttl: float = 10.0, heartbeat: float = 1.0):
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.owner = uuid4().hex
+        self._lock = threading.Lock()
+        # Короткий busy timeout: запросы выполняются в потоках, но ждать чужую запись долго незачем
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS task_leases ("
+            " task_id TEXT PRIMARY KEY, context_id TEXT, owner TEXT,"
+            " expires_at REAL NOT NULL, cancel_requested INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("DELETE FROM task_leases WHERE expires_at < ?", (time.time() - 86400,))
+
+    def _try_acquire(self, task_id: str, context_id: str, limit: int) -> bool | None:
+        """Takes a lease if the context has a free slot; None if the task was canceled meanwhile."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT cancel_requested FROM task_leases WHERE task_id = ?", (task_id,)
+                ).fetchone()
+                if row and row[0]:
+                    return None
+                (running,) = self._conn.execute(
+                    "SELECT COUNT(*) FROM task_leases WHERE context_id = ? AND owner IS NOT NULL AND expires_at > ?",
+                    (context_id, now),
+                ).fetchone()
+                if running >= limit:
+                    return False
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO task_leases (task_id, context_id, owner, expires_at) VALUES (?, ?, ?, ?)",
+                    (task_id, context_id, self.owner, now + self.ttl),
+                )
+                return True
+            finally:
+                self._conn.execute("COMMIT")
+
+    def _renew(self, task_id: str) -> bool:
+        """Extends the lease; returns True if cancellation was requested."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE task_leases SET expires_at = ? WHERE task_id = ? AND owner = ?",
+                (time.time() + self.ttl, task_id, self.owner),
+            )
+            row = self._conn.execute("SELECT cancel_requested FROM task_leases WHERE task_id = ?", (task_id,)).fetchone()
+        return bool(row and row[0])
+
+    def _release(self, task_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM task_leases WHERE task_id = ? AND owner = ?", (task_id, self.owner))
+
+    def _request_cancel(self, task_id: str) -> bool:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Флаг остаётся и для задачи, ждущей в очереди: она не запустится
+                self._conn.execute(
+                    "INSERT INTO task_leases (task_id, expires_at, cancel_requested) VALUES (?, ?, 1)"
+                    " ON CONFLICT(task_id) DO UPDATE SET cancel_requested = 1",
+                    (task_id, now),
+                )
+                owner, expires_at = self._conn.execute(
+                    "SELECT owner, expires_at FROM task_leases WHERE task_id = ?", (task_id,)
+                ).fetchone()
+            finally:
+                self._conn.execute("COMMIT")
+        return owner is not None and owner != self.owner and expires_at > now
+
+    async def acquire(self, task_id: str, context_id: str, limit: int) -> None:
+        """Waits until the context has fewer than `limit` running tasks on all workers."""
+        delay = 0.02
+        while True:
+            acquired = await asyncio.to_thread(self._try_acquire, task_id, context_id, limit)
+            if acquired:
+                return
+            if acquired is None:
+                raise asyncio.CancelledError(f"task {task_id} canceled from another worker")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    def watch(self, task_id: str) -> asyncio.Task:
+        """Renews the lease in the background and cancels the current task when another worker asks."""
+        return asyncio.create_task(self._watch(task_id, asyncio.current_task()))
+
+    async def _watch(self, task_id: str, target: asyncio.Task) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            if await asyncio.to_thread(self._renew, task_id):
+                logger.info(f"Task {task_id} canceled from another worker")
+                target.cancel()
+                return
+
+    async def release(self, task_id: str) -> None:
+        await asyncio.to_thread(self._release, task_id)
+
+    async def request_cancel(self, task_id: str) -> bool:
+        """Flags the task for cancellation; True if it is running on another live worker."""
+        return await asyncio.to_thread(self._request_cancel, task_id)
@@ -3,7 +3,8 @@ import streamlit as st
 from dotenv import load_dotenv
 import os
 import asyncio
-from app.agent import MathAgent
+import queue
+import threading
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -23,12 +24,25 @@ st.set_page_config(
 st.title("🧠 Простой агент для поиска и математических подсчетов")
 st.caption("Задавай вопросы типа: _'Сколько понадобится времени гепарду, чтобы пересечь Москву-реку по Большому Каменному мосту ?'_")
 
-# Инициализация агента (один раз на сессию)
+# Агент и его async-клиенты (OpenAI, поиск) привязаны к event loop'у, в котором впервые
+# открыли соединения, а каждый rerun Streamlit — новый запуск скрипта. Поэтому граф
+# выполняется в одном долгоживущем loop'е в фоновом потоке, общем для всех сессий процесса
+@st.cache_resource
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="math-agent", daemon=True).start()
+    return loop
+
+
+# Инициализация агента (один раз на процесс)
 @st.cache_resource
 def get_agent():
-    return MathAgent()
+    # Импорт агента (LangChain, OpenAI SDK) — только здесь, один раз на процесс:
+    # заголовок и поле ввода отрисовываются без ожидания тяжёлых импортов
+    from app.agent import MathAgent
 
-agent = get_agent()
+    # Все сессии работают в одном loop'е, поэтому общий семафор агента ограничивает их вместе
+    return MathAgent()
 
 # Инициализация состояния чата и контекста
 if "messages" not in st.session_state:
@@ -42,6 +56,8 @@ for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
 
+agent = get_agent()
+
 # Обработка нового сообщения
 if prompt := st.chat_input("Задай свой вопрос..."):
     # Добавляем сообщение пользователя
@@ -55,18 +71,32 @@ if prompt := st.chat_input("Задай свой вопрос..."):
         context_id = st.session_state.context_id  # ← ОДИН КОНТЕКСТ НА ВСЮ СЕССИЮ
 
         try:
+            # События графа приходят из фонового loop'а; элементы Streamlit обновляются только здесь
+            events: queue.Queue = queue.Queue()
+
             async def get_response():
                 async for chunk in agent.stream(prompt, context_id):
-                    if not chunk["is_task_complete"]:
-                        # Промежуточный статус
-                        message_placeholder.markdown(f"⏳ {chunk['content']}")
-                    else:
-                        # Финальный ответ
-                        return chunk["content"]
-                return "No response generated."
-
-            # Запускаем асинхронную функцию
-            final_answer = asyncio.run(get_response())
+                    events.put(chunk)
+                    if chunk["is_task_complete"]:
+                        break
+
+            future = asyncio.run_coroutine_threadsafe(get_response(), get_event_loop())
+            future.add_done_callback(lambda _: events.put(None))
+            partial = ""
+            final_answer = "No response generated."
+            while (chunk := events.get()) is not None:
+                if chunk.get("is_partial"):
+                    # Фрагмент ответа — показываем по мере генерации
+                    partial += chunk["content"]
+                    message_placeholder.markdown(partial)
+                elif not chunk["is_task_complete"]:
+                    # Промежуточный статус
+                    message_placeholder.markdown(f"⏳ {chunk['content']}")
+                else:
+                    # Финальный ответ
+                    final_answer = chunk["content"]
+            # Ошибка графа поднимается здесь
+            future.result()
             message_placeholder.markdown(final_answer)
             st.session_state.messages.append({"role": "assistant", "content": final_answer})
 
@@ -1,99 +1,216 @@
 # chat_ui_a2a.py
-import streamlit as st
-import httpx
-from uuid import uuid4
-from a2a.types import MessageSendParams, SendMessageRequest
+import asyncio
+import concurrent.futures
+import json
 import os
+import threading
+import time
+from uuid import uuid4
+
+import httpx
+import streamlit as st
+from a2a.types import (
+    GetTaskRequest,
+    MessageSendParams,
+    SendStreamingMessageRequest,
+    TaskIdParams,
+    TaskQueryParams,
+    TaskResubscriptionRequest,
+)
+
+from app.http_pool import HTTPClientPool
 
 # URL вашего A2A-агента
 #A2A_AGENT_URL = "http://localhost:10000"
 A2A_AGENT_URL = os.getenv("A2A_AGENT_URL", "http://localhost:10000")
+# Сколько раз переподключаться к задаче (tasks/resubscribe) при обрыве потока
+RESUBSCRIBE_ATTEMPTS = int(os.getenv("A2A_RESUBSCRIBE_ATTEMPTS", "3"))
+TERMINAL_STATES = {"completed", "failed", "canceled", "rejected"}
 
 st.set_page_config(page_title="A2A Agent Chat", page_icon="🔌", layout="centered")
 st.title("🔌 A2A Agent Chat (with memory)")
 st.caption("Talk to your A2A agent running on http://localhost:10000")
 
+
+# Каждый rerun Streamlit — новый запуск скрипта, а async-клиенту нужен один живой event loop:
+# он крутится в фоновом потоке, общем для всех сессий процесса
+@st.cache_resource
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="a2a-client", daemon=True).start()
+    return loop
+
+
+# Один пул keep-alive соединений на процесс: его async-клиент используется только в фоновом loop'е,
+# поэтому сессии не создают (и не забывают закрыть) собственные клиенты
+@st.cache_resource
+def get_http_pool() -> HTTPClientPool:
+    return HTTPClientPool()
+
+
+class StreamingTurn:
+    """One answer being streamed: filled by the background loop, rendered by reruns of the script."""
+
+    def __init__(self, prompt: str, context_id: str | None):
+        self.prompt = prompt
+        self.context_id = context_id
+        self.task_id: str | None = None
+        self.status = "Thinking..."
+        self.partial = ""
+        self.answer: str | None = None
+        self.error: str | None = None
+        self.done = False
+        self.started = time.perf_counter()
+        self.first_event_seconds: float | None = None
+        # Фоновое выполнение run_turn; rerun скрипта ждёт его, а не опрашивает флаги
+        self.future: concurrent.futures.Future | None = None
+
+    def apply(self, result: dict) -> None:
+        """Applies one `message/stream` event (task, status-update or artifact-update)."""
+        if self.first_event_seconds is None:
+            self.first_event_seconds = time.perf_counter() - self.started
+        kind = result.get("kind")
+        if kind == "task":
+            self.task_id = result.get("id")
+            self.context_id = result.get("contextId") or self.context_id
+            # Снимок задачи (в том числе при переподключении): накопленный текст ответа
+            texts = [_text(artifact.get("parts")) for artifact in result.get("artifacts") or []]
+            if any(texts):
+                self.partial = "".join(texts)
+            self._apply_status(result.get("status") or {}, final=False)
+        elif kind == "status-update":
+            self.task_id = result.get("taskId") or self.task_id
+            self._apply_status(result.get("status") or {}, final=result.get("final", False))
+        elif kind == "artifact-update":
+            text = _text((result.get("artifact") or {}).get("parts"))
+            if result.get("append"):
+                self.partial += text
+            else:
+                # Итоговый artifact заменяет накопленные фрагменты
+                self.partial = text
+                self.answer = text
+        elif kind == "message":
+            self.answer = _text(result.get("parts"))
+            self.done = True
+
+    def _apply_status(self, status: dict, final: bool) -> None:
+        state = status.get("state")
+        text = _text((status.get("message") or {}).get("parts"))
+        if state in TERMINAL_STATES or final:
+            self.done = True
+            if state != "completed":
+                self.error = text or f"Task {state}"
+        elif text:
+            self.status = text
+
+
+def _text(parts: list | None) -> str:
+    return "".join(part.get("text", "") for part in parts or [] if part.get("kind") == "text")
+
+
+async def _consume(client: httpx.AsyncClient, request: dict, turn: StreamingTurn) -> None:
+    async with client.stream("POST", A2A_AGENT_URL, json=request) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = json.loads(line[5:])
+            if "error" in data:
+                raise RuntimeError(data["error"].get("message", str(data["error"])))
+            turn.apply(data["result"])
+            if turn.done:
+                return
+
+
+async def run_turn(client: httpx.AsyncClient, turn: StreamingTurn) -> None:
+    """Streams one answer into `turn`; a dropped stream is resumed with tasks/resubscribe."""
+    message = {
+        "role": "user",
+        "parts": [{"kind": "text", "text": turn.prompt}],
+        "message_id": uuid4().hex,
+        # При обрыве соединения задача на сервере не отменяется — к ней можно подключиться снова
+        "metadata": {"cancel_on_disconnect": False},
+    }
+    # 🔥 ПЕРЕДАЁМ context_id, если он есть (для продолжения диалога)
+    if turn.context_id:
+        message["context_id"] = turn.context_id
+    request = SendStreamingMessageRequest(id=str(uuid4()), params=MessageSendParams(message=message))
+    try:
+        try:
+            await _consume(client, request.model_dump(mode="json", exclude_none=True), turn)
+        except httpx.TransportError:
+            if turn.task_id is None:
+                raise
+        if not turn.done and turn.task_id is None:
+            # Сервер не успел прислать задачу — переподключаться не к чему
+            raise RuntimeError("stream ended before the task was created")
+        for attempt in range(RESUBSCRIBE_ATTEMPTS):
+            if turn.done:
+                break
+            # Поток оборвался, а задача на сервере продолжается — подключаемся к ней снова
+            await asyncio.sleep(0.5 * 2 ** attempt)
+            resubscribe = TaskResubscriptionRequest(id=str(uuid4()), params=TaskIdParams(id=turn.task_id))
+            try:
+                await _consume(client, resubscribe.model_dump(mode="json", exclude_none=True), turn)
+            except httpx.TransportError:
+                continue
+            except RuntimeError:
+                # Задача успела завершиться — забираем результат целиком
+                get_task = GetTaskRequest(id=str(uuid4()), params=TaskQueryParams(id=turn.task_id))
+                response = await client.post(A2A_AGENT_URL, json=get_task.model_dump(mode="json", exclude_none=True))
+                response.raise_for_status()
+                turn.apply(response.json()["result"])
+                break
+        if not turn.done:
+            turn.error = "Stream ended before the answer was complete."
+    except Exception as e:
+        turn.error = f"Request failed: {e}"
+    finally:
+        turn.done = True
+
+
 # Инициализация состояния
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "a2a_context_id" not in st.session_state:
     st.session_state.a2a_context_id = None
+turn: StreamingTurn | None = st.session_state.get("a2a_turn")
 
 # Отображение истории чата
 for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
 
-# Обработка нового сообщения
-if prompt := st.chat_input("Type your message..."):
-    # Добавляем сообщение пользователя
+# Обработка нового сообщения; пока ответ не получен, новый вопрос не принимаем
+if prompt := st.chat_input("Type your message...", disabled=turn is not None):
     st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user"):
         st.markdown(prompt)
+    turn = st.session_state.a2a_turn = StreamingTurn(prompt, st.session_state.a2a_context_id)
+    turn.future = asyncio.run_coroutine_threadsafe(run_turn(get_http_pool().async_client, turn), get_event_loop())
 
-    # Ответ агента
+# Ответ агента: поток читается в фоне, поэтому rerun (например, после клика) продолжает отрисовку
+# с того места, где остановился предыдущий запуск скрипта
+if turn is not None:
     with st.chat_message("assistant"):
         msg_placeholder = st.empty()
-        msg_placeholder.markdown("⏳ Thinking...")
-
-        try:
-            # === Формируем сообщение ===
-            message_data = {
-                "role": "user",
-                "parts": [{"kind": "text", "text": prompt}],
-                "message_id": uuid4().hex,
-            }
-
-            # 🔥 ПЕРЕДАЁМ context_id, если он есть (для продолжения диалога)
-            if st.session_state.a2a_context_id:
-                message_data["context_id"] = st.session_state.a2a_context_id
-
-            # Создаём запрос точно как в test_client.py
-            send_message_payload = {"message": message_data}
-            request = SendMessageRequest(
-                id=str(uuid4()),
-                params=MessageSendParams(**send_message_payload)
-            )
-
-            # Отправляем запрос на корень с правильным заголовком
-            response = httpx.post(
-                A2A_AGENT_URL,
-                json=request.model_dump(mode="json"),
-                headers={"Content-Type": "application/json"},
-                timeout=60.0
-            )
-            response.raise_for_status()
-            data = response.json()
-
-            # Отладка (можно удалить)
-            print("Sending context_id:", message_data.get("context_id"))
-            print("RAW RESPONSE TEXT:", response.text)
-
-            # === Обрабатываем ответ ===
+        while True:
+            msg_placeholder.markdown(turn.partial or f"⏳ {turn.status}")
             try:
-                result = data["result"]
-
-                # 🔥 СОХРАНЯЕМ contextId для последующих запросов
-                st.session_state.a2a_context_id = result.get("contextId")
-
-                # Извлекаем текст из artifacts
-                artifacts = result.get("artifacts", [])
-                if (artifacts and 
-                    isinstance(artifacts[0].get("parts"), list) and 
-                    len(artifacts[0]["parts"]) > 0):
-                    answer_text = artifacts[0]["parts"][0].get("text", "No text in response.")
-                else:
-                    answer_text = "❌ No valid 'artifacts' in response."
-
-                msg_placeholder.markdown(answer_text)
-                st.session_state.messages.append({"role": "assistant", "content": answer_text})
-
-            except (KeyError, IndexError, TypeError, AttributeError) as e:
-                error_detail = f"Failed to parse response: {str(e)}"
-                msg_placeholder.markdown(f"❌ {error_detail}")
-                st.session_state.messages.append({"role": "assistant", "content": f"❌ {error_detail}"})
-
-        except Exception as e:
-            error_msg = f"❌ Request failed: {str(e)}"
-            msg_placeholder.markdown(error_msg)
-            st.session_state.messages.append({"role": "assistant", "content": error_msg})
\ No newline at end of file
+                # Возвращается сразу по завершении; таймаут — только период перерисовки фрагментов
+                turn.future.result(timeout=0.1)
+                break
+            except concurrent.futures.TimeoutError:
+                pass
+
+        if turn.error:
+            answer_text = f"❌ {turn.error}"
+        else:
+            answer_text = turn.answer or turn.partial or "No response generated."
+            # 🔥 СОХРАНЯЕМ contextId для последующих запросов
+            st.session_state.a2a_context_id = turn.context_id
+        msg_placeholder.markdown(answer_text)
+        st.session_state.messages.append({"role": "assistant", "content": answer_text})
+        st.session_state.a2a_turn = None
+    # Включаем поле ввода обратно
+    st.rerun()
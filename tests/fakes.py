@@ -0,0 +1,55 @@
+import asyncio
+from typing import Any
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that replies with prepared messages in order and records the prompts it got."""
+
+    model_name: str = "scripted"
+    temperature: float = 0.0
+    replies: list[AIMessage] = []
+    prompts: list[list[BaseMessage]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages: list[BaseMessage], stop: Any = None, run_manager: Any = None, **kwargs: Any):
+        self.prompts.append(list(messages))
+        reply = self.replies.pop(0).model_copy(deep=True)
+        reply.response_metadata = {**reply.response_metadata, "model_name": self.model_name}
+        return ChatResult(generations=[ChatGeneration(message=reply)])
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        return self
+
+
+def tool_call(name: str, call_id: str = "call_1", **args: Any) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}])
+
+
+class ScriptedAgent:
+    """`MathAgent` stand-in: yields `(delay, item)` steps, records whether the stream was cancelled and closed."""
+
+    def __init__(self, steps: list[tuple[float, dict]]):
+        self.steps = steps
+        self.cancelled = False
+        self.closed = False
+
+    async def stream(self, query: str, context_id: str, use_cache: bool = True):
+        try:
+            for delay, item in self.steps:
+                await asyncio.sleep(delay)
+                yield item
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        finally:
+            self.closed = True
+
+    def stats(self) -> dict:
+        return {}
@@ -0,0 +1,48 @@
+import asyncio
+
+from app.agent import MathAgent
+
+
+class StubGraph:
+    async def astream(self, inputs, config, stream_mode):
+        yield "updates", {"assistant": None}
+
+
+def _agent(max_concurrency: int) -> MathAgent:
+    # Без LLM: проверяется только обёртка вокруг графа
+    agent = MathAgent.__new__(MathAgent)
+    agent._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+    agent.graph = StubGraph()
+    return agent
+
+
+def test_graph_clock_starts_after_concurrency_slot_is_acquired():
+    agent = _agent(1)
+
+    async def main():
+        started = []
+        await agent._semaphore.acquire()
+        consumer = asyncio.create_task(
+            _consume(agent._astream({}, {}, ["updates"], lambda: started.append("graph started")))
+        )
+        await asyncio.sleep(0.05)
+        # Запрос ждёт слот — узлы графа ещё не выполняются
+        assert started == []
+        agent._semaphore.release()
+        items = await consumer
+        return started, items
+
+    started, items = asyncio.run(main())
+    assert started == ["graph started"]
+    assert items == [("updates", {"assistant": None})]
+
+
+def test_on_start_without_concurrency_cap():
+    agent = _agent(0)
+    started = []
+    asyncio.run(_consume(agent._astream({}, {}, ["updates"], lambda: started.append(True))))
+    assert started == [True]
+
+
+async def _consume(stream) -> list:
+    return [item async for item in stream]
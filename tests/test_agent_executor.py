@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+from a2a.server.agent_execution import RequestContext
+from a2a.server.events import EventQueue
+from a2a.types import (
+    Message,
+    MessageSendParams,
+    Part,
+    Role,
+    Task,
+    TaskState,
+    TaskStatus,
+    TaskStatusUpdateEvent,
+    TextPart,
+)
+
+from app.agent_executor import MathAgentExecutor
+from tests.fakes import ScriptedAgent
+
+
+def _status(content: str) -> dict:
+    return {"is_task_complete": False, "require_user_input": False, "content": content}
+
+
+def _partial(content: str) -> dict:
+    return {**_status(content), "is_partial": True}
+
+
+def _final(content: str) -> dict:
+    return {"is_task_complete": True, "require_user_input": False, "content": content, "usage": {"total_tokens": 3}}
+
+
+class RecordingUpdater:
+    """Stands in for `TaskUpdater` and keeps the events in order."""
+
+    def __init__(self):
+        self.events: list[tuple] = []
+
+    async def update_status(self, state: TaskState, message: Message | None = None, **kwargs) -> None:
+        self.events.append(("status", message.parts[0].root.text))
+
+    async def add_artifact(self, parts: list[Part], append: bool | None = None, last_chunk: bool | None = None, **kwargs):
+        self.events.append(("artifact", parts[0].root.text, append, last_chunk))
+
+    async def complete(self, message: Message | None = None) -> None:
+        self.events.append(("complete",))
+
+
+def _run(steps: list[tuple[float, dict]], window_ms: float = 50) -> tuple[MathAgentExecutor, RecordingUpdater]:
+    executor = MathAgentExecutor(warmup=False)
+    executor.agent = ScriptedAgent(steps)
+    executor.status_coalesce_seconds = window_ms / 1000
+    updater = RecordingUpdater()
+    task = Task(id="t1", context_id="c1", status=TaskStatus(state=TaskState.submitted))
+    asyncio.run(executor._run("q", task, updater, "t1-result"))
+    return executor, updater
+
+
+def test_statuses_within_window_are_coalesced():
+    executor, updater = _run([
+        (0, _status("Processing your request...")),
+        (0, _status("Gathering information...")),
+        (0.2, _status("Performing calculation...")),
+        (0, _final("42")),
+    ])
+
+    # Первый статус заменён вторым, последний уступил финальному ответу
+    assert updater.events == [
+        ("status", "Gathering information..."),
+        ("artifact", "42", False, True),
+        ("complete",),
+    ]
+    assert executor.stats()["status_updates"] == {"sent": 1, "coalesced": 2}
+
+
+def test_status_is_sent_when_window_passes():
+    _, updater = _run([(0, _status("Processing your request...")), (0.1, _final("42"))], window_ms=20)
+    assert updater.events[0] == ("status", "Processing your request...")
+
+
+def test_repeated_status_is_sent_once():
+    _, updater = _run([
+        (0, _status("Gathering information...")),
+        (0.05, _status("Gathering information...")),
+        (0.05, _final("42")),
+    ], window_ms=10)
+    assert [e for e in updater.events if e[0] == "status"] == [("status", "Gathering information...")]
+
+
+def test_partial_tokens_drop_pending_status_and_are_appended():
+    _, updater = _run([
+        (0, _status("Performing calculation...")),
+        (0, _partial("4")),
+        (0, _partial("2")),
+        (0, _final("42")),
+    ], window_ms=200)
+
+    assert updater.events == [
+        ("artifact", "4", False, False),
+        ("artifact", "2", True, False),
+        ("artifact", "42", False, True),
+        ("complete",),
+    ]
+
+
+def test_cancellation_stops_the_agent_stream():
+    executor = MathAgentExecutor(warmup=False)
+    agent = executor.agent = ScriptedAgent([(0, _status("Processing your request...")), (10, _final("late"))])
+    task = Task(id="t1", context_id="c1", status=TaskStatus(state=TaskState.submitted))
+
+    async def main():
+        run = asyncio.create_task(executor._run("q", task, RecordingUpdater(), "t1-result"))
+        await asyncio.sleep(0.1)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+
+    asyncio.run(main())
+    assert agent.cancelled and agent.closed
+
+
+def test_execute_completes_task_through_event_queue():
+    executor = MathAgentExecutor(warmup=False)
+    executor.agent = ScriptedAgent([(0, _status("Processing your request...")), (0.1, _final("42"))])
+    message = Message(role=Role.user, message_id="m1", parts=[Part(root=TextPart(text="q"))])
+
+    async def main():
+        queue = EventQueue()
+        await executor.execute(RequestContext(request=MessageSendParams(message=message)), queue)
+        events = []
+        while not queue.queue.empty():
+            events.append(await queue.dequeue_event(no_wait=True))
+        return events
+
+    events = asyncio.run(main())
+    assert isinstance(events[0], Task)
+    assert [e.status.state for e in events if isinstance(e, TaskStatusUpdateEvent)] == [
+        TaskState.working,
+        TaskState.completed,
+    ]
+    assert events[-1].final
+    assert executor.stats()["cancellation"]["running"] == 0
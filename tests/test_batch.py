@@ -0,0 +1,145 @@
+import asyncio
+import json
+
+from app.batch import BatchRunner, _completed_ids, iter_queries
+
+
+class FakeCheckpointer:
+    def __init__(self):
+        self.deleted: list[str] = []
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.deleted.append(thread_id)
+
+
+class FakeAgent:
+    """Answers with the upper-cased question; questions in `failing` raise, in `unanswered` stop early."""
+
+    def __init__(self, failing: set[str] = frozenset(), delay: float = 0.0, unanswered: set[str] = frozenset()):
+        self.checkpointer = FakeCheckpointer()
+        self.failing = set(failing)
+        self.unanswered = set(unanswered)
+        self.delay = delay
+        self.calls: list[str] = []
+
+    async def stream(self, query: str, context_id: str):
+        self.calls.append(query)
+        await asyncio.sleep(self.delay)
+        if query in self.failing:
+            raise RuntimeError("model unavailable")
+        yield {"is_task_complete": False, "content": "Thinking..."}
+        if query in self.unanswered:
+            return
+        yield {"is_task_complete": True, "content": query.upper(), "usage": {"total_tokens": 1}}
+
+
+def _write_input(path, records) -> str:
+    path.write_text("\n".join(json.dumps(r) if isinstance(r, dict) else r for r in records) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def _read_output(path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def test_iter_queries_accepts_jsonl_and_plain_text(tmp_path):
+    path = _write_input(tmp_path / "in.jsonl", [
+        {"id": 7, "query": "a"},
+        {"request_id": "r2", "title": "b"},
+        {"id": 3, "other": "x"},
+        "plain question",
+    ])
+    assert list(iter_queries(path)) == [("7", "a"), ("r2", "b"), ("4", "plain question")]
+
+
+def test_answers_every_item_and_drops_threads(tmp_path):
+    input_path = _write_input(tmp_path / "in.jsonl", [{"id": i, "query": f"q{i}"} for i in range(5)])
+    output = tmp_path / "out.jsonl"
+    agent = FakeAgent()
+
+    stats = asyncio.run(BatchRunner(agent, parallelism=2).run(input_path, str(output)))
+
+    assert stats == {"processed": 5, "deduplicated": 0, "failed": 0, "skipped": 0}
+    assert sorted((r["id"], r["answer"]) for r in _read_output(output)) == [(str(i), f"Q{i}") for i in range(5)]
+    assert len(agent.checkpointer.deleted) == 5
+
+
+def test_duplicate_questions_are_answered_once(tmp_path):
+    input_path = _write_input(tmp_path / "in.jsonl", [
+        {"id": 1, "query": "How fast?"},
+        {"id": 2, "query": "how  fast"},
+        {"id": 3, "query": "How fast?"},
+    ])
+    output = tmp_path / "out.jsonl"
+    agent = FakeAgent(delay=0.01)
+
+    stats = asyncio.run(BatchRunner(agent, parallelism=3).run(input_path, str(output)))
+
+    assert agent.calls == ["How fast?"]
+    assert stats["deduplicated"] == 2
+    assert all(r["answer"] == "HOW FAST?" for r in _read_output(output))
+
+
+def test_failures_are_recorded_and_retried_on_resume(tmp_path):
+    input_path = _write_input(tmp_path / "in.jsonl", [{"id": 1, "query": "ok"}, {"id": 2, "query": "bad"}])
+    output = tmp_path / "out.jsonl"
+
+    stats = asyncio.run(BatchRunner(FakeAgent(failing={"bad"})).run(input_path, str(output)))
+    assert stats["failed"] == 1
+    failed = next(r for r in _read_output(output) if r["id"] == "2")
+    assert failed["error"] == "model unavailable"
+    assert _completed_ids(str(output)) == {"1"}
+
+    agent = FakeAgent()
+    stats = asyncio.run(BatchRunner(agent).run(input_path, str(output)))
+    assert agent.calls == ["bad"]
+    assert stats["skipped"] == 1
+    assert _completed_ids(str(output)) == {"1", "2"}
+
+
+def test_stream_without_answer_is_a_failure_and_is_not_cached(tmp_path):
+    input_path = _write_input(tmp_path / "in.jsonl", [{"id": 1, "query": "q"}, {"id": 2, "query": "q"}])
+    output = tmp_path / "out.jsonl"
+    answer_cache = str(tmp_path / "answers.sqlite")
+
+    agent = FakeAgent(unanswered={"q"})
+    stats = asyncio.run(BatchRunner(agent, parallelism=1, answer_cache_path=answer_cache).run(input_path, str(output)))
+    assert stats["failed"] == 2
+    assert agent.calls == ["q", "q"]
+    assert {r["error"] for r in _read_output(output)} == {"agent finished without an answer"}
+    assert _completed_ids(str(output)) == set()
+
+    # Повторный запуск с тем же кэшем ответов спрашивает агента заново
+    agent = FakeAgent()
+    asyncio.run(BatchRunner(agent, answer_cache_path=answer_cache).run(input_path, str(output)))
+    assert agent.calls == ["q"]
+    assert _completed_ids(str(output)) == {"1", "2"}
+
+
+def test_resume_after_torn_last_line(tmp_path):
+    input_path = _write_input(tmp_path / "in.jsonl", [{"id": i, "query": f"q{i}"} for i in range(3)])
+    output = tmp_path / "out.jsonl"
+    # Запуск оборвался посреди записи ответа на второй вопрос
+    output.write_text(json.dumps({"id": "0", "query": "q0", "answer": "Q0"}) + '\n{"id": "1", "que', encoding="utf-8")
+    assert _completed_ids(str(output)) == {"0"}
+
+    agent = FakeAgent()
+    stats = asyncio.run(BatchRunner(agent).run(input_path, str(output)))
+
+    assert sorted(agent.calls) == ["q1", "q2"]
+    assert stats["skipped"] == 1
+    assert _completed_ids(str(output)) == {"0", "1", "2"}
+    # Оборванная строка осталась отдельной и не склеилась с новой записью
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert lines[1] == '{"id": "1", "que'
+    assert len(lines) == 4
+
+
+def test_no_resume_overwrites_output(tmp_path):
+    input_path = _write_input(tmp_path / "in.jsonl", [{"id": 1, "query": "q"}])
+    output = tmp_path / "out.jsonl"
+    output.write_text(json.dumps({"id": "1", "answer": "stale"}) + "\n", encoding="utf-8")
+
+    asyncio.run(BatchRunner(FakeAgent()).run(input_path, str(output), resume=False))
+
+    assert [r["answer"] for r in _read_output(output)] == ["Q"]
@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app import cache as cache_module
+from app.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    return clock
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" становится самым свежим
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry(clock):
+    cache = TTLCache(ttl=10)
+    cache.set("a", 1)
+    clock.now += 9
+    assert cache.get("a") == 1
+    clock.now += 2
+    assert cache.get("a", "missing") == "missing"
+    assert cache.stats()["size"] == 0
+
+
+def test_sqlite_backing_survives_restart(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    TTLCache(path=path, ttl=10).set("q", {"results": [1, 2]})
+    restarted = TTLCache(path=path, ttl=10)
+    assert restarted.get("q") == {"results": [1, 2]}
+    clock.now += 11
+    assert TTLCache(path=path, ttl=10).get("q") is None
+
+
+def test_sqlite_file_is_bounded(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    cache = TTLCache(maxsize=2, path=path)
+    for key in "abc":
+        clock.now += 1
+        cache.set(key, key)
+    restarted = TTLCache(maxsize=2, path=path)
+    assert restarted.get("a") is None
+    assert restarted.get("c") == "c"
+
+
+def test_sqlite_is_pruned_periodically(tmp_path, clock):
+    cache = TTLCache(maxsize=20, path=str(tmp_path / "cache.sqlite"))
+    for i in range(25):
+        clock.now += 1
+        cache.set(str(i), i)
+    rows = cache._db.execute("SELECT key FROM cache").fetchall()
+    # Чистка раз в maxsize // 10 записей: файл превышает предел не больше чем на пачку
+    assert len(rows) <= 20 + cache._prune_every
+    assert ("24",) in rows and ("0",) not in rows
+
+
+def test_sqlite_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite")
+    cache = TTLCache(path=path)
+    threads = []
+    for name in ("_read", "_write"):
+        original = getattr(cache, name)
+
+        def recording(*args, _original=original, _name=name):
+            threads.append((_name, threading.current_thread() is threading.main_thread()))
+            return _original(*args)
+
+        monkeypatch.setattr(cache, name, recording)
+
+    async def factory():
+        return {"answer": 42}
+
+    assert asyncio.run(cache.get_or_compute("k", factory)) == {"answer": 42}
+    assert threads == [("_read", False), ("_write", False)]
+    # Отложенная запись завершена к выходу из asyncio.run
+    assert asyncio.run(TTLCache(path=path).aget("k")) == {"answer": 42}
+
+
+def test_slow_file_read_does_not_break_single_flight(tmp_path, monkeypatch):
+    cache = TTLCache(path=str(tmp_path / "cache.sqlite"))
+    read = cache._read
+    reads = []
+
+    def slow_read(key):
+        # Второй читатель отвечает позже, чем первый успевает всё вычислить
+        reads.append(key)
+        time.sleep(0.01 if len(reads) == 1 else 0.1)
+        return read(key)
+
+    monkeypatch.setattr(cache, "_read", slow_read)
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    async def main():
+        first = asyncio.create_task(cache.get_or_compute("k", factory))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(cache.get_or_compute("k", factory))
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(main()) == [1, 1]
+    assert calls == 1
+    assert len(reads) == 1
+
+
+def test_single_flight_computes_once():
+    cache = TTLCache()
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute("k", factory) for _ in range(10)))
+
+    assert asyncio.run(main()) == ["value"] * 10
+    assert calls == 1
+    assert cache.stats()["coalesced"] == 9
+    # Повтор — из кэша
+    assert asyncio.run(cache.get_or_compute("k", factory)) == "value"
+    assert calls == 1
+
+
+def test_cancelled_waiter_does_not_cancel_shared_computation():
+    cache = TTLCache()
+
+    async def main():
+        release = asyncio.Event()
+
+        async def factory():
+            await release.wait()
+            return 42
+
+        first = asyncio.create_task(cache.get_or_compute("k", factory))
+        second = asyncio.create_task(cache.get_or_compute("k", factory))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == 42
+    assert cache.get("k") == 42
+
+
+def test_errors_are_shared_but_not_cached():
+    cache = TTLCache()
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("search failed")
+
+    async def main():
+        return await asyncio.gather(
+            *(cache.get_or_compute("k", failing) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert calls == 1
+    assert cache.get("k") is None
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_compute("k", failing))
+    assert calls == 2
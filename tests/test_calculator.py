@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from app import calculator as calc
+from app.calculator import calculator, evaluate
+
+
+@pytest.mark.parametrize(
+    "expression, result",
+    [
+        ("155 / 29", str(155 / 29)),
+        ("(10 + 5) * 2", "30"),
+        ("2 ^ 10", "1024"),
+        ("7 // 2 + 7 % 2", "4"),
+        ("-3 + +5", "2"),
+        ("sqrt(16) * pi", str(4.0 * 3.141592653589793)),
+        ("max(1, 5, 3) + round(2.6)", "8"),
+        ("hypot(3, 4)", "5.0"),
+    ],
+)
+def test_evaluates_arithmetic(expression, result):
+    assert evaluate(expression) == result
+
+
+@pytest.mark.parametrize(
+    "expression, message",
+    [
+        # Код вместо арифметики
+        ("__import__('os').system('id')", "unknown name '__import__'"),
+        ("().__class__", "unsupported element"),
+        ("open", "unknown name 'open'"),
+        ("[1, 2]", "unsupported element"),
+        ("'a' * 3", "unsupported value"),
+        ("True + 1", "unsupported value"),
+        ("sqrt(x=4)", "unsupported element"),
+        ("1 +", "invalid syntax"),
+        # Лимиты
+        ("9 ** 9 ** 9 ** 9", "exponent exceeds"),
+        ("10 ** 400", "result magnitude exceeds"),
+        ("1e200 * 1e200", "result magnitude exceeds"),
+        ("1 / 0", "division by zero"),
+        ("(-8) ** 0.5", "unsupported value"),
+        ("1 + " * 300 + "1", "longer than"),
+    ],
+)
+def test_rejects_unsafe_or_too_large_expressions(expression, message):
+    result = evaluate(expression)
+    assert result.startswith("Error: ")
+    assert message in result
+
+
+def test_node_limit(monkeypatch):
+    monkeypatch.setattr(calc, "MAX_NODES", 10)
+    calc._parse.cache_clear()
+    try:
+        assert "more than 10 elements" in evaluate("1 + 2 + 3 + 4 + 5 + 6")
+        assert evaluate("1 + 2") == "3"
+    finally:
+        calc._parse.cache_clear()
+
+
+def test_time_limit(monkeypatch):
+    monkeypatch.setattr(calc, "MAX_SECONDS", -1.0)
+    assert evaluate("1 + 1") == "Error: evaluation took too long"
+
+
+def test_parsed_expressions_are_cached():
+    calc._parse.cache_clear()
+    evaluate("12 * 12")
+    evaluate(" 12 * 12 ")
+    assert calc._parse.cache_info().hits == 1
+
+
+def test_tool_returns_errors_as_text():
+    assert asyncio.run(calculator.ainvoke({"expression": "2 ^ 3"})) == "8"
+    assert asyncio.run(calculator.ainvoke({"expression": "import os"})).startswith("Error: ")
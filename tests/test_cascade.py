@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+
+from app.calculator import calculator
+from app.cascade import FAST, STRONG, ModelCascade, parse_price
+from app.llm_cache import LLMResponseCache
+from tests.fakes import ScriptedChatModel, tool_call
+
+
+@tool
+async def search_web(query: str) -> str:
+    """Searches the web."""
+    return ""
+
+
+TOOLS = [calculator, search_web]
+QUESTION = [HumanMessage(content="How long does a leopard need to cross Tower Bridge?")]
+USAGE = {"input_tokens": 1000, "output_tokens": 100, "total_tokens": 1100}
+
+
+def _cascade(strong_replies=(), fast_replies=(), **kwargs) -> tuple[ModelCascade, ScriptedChatModel, ScriptedChatModel]:
+    strong = ScriptedChatModel(model_name="strong-model", replies=list(strong_replies))
+    fast = ScriptedChatModel(model_name="fast-model", replies=list(fast_replies))
+    return ModelCascade(strong, TOOLS, fast=fast, **kwargs), strong, fast
+
+
+def _fast_step(call: AIMessage) -> AIMessage:
+    call.response_metadata["model_tier"] = FAST
+    return call
+
+
+def test_parse_price():
+    assert parse_price("2.5,10") == (2.5, 10.0)
+    assert parse_price("") == (0.0, 0.0)
+
+
+def test_tier_routing():
+    cascade, _, _ = _cascade(max_fast_steps=2)
+    assert cascade.tier_for(QUESTION) == FAST
+
+    search = _fast_step(tool_call("search_web", query="leopard speed"))
+    searched = QUESTION + [search, ToolMessage(content="58 km/h", tool_call_id="call_1", name="search_web")]
+    assert cascade.tier_for(searched) == FAST
+    # После успешного вычисления остаётся ответ — сильная модель
+    calc = _fast_step(tool_call("calculator", "call_2", expression="244 / 16.1"))
+    calculated = searched + [calc, ToolMessage(content="15.15", tool_call_id="call_2", name="calculator")]
+    assert cascade.tier_for(calculated) == STRONG
+    # Лимит быстрых шагов за ход
+    failed = searched + [calc, ToolMessage(content="Error: bad", tool_call_id="call_2", name="calculator")]
+    assert cascade.tier_for(failed) == STRONG
+    # Новый вопрос — снова быстрая модель
+    assert cascade.tier_for(calculated + [AIMessage(content="15 s"), HumanMessage(content="And a horse?")]) == FAST
+
+
+def test_without_fast_model_everything_goes_to_strong():
+    cascade = ModelCascade(ScriptedChatModel(), TOOLS)
+    assert cascade.tier_for(QUESTION) == STRONG
+
+
+@pytest.mark.parametrize(
+    "reply, reason",
+    [
+        (AIMessage(content="It takes 15 seconds."), "final_answer"),
+        (tool_call("weather", city="London"), "unknown_tool"),
+        (tool_call("search_web", topic="leopard"), "malformed"),
+        (tool_call("calculator", expression="244 / (16.1"), "bad_expression"),
+        (tool_call("search_web", query="tower bridge length"), "repeated"),
+        (
+            AIMessage(content="", invalid_tool_calls=[{"name": "calculator", "args": "{", "id": "x", "error": "json"}]),
+            "malformed",
+        ),
+    ],
+)
+def test_check_escalation_reasons(reply, reason):
+    cascade, _, _ = _cascade()
+    history = QUESTION + [tool_call("search_web", "call_0", query="tower bridge length")]
+    assert cascade.check(reply, history) == reason
+
+
+def test_check_accepts_well_formed_tool_call():
+    cascade, _, _ = _cascade()
+    assert cascade.check(tool_call("calculator", expression="244 / 16.1"), QUESTION) is None
+
+
+def test_fast_reply_is_used_when_valid():
+    reply = tool_call("search_web", query="leopard speed")
+    reply.usage_metadata = USAGE
+    cascade, strong, fast = _cascade(fast_replies=[reply], prices={FAST: (0.15, 0.6), STRONG: (2.5, 10)})
+    response = asyncio.run(cascade.ainvoke(QUESTION, QUESTION))
+    assert response.tool_calls[0]["name"] == "search_web"
+    assert response.response_metadata["model_tier"] == FAST
+    assert (len(fast.prompts), len(strong.prompts)) == (1, 0)
+    stats = cascade.stats()["tiers"][FAST]
+    assert stats["calls"] == 1
+    assert stats["cost_usd"] == pytest.approx((1000 * 0.15 + 100 * 0.6) / 1e6)
+
+
+def test_invalid_fast_reply_escalates_to_strong():
+    cascade, strong, fast = _cascade(
+        fast_replies=[tool_call("weather", city="London")],
+        strong_replies=[tool_call("search_web", query="leopard speed")],
+    )
+    response = asyncio.run(cascade.ainvoke(QUESTION, QUESTION))
+    assert response.response_metadata["model_tier"] == STRONG
+    assert (len(fast.prompts), len(strong.prompts)) == (1, 1)
+    assert cascade.stats()["escalations"] == {"unknown_tool": 1}
+
+
+def test_identical_steps_are_served_from_cache():
+    cache = LLMResponseCache()
+    reply = tool_call("search_web", query="leopard speed")
+    cascade, _, fast = _cascade(fast_replies=[reply], cache=cache)
+
+    first = asyncio.run(cascade.ainvoke(QUESTION, QUESTION))
+    second = asyncio.run(cascade.ainvoke(QUESTION, QUESTION))
+    assert len(fast.prompts) == 1
+    assert second.tool_calls[0]["args"] == first.tool_calls[0]["args"]
+    assert cascade.stats()["tiers"][FAST]["cache_hits"] == 1
+    # Без кэша — снова вызов модели
+    fast.replies.append(reply)
+    asyncio.run(cascade.ainvoke(QUESTION, QUESTION, use_cache=False))
+    assert len(fast.prompts) == 2
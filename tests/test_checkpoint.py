@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.graph import START, MessagesState, StateGraph
+
+from app import checkpoint as checkpoint_module
+from app.checkpoint import SQLiteCheckpointSaver
+
+
+def _config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+
+
+def _put(saver: SQLiteCheckpointSaver, thread_id: str, count: int = 1) -> dict:
+    config = _config(thread_id)
+    for _ in range(count):
+        config = saver.put(config, empty_checkpoint(), {"source": "loop", "step": 0}, {})
+    return config
+
+
+def _echo_graph(saver: SQLiteCheckpointSaver):
+    def reply(state: MessagesState):
+        return {"messages": [AIMessage(content=f"seen {len(state['messages'])}")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("reply", reply)
+    builder.add_edge(START, "reply")
+    return builder.compile(checkpointer=saver)
+
+
+def test_keeps_only_last_checkpoints_per_thread():
+    saver = SQLiteCheckpointSaver(keep_last=2)
+    config = _put(saver, "t", count=5)
+    assert saver.stats() == {"threads": 1, "checkpoints": 2}
+    latest = saver.get_tuple(_config("t"))
+    assert latest.config["configurable"]["checkpoint_id"] == config["configurable"]["checkpoint_id"]
+
+
+def test_pending_writes_follow_their_checkpoint():
+    saver = SQLiteCheckpointSaver(keep_last=1)
+    config = _put(saver, "t")
+    saver.put_writes(config, [("messages", "hello")], task_id="task")
+    assert saver.get_tuple(_config("t")).pending_writes == [("task", "messages", "hello")]
+    _put(saver, "t")
+    assert saver.get_tuple(_config("t")).pending_writes == []
+
+
+def test_evicts_least_recently_used_threads(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(checkpoint_module.time, "time", lambda: now[0])
+    saver = SQLiteCheckpointSaver(max_threads=2, cleanup_interval=0)
+    for thread_id in ("a", "b"):
+        now[0] += 1
+        _put(saver, thread_id)
+    now[0] += 1
+    saver.get_tuple(_config("a"))  # "a" используется, вытесняется "b"
+    now[0] += 1
+    _put(saver, "c")
+    assert saver.get_tuple(_config("b")) is None
+    assert saver.get_tuple(_config("a")) is not None
+    assert saver.stats()["threads"] == 2
+
+
+def test_expires_idle_threads(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(checkpoint_module.time, "time", lambda: now[0])
+    saver = SQLiteCheckpointSaver(idle_ttl=60, cleanup_interval=0)
+    _put(saver, "old")
+    now[0] += 61
+    _put(saver, "new")
+    assert saver.get_tuple(_config("old")) is None
+    assert saver.get_tuple(_config("new")) is not None
+
+
+def test_delete_thread():
+    saver = SQLiteCheckpointSaver()
+    _put(saver, "t", count=2)
+    asyncio.run(saver.adelete_thread("t"))
+    assert saver.stats() == {"threads": 0, "checkpoints": 0}
+
+
+@pytest.mark.parametrize("in_file", [False, True])
+def test_graph_history_is_kept(tmp_path, in_file):
+    saver = SQLiteCheckpointSaver(str(tmp_path / "checkpoints.sqlite") if in_file else ":memory:")
+    graph = _echo_graph(saver)
+    config = {"configurable": {"thread_id": "dialog"}}
+
+    async def main():
+        await graph.ainvoke({"messages": [HumanMessage(content="one")]}, config)
+        return await graph.ainvoke({"messages": [HumanMessage(content="two")]}, config)
+
+    result = asyncio.run(main())
+    assert [m.content for m in result["messages"]] == ["one", "seen 1", "two", "seen 3"]
+    assert len([c for c in saver.list(config)]) <= saver.keep_last
+
+
+def test_file_survives_restart(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    config = {"configurable": {"thread_id": "dialog"}}
+    asyncio.run(_echo_graph(SQLiteCheckpointSaver(path)).ainvoke({"messages": [HumanMessage(content="one")]}, config))
+
+    restarted = SQLiteCheckpointSaver(path)
+    state = asyncio.run(_echo_graph(restarted).aget_state(config))
+    assert [m.content for m in state.values["messages"]] == ["one", "seen 1"]
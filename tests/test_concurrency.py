@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from app.concurrency import AdmissionController, AdmissionRejected
+
+
+async def _hold(admission: AdmissionController, context_id: str, events: list, seconds: float = 0.05):
+    async with admission.admit(context_id):
+        events.append(("start", context_id))
+        await asyncio.sleep(seconds)
+        events.append(("end", context_id))
+
+
+def test_limits_running_tasks_globally():
+    admission = AdmissionController(max_active=2, max_per_context=10, max_queue=10, max_wait=5)
+
+    async def main():
+        events: list = []
+        tasks = [asyncio.create_task(_hold(admission, f"c{i}", events)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        snapshot = admission.stats()
+        await asyncio.gather(*tasks)
+        return snapshot, events
+
+    snapshot, events = asyncio.run(main())
+    assert snapshot["running"] == 2
+    assert snapshot["queued"] == 1
+    # Третья задача стартует только после завершения одной из первых
+    assert events.index(("start", "c2")) > events.index(("end", "c0"))
+    assert admission.stats()["admitted"] == 3
+
+
+def test_serializes_tasks_of_one_context():
+    admission = AdmissionController(max_active=10, max_per_context=1, max_queue=10, max_wait=5)
+
+    async def main():
+        events: list = []
+        await asyncio.gather(
+            _hold(admission, "same", events), _hold(admission, "same", events), _hold(admission, "other", events)
+        )
+        return events
+
+    events = asyncio.run(main())
+    same = [kind for kind, context_id in events if context_id == "same"]
+    assert same == ["start", "end", "start", "end"]
+    # Другой контекст не ждёт
+    assert events.index(("start", "other")) < events.index(("end", "same"))
+    assert admission._contexts == {}
+
+
+def test_rejects_when_queue_is_full():
+    admission = AdmissionController(max_active=1, max_per_context=10, max_queue=1, max_wait=5)
+
+    async def main():
+        events: list = []
+        running = asyncio.create_task(_hold(admission, "a", events, 0.1))
+        queued = asyncio.create_task(_hold(admission, "b", events, 0))
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected, match="queue is full"):
+            await _hold(admission, "c", events)
+        await asyncio.gather(running, queued)
+
+    asyncio.run(main())
+    assert admission.stats()["rejected"] == 1
+    assert admission.stats()["admitted"] == 2
+
+
+def test_rejects_after_max_wait():
+    admission = AdmissionController(max_active=1, max_per_context=10, max_queue=10, max_wait=0.05)
+
+    async def main():
+        events: list = []
+        running = asyncio.create_task(_hold(admission, "a", events, 0.3))
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected, match="no free slot"):
+            await _hold(admission, "b", events)
+        await running
+
+    asyncio.run(main())
+    stats = admission.stats()
+    assert stats["rejected"] == 1
+    assert stats["queued"] == 0
+    assert stats["running"] == 0
+
+
+def test_cancelled_waiter_frees_its_place():
+    admission = AdmissionController(max_active=1, max_per_context=10, max_queue=10, max_wait=5)
+
+    async def main():
+        events: list = []
+        running = asyncio.create_task(_hold(admission, "a", events, 0.05))
+        waiting = asyncio.create_task(_hold(admission, "b", events))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(running, waiting, return_exceptions=True)
+        # Слот освобождён: следующая задача проходит сразу
+        await _hold(admission, "c", events, 0)
+        return events
+
+    events = asyncio.run(main())
+    assert ("start", "b") not in events
+    stats = admission.stats()
+    assert (stats["running"], stats["queued"], stats["admitted"], stats["rejected"]) == (0, 0, 2, 0)
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from app.context import ContextManager
+from tests.fakes import ScriptedChatModel, tool_call
+
+SYSTEM = "You are precise."
+
+
+def _turn(i: int, snippet_chars: int = 2000) -> list:
+    return [
+        HumanMessage(content=f"question {i}"),
+        tool_call("search_web", call_id=f"call_{i}", query=f"query {i}"),
+        ToolMessage(content="x" * snippet_chars, tool_call_id=f"call_{i}", name="search_web"),
+        AIMessage(content=f"answer {i}"),
+    ]
+
+
+def _history(turns: int, snippet_chars: int = 2000) -> list:
+    return [m for i in range(turns) for m in _turn(i, snippet_chars)]
+
+
+def _prepare(manager: ContextManager, messages: list, **state) -> tuple[list, dict]:
+    return asyncio.run(manager.prepare(SYSTEM, {"messages": messages, **state}))
+
+
+def _summarizer(*summaries: str) -> ScriptedChatModel:
+    return ScriptedChatModel(replies=[AIMessage(content=s) for s in summaries], prompts=[])
+
+
+def test_keep_turns_must_cover_the_current_turn():
+    with pytest.raises(ValueError):
+        ContextManager(keep_turns=0)
+
+
+def test_prompt_within_budget_is_sent_as_is():
+    messages = _history(2, snippet_chars=100)
+    prompt, update = _prepare(ContextManager(token_budget=10_000, keep_turns=2), messages)
+
+    assert prompt == [SystemMessage(content=SYSTEM)] + messages
+    assert update == {}
+
+
+def test_zero_budget_disables_trimming():
+    messages = _history(4)
+    prompt, update = _prepare(ContextManager(token_budget=0, keep_turns=1), messages)
+    assert prompt[1:] == messages
+    assert update == {}
+
+
+def test_old_tool_outputs_are_truncated_recent_kept():
+    messages = _history(3)
+    manager = ContextManager(token_budget=100_000, keep_turns=1, tool_max_chars=50)
+    prompt, update = _prepare(manager, messages)
+
+    tool_outputs = [m.content for m in prompt if isinstance(m, ToolMessage)]
+    assert tool_outputs[:2] == ["x" * 50 + " …[truncated]"] * 2
+    assert tool_outputs[2] == "x" * 2000
+    assert len(prompt) == len(messages) + 1
+    assert update == {}
+
+
+def test_over_budget_folds_old_turns_into_summary():
+    messages = _history(3)
+    summarizer = _summarizer("turns 0-1 summary")
+    manager = ContextManager(summarizer=summarizer, token_budget=300, keep_turns=1)
+    prompt, update = _prepare(manager, messages)
+
+    assert update == {"summary": "turns 0-1 summary", "summary_upto": 8}
+    assert prompt == [
+        SystemMessage(content=SYSTEM),
+        SystemMessage(content="Summary of the earlier conversation:\nturns 0-1 summary"),
+        *messages[8:],
+    ]
+    transcript = summarizer.prompts[0][-1].content
+    assert "question 0" in transcript and "answer 1" in transcript
+    assert "question 2" not in transcript
+
+
+def test_summary_is_extended_without_duplicating_history():
+    summarizer = _summarizer("turns 0-1 summary", "turns 0-3 summary")
+    manager = ContextManager(summarizer=summarizer, token_budget=300, keep_turns=1)
+    messages = _history(3)
+    _, update = _prepare(manager, messages)
+
+    # Диалог продолжился на два хода
+    messages = _history(5)
+    prompt, update = _prepare(manager, messages, **update)
+
+    assert update == {"summary": "turns 0-3 summary", "summary_upto": 16}
+    assert prompt[2:] == messages[16:]
+    transcript = summarizer.prompts[1][-1].content
+    assert transcript.startswith("Previous summary:\nturns 0-1 summary")
+    # В сводку добавляются только ходы после summary_upto и до последнего хода
+    assert "question 1" not in transcript
+    assert "question 2" in transcript and "answer 3" in transcript
+    assert "question 4" not in transcript
+
+
+def test_cached_summary_is_reused_within_budget():
+    summarizer = _summarizer()
+    manager = ContextManager(summarizer=summarizer, token_budget=10_000, keep_turns=1)
+    messages = _history(3, snippet_chars=100)
+    prompt, update = _prepare(manager, messages, summary="earlier", summary_upto=8)
+
+    assert update == {}
+    assert summarizer.prompts == []
+    assert prompt[1].content == "Summary of the earlier conversation:\nearlier"
+    assert prompt[2:] == messages[8:]
+
+
+def test_without_summarizer_history_is_kept_over_budget():
+    messages = _history(3)
+    prompt, update = _prepare(ContextManager(token_budget=300, keep_turns=1, tool_max_chars=50), messages)
+
+    assert update == {}
+    assert len(prompt) == len(messages) + 1
+
+
+def test_more_keep_turns_than_history_never_summarizes():
+    summarizer = _summarizer()
+    messages = _history(2)
+    prompt, update = _prepare(ContextManager(summarizer=summarizer, token_budget=300, keep_turns=5), messages)
+
+    assert update == {}
+    assert prompt[1:] == messages
+    assert summarizer.prompts == []
@@ -0,0 +1,50 @@
+from app.evidence import EvidenceCompressor, has_quantity, parse_results
+
+RAW = (
+    "snippet: The cheetah is the fastest land animal. It can reach speeds of 98 to 120 km/h. "
+    "Cheetahs live in Africa., title: Cheetah - Wikipedia, link: https://en.wikipedia.org/wiki/Cheetah, "
+    "snippet: Cheetahs can reach speeds of 98 to 120 km/h in short bursts. They hunt during the day., "
+    "title: Cheetah facts, link: https://example.org/cheetah, "
+    "snippet: Tower Bridge is a combined bascule and suspension bridge in London. It is 244 m long., "
+    "title: Tower Bridge, link: https://en.wikipedia.org/wiki/Tower_Bridge"
+)
+
+
+def test_parse_results_keeps_links():
+    results = parse_results(RAW)
+    assert [r["link"] for r in results] == [
+        "https://en.wikipedia.org/wiki/Cheetah",
+        "https://example.org/cheetah",
+        "https://en.wikipedia.org/wiki/Tower_Bridge",
+    ]
+    assert parse_results("no structure") == [{"snippet": "no structure", "title": "", "link": ""}]
+
+
+def test_has_quantity():
+    assert has_quantity("It can reach speeds of 98 to 120 km/h.")
+    assert has_quantity("It is 244 m long")
+    assert not has_quantity("Cheetahs live in Africa.")
+    assert not has_quantity("Founded in 1894")
+
+
+def test_relevant_quantity_ranks_first_and_duplicates_are_dropped():
+    compressor = EvidenceCompressor(max_chars=1000, top_k=6)
+    lines = compressor.compress("cheetah speed km/h", RAW).splitlines()
+
+    assert "120 km/h" in lines[0]
+    assert lines[0].endswith("link: https://en.wikipedia.org/wiki/Cheetah")
+    # Та же скорость из второго источника — почти дубль
+    assert sum("120 km/h" in line for line in lines) == 1
+    assert not any("Tower Bridge" in line for line in lines)
+
+
+def test_output_fits_budget_and_counts_savings():
+    compressor = EvidenceCompressor(max_chars=120, top_k=6)
+    compressed = compressor.compress("cheetah speed", RAW)
+
+    assert len(compressed) <= 120
+    assert compressor.stats() == {"searches": 1, "raw_chars": len(RAW), "compressed_chars": len(compressed)}
+
+
+def test_unparsable_text_is_returned_as_is():
+    assert EvidenceCompressor().compress("anything", "short") == "short"
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from app.facts import FactStore, tokens
+
+SEARCH = (
+    "snippet: The leopard can run at up to 58 km/h., title: Leopard, link: https://example.org/leopard, "
+    "snippet: Tower Bridge is 244 m long., title: Tower Bridge, link: https://example.org/bridge"
+)
+ANSWER = (
+    "Final answer: 15.2 seconds\n"
+    "Key facts: leopard speed: 16.1 m/s, Tower Bridge length: 244 m\n"
+    "Total time: 15.2 s\n"
+    "Calculation: 244 / 16.1 = 15.2"
+)
+
+
+def test_tokens_drop_stopwords_units_and_numbers():
+    assert tokens("What is the top speed of a leopard in km/h?") == {"speed", "leopar"}
+
+
+def test_extracts_search_backed_facts_and_skips_computed_ones():
+    store = FactStore()
+    added = asyncio.run(store.add_from_answer(ANSWER, [SEARCH]))
+
+    assert [(f["name"], f["source"]) for f in added] == [
+        ("leopard speed", "https://example.org/leopard"),
+        ("Tower Bridge length", "https://example.org/bridge"),
+    ]
+    assert added[0]["value"] == pytest.approx(16.1)
+    assert added[0]["unit"] == "m/s"
+    assert store.stats()["size"] == 2
+
+
+@pytest.mark.parametrize("line", [
+    "Final answer: 5.34 seconds",
+    "Total time: 5.34 s",
+    "The result: 5.34 s",
+    "Итоговое время: 5.34 с",
+])
+def test_computed_values_are_never_stored(line):
+    store = FactStore()
+    # Даже если число случайно встречается в выдаче
+    assert asyncio.run(store.add_from_answer(line, ["snippet: 5.34 s, link: https://example.org"])) == []
+
+
+def test_values_not_in_search_results_are_not_stored():
+    store = FactStore()
+    assert asyncio.run(store.add_from_answer("cheetah speed: 31 m/s", [SEARCH])) == []
+    assert asyncio.run(store.add_from_answer("cheetah speed: 31 m/s")) == []
+
+
+def test_lookup_matches_fuzzily_and_converts_to_si():
+    store = FactStore()
+    asyncio.run(store.add("leopard speed", 58, "km/h", "https://example.org/leopard"))
+
+    result = asyncio.run(store.lookup("leopards top speed"))
+    assert result is not None
+    assert "leopard speed: 16.1111 m/s (58 km/h; source: https://example.org/leopard" in result
+    assert asyncio.run(store.lookup("cheetah speed")) is None
+    assert store.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_lookup_requires_every_entity_to_be_covered():
+    store = FactStore()
+    asyncio.run(store.add("leopard speed", 58, "km/h"))
+
+    # Длины моста нет — нужен поиск
+    assert asyncio.run(store.lookup("leopard speed Tower Bridge length")) is None
+    asyncio.run(store.add("Tower Bridge length", 244, "m"))
+    result = asyncio.run(store.lookup("leopard speed Tower Bridge length"))
+    assert "leopard speed" in result and "Tower Bridge length" in result
+
+
+def test_lookup_threshold_is_configurable():
+    store = FactStore()
+    asyncio.run(store.add("leopard speed", 58, "km/h"))
+
+    # Покрыта одна сущность из двух
+    assert asyncio.run(store.lookup("leopard weight")) is None
+    assert asyncio.run(store.lookup("leopard weight", min_score=0.5)) is not None
+
+
+def test_expired_facts_are_ignored():
+    store = FactStore(ttl=-1)
+    asyncio.run(store.add("leopard speed", 58, "km/h"))
+    assert asyncio.run(store.lookup("leopard speed")) is None
+
+
+def test_facts_survive_restart_and_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "facts.sqlite")
+    first = FactStore(path=path)
+    second = FactStore(path=path)
+    asyncio.run(first.add_from_answer(ANSWER, [SEARCH]))
+
+    # Второй воркер подхватывает факт из файла при промахе в памяти
+    assert "leopard speed" in asyncio.run(second.lookup("leopard speed"))
+    assert "Tower Bridge length" in asyncio.run(FactStore(path=path).lookup("Tower Bridge length"))
+
+
+def test_sqlite_file_is_bounded(tmp_path):
+    path = str(tmp_path / "facts.sqlite")
+    store = FactStore(path=path, maxsize=10)
+    for i in range(30):
+        asyncio.run(store.add(f"item{i} length", i + 1, "m"))
+
+    assert store.stats()["size"] == 10
+    assert store._db.execute("SELECT COUNT(*) FROM facts").fetchone()[0] <= 11
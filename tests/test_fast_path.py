@@ -0,0 +1,53 @@
+import pytest
+
+from app.fast_path import try_answer
+
+
+@pytest.mark.parametrize(
+    "query, answer",
+    [
+        ("What is 2+2?", "4"),
+        ("Сколько будет 100 / 4?", "25"),
+        ("10 / 2", "5"),
+        ("0.1 + 0.2", "0.3"),
+        ("1 / 3", "0.3333333333"),
+        ("2 ** 70", "1180591620717411303424"),
+        ("-7 // 2", "-4"),
+        ("What is 100 - 20 - 5?", "75"),
+        ("calculate 3 times 7", "21"),
+        ("sqrt(16)*2", "8"),
+    ],
+)
+def test_arithmetic_is_answered_locally(query, answer):
+    result = try_answer(query)
+    assert result is not None
+    assert result.split(" ", 1)[0] == answer
+
+
+def test_calculation_shows_the_formatted_result():
+    assert try_answer("0.1 + 0.2") == "0.3 (calculation: 0.1 + 0.2 = 0.3)"
+
+
+def test_unit_conversion():
+    assert try_answer("5 km to m").startswith("5000 m")
+    assert try_answer("how many seconds in 2 minutes").startswith("120 seconds")
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        # Даты и телефоны — не выражения
+        "What is 12/25/2023?",
+        "2023-12-25",
+        "What is 555-123-4567?",
+        "+1-555-123-4567",
+        "What is 555-1234?",
+        # Нужны факты или контекст диалога
+        "How fast is a leopard?",
+        "What is the length of Tower Bridge plus 10?",
+        "And a horse?",
+        "5 km to seconds",
+    ],
+)
+def test_queries_needing_the_llm_are_not_answered(query):
+    assert try_answer(query) is None
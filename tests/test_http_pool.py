@@ -0,0 +1,55 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import http_pool as http_pool_module
+from app.http_pool import HTTPClientPool
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Транспорт пула без сети: ответ 200 или ошибка соединения по адресу
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "down.example":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, text="ok")
+
+    monkeypatch.setattr(http_pool_module.httpx, "AsyncHTTPTransport", lambda **_: httpx.MockTransport(handler))
+    monkeypatch.setattr(http_pool_module.httpx, "HTTPTransport", lambda **_: httpx.MockTransport(handler))
+    return HTTPClientPool(max_connections=5)
+
+
+def test_requests_are_counted_by_the_pool(pool):
+    async def main():
+        await pool.async_client.get("https://up.example/")
+        with pytest.raises(httpx.ConnectError):
+            await pool.async_client.get("https://down.example/")
+        stats = pool.stats()
+        await pool.aclose()
+        return stats
+
+    stats = asyncio.run(main())
+    assert stats["max_connections"] == 5
+    assert {k: stats["async"][k] for k in ("requests", "in_flight", "errors")} == {
+        "requests": 2,
+        "in_flight": 0,
+        "errors": 1,
+    }
+    assert "sync" not in stats
+
+
+def test_connection_stats_are_omitted_when_httpcore_internals_are_missing(pool):
+    pool.sync_client.get("https://up.example/")
+    # MockTransport не похож на пул httpcore — счётчики запросов остаются
+    assert pool.stats()["sync"] == {"requests": 1, "in_flight": 0, "errors": 0}
+    pool.sync_client.close()
+
+
+def test_real_transport_reports_connections():
+    pool = HTTPClientPool()
+    pool.sync_client  # создаёт клиент без запросов
+    stats = pool.stats()["sync"]
+    assert stats["requests"] == 0
+    assert stats.get("connections", 0) == 0
+    pool.sync_client.close()
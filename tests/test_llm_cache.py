@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from app.llm_cache import LLMResponseCache, normalize_messages
+
+USAGE = {"input_tokens": 50, "output_tokens": 5, "total_tokens": 55}
+
+
+def _conversation(call_id: str, question: str = "How fast is a leopard?") -> list:
+    return [
+        SystemMessage(content="You are precise."),
+        HumanMessage(content=question),
+        AIMessage(content="", tool_calls=[{"name": "search_web", "args": {"query": "leopard speed"}, "id": call_id}]),
+        ToolMessage(content="58 km/h", tool_call_id=call_id, name="search_web"),
+    ]
+
+
+def test_key_ignores_provider_ids_and_whitespace():
+    first = _conversation("call_abc")
+    second = _conversation("call_xyz", "How  fast is a leopard? ")
+    assert normalize_messages(first) == normalize_messages(second)
+    assert normalize_messages(first)[2]["tool_calls"][0]["id"] == "call_0"
+    assert LLMResponseCache.key(first, "model") == LLMResponseCache.key(second, "model")
+
+
+def test_key_depends_on_prompt_and_signature():
+    messages = _conversation("call_1")
+    assert LLMResponseCache.key(messages, "gpt-4o") != LLMResponseCache.key(messages, "gpt-4o-mini")
+    assert LLMResponseCache.key(messages, "m") != LLMResponseCache.key(_conversation("call_1", "How fast is a cheetah?"), "m")
+
+
+def _reply() -> AIMessage:
+    return AIMessage(
+        content="",
+        tool_calls=[{"name": "calculator", "args": {"expression": "1 + 1"}, "id": "call_provider"}],
+        usage_metadata=USAGE,
+        id="run-1",
+    )
+
+
+def test_cached_reply_gets_fresh_ids_and_zero_usage():
+    cache = LLMResponseCache()
+
+    async def call():
+        return _reply()
+
+    async def main():
+        first, cached_first = await cache.get_or_call("k", call)
+        second, cached_second = await cache.get_or_call("k", call)
+        return first, cached_first, second, cached_second
+
+    first, cached_first, second, cached_second = asyncio.run(main())
+    assert (cached_first, cached_second) == (False, True)
+    assert first.usage_metadata == USAGE
+    assert second.usage_metadata["total_tokens"] == 0
+    assert second.response_metadata["cache_hit"] is True
+    assert second.tool_calls[0]["args"] == {"expression": "1 + 1"}
+    assert second.tool_calls[0]["id"] != "call_provider"
+    assert second.id is None
+
+
+def test_concurrent_identical_calls_share_one_request():
+    cache = LLMResponseCache()
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return _reply()
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_call("k", call) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert [cached for _, cached in results].count(False) == 1
+    # Каждый ожидающий получает свою копию с собственными id вызовов
+    assert len({response.tool_calls[0]["id"] for response, _ in results}) == 5
+    stats = cache.stats()
+    assert stats["coalesced"] == 4
+    assert stats["hit_rate"] == pytest.approx(0.8)
+
+
+def test_request_is_cancelled_when_every_waiter_leaves():
+    cache = LLMResponseCache()
+    cancelled = False
+
+    async def call():
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        return _reply()
+
+    async def main():
+        waiters = [asyncio.create_task(cache.get_or_call("k", call)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        waiters[0].cancel()
+        await asyncio.sleep(0.01)
+        # Один ещё ждёт — запрос продолжается
+        assert not cancelled
+        waiters[1].cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert cancelled
+    assert cache.cache.get("k") is None
+
+
+def test_remaining_waiter_gets_the_reply():
+    cache = LLMResponseCache()
+
+    async def call():
+        await asyncio.sleep(0.05)
+        return _reply()
+
+    async def main():
+        leaving = asyncio.create_task(cache.get_or_call("k", call))
+        staying = asyncio.create_task(cache.get_or_call("k", call))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        response, _ = await staying
+        return response
+
+    assert asyncio.run(main()).tool_calls[0]["name"] == "calculator"
+    assert cache.cache.get("k") is not None
+
+
+def test_errors_are_not_cached():
+    cache = LLMResponseCache()
+
+    async def failing():
+        raise RuntimeError("rate limited")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_call("k", failing))
+    assert cache.cache.get("k") is None
+
+
+def test_sqlite_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite")
+
+    async def call():
+        return _reply()
+
+    asyncio.run(LLMResponseCache(path=path).get_or_call("k", call))
+
+    async def unexpected():
+        raise AssertionError("cached response expected")
+
+    response, cached = asyncio.run(LLMResponseCache(path=path).get_or_call("k", unexpected))
+    assert cached
+    assert response.tool_calls[0]["args"] == {"expression": "1 + 1"}
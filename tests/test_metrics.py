@@ -0,0 +1,56 @@
+import asyncio
+
+from langchain_core.messages import AIMessage
+
+from app.metrics import LLM_DURATION, LLM_PROMPT_TOKENS, Histogram, metrics_route, observe_llm_call, render
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Test.", ("kind",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, "a")
+
+    assert histogram.render() == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{kind="a",le="0.1"} 2',
+        'test_seconds_bucket{kind="a",le="1"} 3',
+        'test_seconds_bucket{kind="a",le="+Inf"} 4',
+        'test_seconds_sum{kind="a"} 3.65',
+        'test_seconds_count{kind="a"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    histogram = Histogram("test_seconds", "Test.", ("tool",), buckets=(1,))
+    histogram.observe(0.5, 'say "hi"\n')
+    assert 'test_seconds_count{tool="say \\"hi\\"\\n"} 1' in histogram.render()
+
+
+def test_stats_are_rendered_as_gauges():
+    text = render({"search_cache": {"hit-rate": 0.5, "size": 3}, "startup": {"ready": True}, "name": "ignored"})
+
+    assert "agent_search_cache_hit_rate 0.5" in text
+    assert "agent_search_cache_size 3" in text
+    assert "agent_startup_ready 1" in text
+    assert "ignored" not in text
+    assert text.endswith("\n")
+
+
+def test_llm_call_is_recorded_per_model():
+    message = AIMessage(
+        content="42",
+        response_metadata={"model_name": "metrics-test-model"},
+        usage_metadata={"input_tokens": 300, "output_tokens": 20, "total_tokens": 320},
+    )
+    observe_llm_call("assistant", 0.2, message)
+
+    assert 'agent_llm_duration_seconds_count{call="assistant",model="metrics-test-model"} 1' in LLM_DURATION.render()
+    assert 'agent_llm_prompt_tokens_sum{call="assistant",model="metrics-test-model"} 300' in LLM_PROMPT_TOKENS.render()
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    response = asyncio.run(metrics_route(lambda: {"queued": 2})(None))
+
+    assert response.media_type == "text/plain; version=0.0.4"
+    assert b"agent_queued 2" in response.body
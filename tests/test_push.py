@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+import httpx
+from a2a.types import PushNotificationConfig, Task, TaskState, TaskStatus
+
+from app.push import PushDeliveryQueue, SQLitePushConfigStore
+
+
+def _task(task_id: str, state: TaskState = TaskState.working) -> Task:
+    return Task(id=task_id, context_id="ctx", status=TaskStatus(state=state))
+
+
+class Receiver:
+    """Webhook behind httpx.MockTransport; `statuses` are returned in order, then 200."""
+
+    def __init__(self, statuses: list[int] = ()):
+        self.statuses = list(statuses)
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return httpx.Response(self.statuses.pop(0) if self.statuses else 200)
+
+    def bodies(self) -> list:
+        return [json.loads(r.content) for r in self.requests]
+
+
+def _deliver(receiver: Receiver, tasks: list[Task], tmp_path, **options) -> PushDeliveryQueue:
+    async def main() -> PushDeliveryQueue:
+        store = SQLitePushConfigStore(str(tmp_path / "push.sqlite"))
+        for task_id in {t.id for t in tasks}:
+            await store.set_info(task_id, PushNotificationConfig(url="https://hook.example/a2a", token="secret"))
+        async with httpx.AsyncClient(transport=httpx.MockTransport(receiver)) as client:
+            queue = PushDeliveryQueue(client, store, **{"batch_delay": 0.02, "backoff": 0.01, **options})
+            for task in tasks:
+                await queue.send_notification(task)
+            await queue.aclose(timeout=5)
+        return queue
+
+    return asyncio.run(main())
+
+
+def test_config_store_survives_restart_and_expires(tmp_path):
+    path = str(tmp_path / "push.sqlite")
+
+    async def main():
+        store = SQLitePushConfigStore(path)
+        await store.set_info("t1", PushNotificationConfig(url="https://a.example"))
+        await store.set_info("t1", PushNotificationConfig(id="second", url="https://b.example"))
+        configs = await SQLitePushConfigStore(path).get_info("t1")
+        assert [(c.id, c.url) for c in configs] == [("t1", "https://a.example"), ("second", "https://b.example")]
+        await store.delete_info("t1")
+        assert [c.id for c in await store.get_info("t1")] == ["second"]
+        assert await SQLitePushConfigStore(path, ttl=-1).get_info("t1") == []
+
+    asyncio.run(main())
+
+
+def test_updates_of_one_task_are_coalesced(tmp_path):
+    receiver = Receiver()
+    queue = _deliver(
+        receiver,
+        [_task("t1"), _task("t1", TaskState.input_required), _task("t1", TaskState.completed)],
+        tmp_path,
+    )
+
+    assert [b["status"]["state"] for b in receiver.bodies()] == ["completed"]
+    assert receiver.requests[0].headers["X-A2A-Notification-Token"] == "secret"
+    assert queue.stats()["coalesced"] == 2
+    assert queue.stats()["sent"] == 1
+
+
+def test_full_queue_drops_only_non_final_updates(tmp_path):
+    receiver = Receiver()
+    queue = _deliver(
+        receiver,
+        [_task("t1"), _task("t2"), _task("t3", TaskState.completed), _task("t4", TaskState.failed)],
+        tmp_path,
+        max_queue=1,
+    )
+
+    assert sorted(b["id"] for b in receiver.bodies()) == ["t1", "t3", "t4"]
+    assert queue.stats()["dropped"] == 1
+
+
+def test_failed_delivery_is_retried_with_backoff(tmp_path):
+    receiver = Receiver([503, 503])
+    queue = _deliver(receiver, [_task("t1", TaskState.completed)], tmp_path)
+
+    assert len(receiver.requests) == 3
+    assert queue.stats()["retried"] == 2
+    assert queue.stats()["sent"] == 1
+    assert queue.stats()["failed"] == 0
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    receiver = Receiver([503] * 10)
+    queue = _deliver(receiver, [_task("t1", TaskState.completed)], tmp_path, max_attempts=3)
+
+    assert len(receiver.requests) == 3
+    assert queue.stats()["failed"] == 1
+    assert queue.stats()["queued"] == 0
+
+
+def test_permanent_rejection_is_not_retried(tmp_path):
+    receiver = Receiver([404])
+    queue = _deliver(receiver, [_task("t1", TaskState.completed)], tmp_path)
+
+    assert len(receiver.requests) == 1
+    assert queue.stats()["failed"] == 1
+    assert queue.stats()["retried"] == 0
+
+
+def test_batch_json_sends_one_array_per_endpoint(tmp_path):
+    receiver = Receiver()
+    queue = _deliver(receiver, [_task("t1"), _task("t2", TaskState.completed)], tmp_path, batch_json=True)
+
+    assert len(receiver.requests) == 1
+    assert [b["id"] for b in receiver.bodies()[0]] == ["t1", "t2"]
+    assert queue.stats()["sent"] == 2
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+from a2a.server.tasks import InMemoryTaskStore
+from a2a.types import (
+    Message,
+    MessageSendParams,
+    Part,
+    Role,
+    Task,
+    TaskIdParams,
+    TaskNotCancelableError,
+    TaskState,
+    TaskStatus,
+    TextPart,
+)
+from a2a.utils.errors import ServerError
+
+from app.agent_executor import MathAgentExecutor
+from app.concurrency import AdmissionController
+from app.request_handler import MathRequestHandler
+from app.task_store import SQLiteTaskLeases, SQLiteTaskStore
+from tests.fakes import ScriptedAgent
+
+
+def _params(metadata: dict | None = None) -> MessageSendParams:
+    return MessageSendParams(
+        message=Message(role=Role.user, message_id="m1", parts=[Part(root=TextPart(text="q"))], metadata=metadata)
+    )
+
+
+def _slow_agent() -> ScriptedAgent:
+    status = {"is_task_complete": False, "require_user_input": False, "content": "Processing your request..."}
+    final = {"is_task_complete": True, "require_user_input": False, "content": "late"}
+    return ScriptedAgent([(0, status), (10, final)])
+
+
+def _handler(**kwargs) -> tuple[MathRequestHandler, MathAgentExecutor]:
+    executor = MathAgentExecutor(warmup=False)
+    executor.agent = _slow_agent()
+    executor.status_coalesce_seconds = 0
+    return MathRequestHandler(agent_executor=executor, task_store=InMemoryTaskStore(), **kwargs), executor
+
+
+async def _disconnect_after_status(handler: MathRequestHandler, params: MessageSendParams) -> None:
+    stream = handler.on_message_send_stream(params)
+    assert isinstance(await anext(stream), Task)
+    await anext(stream)  # статус "working"
+    await stream.aclose()
+    await asyncio.sleep(0.1)
+
+
+def test_stream_disconnect_cancels_the_task():
+    handler, executor = _handler()
+    asyncio.run(_disconnect_after_status(handler, _params()))
+
+    assert executor.agent.cancelled
+    assert executor.stats()["cancellation"]["canceled_running"] == 1
+
+
+def test_client_may_keep_the_task_running_after_disconnect():
+    handler, executor = _handler()
+    executor.agent.steps[-1] = (0.2, executor.agent.steps[-1][1])
+
+    async def main():
+        await _disconnect_after_status(handler, _params({"cancel_on_disconnect": False}))
+        await asyncio.sleep(0.3)
+        return await handler.task_store.get(next(iter(handler.task_store.tasks)))
+
+    task = asyncio.run(main())
+    assert task.status.state == TaskState.completed
+    assert executor.stats()["cancellation"]["canceled_running"] == 0
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "tasks.sqlite")
+
+
+def _cross_worker_handler(path: str, cancel_wait: float) -> MathRequestHandler:
+    executor = MathAgentExecutor(warmup=False, leases=SQLiteTaskLeases(path, heartbeat=0.02))
+    return MathRequestHandler(agent_executor=executor, task_store=SQLiteTaskStore(path), cancel_wait=cancel_wait)
+
+
+def _working(task_id: str) -> Task:
+    return Task(id=task_id, context_id="ctx", status=TaskStatus(state=TaskState.working))
+
+
+def test_cancel_of_task_on_another_worker_waits_for_its_final_state(path):
+    handler = _cross_worker_handler(path, cancel_wait=2)
+    store = SQLiteTaskStore(path)
+    owner = AdmissionController(max_active=10, max_per_context=1, max_queue=10, max_wait=5,
+                                leases=SQLiteTaskLeases(path, heartbeat=0.02))
+
+    async def main():
+        started = asyncio.Event()
+
+        async def run():
+            await store.save(_working("t1"))
+            try:
+                async with owner.admit("ctx", "t1"):
+                    started.set()
+                    await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                # Воркер-владелец сам записывает финальный статус
+                await store.save(Task(id="t1", context_id="ctx", status=TaskStatus(state=TaskState.canceled)))
+                raise
+
+        running = asyncio.create_task(run())
+        await started.wait()
+        task = await handler.on_cancel_task(TaskIdParams(id="t1"))
+        await asyncio.gather(running, return_exceptions=True)
+        return task
+
+    assert asyncio.run(main()).status.state == TaskState.canceled
+
+
+def test_unconfirmed_cross_worker_cancel_is_an_error(path):
+    handler = _cross_worker_handler(path, cancel_wait=0.2)
+    stuck = SQLiteTaskLeases(path)
+
+    async def main():
+        await SQLiteTaskStore(path).save(_working("t1"))
+        # Владелец держит аренду, но не следит за флагом отмены
+        await stuck.acquire("t1", "ctx", 1)
+        await handler.on_cancel_task(TaskIdParams(id="t1"))
+
+    with pytest.raises(ServerError) as error:
+        asyncio.run(main())
+    assert isinstance(error.value.error, TaskNotCancelableError)
@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.search_backends import CircuitBreaker, SearchBackend, SearchRouter, SearchUnavailable
+
+
+class StubBackend(SearchBackend):
+    def __init__(self, name: str, result: str = "", delay: float = 0.0, error: Exception | None = None):
+        self.name = name
+        self.result = result or f"snippet: from {name}, title: t, link: https://{name}.example"
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def search(self, query: str) -> str:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _http_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://search.example/?q=secret")
+    return httpx.HTTPStatusError("boom", request=request, response=httpx.Response(status, request=request))
+
+
+def test_backend_must_implement_search():
+    with pytest.raises(TypeError):
+        SearchBackend()
+
+
+def test_breaker_opens_and_lets_one_trial_through():
+    breaker = CircuitBreaker(failures=2, reset_timeout=0.05)
+    breaker.record(False)
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open" and not breaker.allow()
+    assert breaker.opened == 1
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    # Пробный вызов уже выдан — следующие ждут его результата
+    assert not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed" and breaker.allow()
+    assert breaker.opened == 1
+
+
+def test_first_backend_answers_alone():
+    primary, secondary = StubBackend("a"), StubBackend("b")
+    router = SearchRouter([primary, secondary], hedge_delay=0.5)
+
+    assert "from a" in asyncio.run(router.search("q"))
+    assert (primary.calls, secondary.calls) == (1, 0)
+    assert router.stats()["backends"]["a"]["wins"] == 1
+
+
+def test_failure_and_empty_result_move_on_at_once():
+    failing = StubBackend("a", error=_http_error(503))
+    empty = StubBackend("b", result=" ")
+    fallback = StubBackend("c")
+    router = SearchRouter([failing, empty, fallback], hedge_delay=5)
+
+    started = time.perf_counter()
+    assert "from c" in asyncio.run(router.search("q"))
+    assert time.perf_counter() - started < 1
+    assert router.hedges == 0
+    assert router.stats()["backends"]["a"]["errors"] == 1
+
+
+def test_slow_backend_is_hedged_and_loser_cancelled():
+    slow, fast = StubBackend("a", delay=1), StubBackend("b", delay=0.01)
+    router = SearchRouter([slow, fast], hedge_delay=0.05)
+
+    assert "from b" in asyncio.run(router.search("q"))
+    assert router.hedges == 1
+    assert slow.cancelled == 1
+    # Проигравший хедж — не ошибка
+    assert router.stats()["backends"]["a"]["errors"] == 0
+
+
+def test_deadline_cancels_running_backends():
+    first, second = StubBackend("a", delay=1), StubBackend("b", delay=1)
+    router = SearchRouter([first, second], timeout=0.1, hedge_delay=0.02, breaker_failures=1)
+
+    with pytest.raises(SearchUnavailable, match="deadline of 0.1s exceeded"):
+        asyncio.run(router.search("q"))
+    assert (first.cancelled, second.cancelled) == (1, 1)
+    assert router.timeouts == 2
+    assert router.breakers["a"].state == "open"
+
+
+def test_every_backend_failing_raises_short_reasons():
+    router = SearchRouter(
+        [StubBackend("a", error=_http_error(503)), StubBackend("b", error=ValueError("token=secret")), StubBackend("c", result="\n")],
+        hedge_delay=0,
+    )
+
+    with pytest.raises(SearchUnavailable) as error:
+        asyncio.run(router.search("q"))
+    assert str(error.value) == "a: HTTP 503; b: ValueError; c: no results"
+
+
+def test_open_circuit_skips_backend_and_rejects_when_all_open():
+    broken, healthy = StubBackend("a", error=_http_error(500)), StubBackend("b")
+    router = SearchRouter([broken, healthy], hedge_delay=0, breaker_failures=1, breaker_reset=60)
+
+    assert "from b" in asyncio.run(router.search("q"))
+    assert "from b" in asyncio.run(router.search("q"))
+    assert broken.calls == 1
+
+    router.breakers["b"].record(False)
+    with pytest.raises(SearchUnavailable, match="circuit open"):
+        asyncio.run(router.search("q"))
+    assert router.rejected == 1
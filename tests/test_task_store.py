@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+from a2a.types import Message, Part, Role, Task, TaskState, TaskStatus, TextPart
+
+from app.concurrency import AdmissionController
+from app.task_store import SQLiteTaskLeases, SQLiteTaskStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "tasks.sqlite")
+
+
+def _workers(path: str, count: int = 2, **kwargs) -> list[AdmissionController]:
+    # Каждый контроллер со своим реестром — как отдельные процессы-воркеры с общим файлом
+    return [
+        AdmissionController(max_active=10, max_per_context=1, max_queue=10, max_wait=5,
+                            leases=SQLiteTaskLeases(path, heartbeat=0.02, **kwargs))
+        for _ in range(count)
+    ]
+
+
+def test_task_store_roundtrip(path):
+    store = SQLiteTaskStore(path)
+    task = Task(
+        id="t1",
+        context_id="c1",
+        status=TaskStatus(
+            state=TaskState.working,
+            message=Message(role=Role.agent, message_id="m1", parts=[Part(root=TextPart(text="Thinking"))]),
+        ),
+    )
+
+    async def main():
+        await store.save(task)
+        # Другой процесс видит ту же задачу
+        loaded = await SQLiteTaskStore(path).get("t1")
+        await store.delete("t1")
+        return loaded, await store.get("t1")
+
+    loaded, deleted = asyncio.run(main())
+    assert loaded == task
+    assert deleted is None
+
+
+def test_context_limit_holds_across_workers(path):
+    first, second = _workers(path)
+    events = []
+
+    async def run(admission, task_id):
+        async with admission.admit("ctx", task_id):
+            events.append(("start", task_id))
+            await asyncio.sleep(0.1)
+            events.append(("end", task_id))
+
+    async def main():
+        await asyncio.gather(run(first, "t1"), run(second, "t2"))
+
+    asyncio.run(main())
+    assert [kind for kind, _ in events] == ["start", "end", "start", "end"]
+
+
+def test_cancel_reaches_task_on_another_worker(path):
+    owner, other = _workers(path)
+
+    async def main():
+        started = asyncio.Event()
+
+        async def run():
+            async with owner.admit("ctx", "t1"):
+                started.set()
+                await asyncio.sleep(5)
+
+        task = asyncio.create_task(run())
+        await started.wait()
+        assert await other.leases.request_cancel("t1") is True
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(task, timeout=1)
+        # Слот контекста освобождён для следующей задачи
+        async with other.admit("ctx", "t2"):
+            pass
+
+    asyncio.run(main())
+
+
+def test_flagged_task_never_starts(path):
+    owner, other = _workers(path)
+
+    async def main():
+        # Задача ещё в очереди владельца — аренды нет, но флаг остаётся
+        assert await other.leases.request_cancel("t1") is False
+        with pytest.raises(asyncio.CancelledError):
+            async with owner.admit("ctx", "t1"):
+                pytest.fail("canceled task was started")
+
+    asyncio.run(main())
+    assert owner.stats()["running"] == 0
+
+
+def test_lease_of_crashed_worker_expires(path):
+    crashed = SQLiteTaskLeases(path, ttl=0.1)
+    (alive,) = _workers(path, count=1)
+
+    async def main():
+        # Воркер взял слот и умер, не освободив его
+        await crashed.acquire("t1", "ctx", 1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        async with alive.admit("ctx", "t2"):
+            return loop.time() - started
+
+    assert asyncio.run(main()) >= 0.05
+    assert asyncio.run(alive.leases.request_cancel("t1")) is False